@@ -0,0 +1,258 @@
+"""
+Persistent, incrementally updated aggregates for /eda and /dataset-stats.
+
+The store keeps an ``EdaAccumulator`` (label distribution, word frequencies,
+length buckets, subreddit stress rates, numeric co-moments, row hashes) and
+a ``LabelProfile`` (stress counts and trend) for one dataset file, persisted
+next to it as ``<dataset>.aggregates.pkl`` together with the file's size,
+mtime and content hash.
+
+When the dataset changes the store checks whether the old content is an
+unchanged prefix of the new file (the usual "append today's labelled posts"
+case). If so only the new bytes are parsed and merged, so the cost follows
+the size of the delta; any other change triggers a full chunked rebuild.
+
+Usage:
+    python aggregate_store.py append new_posts.csv   # append rows + merge
+    python aggregate_store.py rebuild
+"""
+import io
+import os
+import pickle
+import threading
+
+from dataset_profile import LabelProfile, compute_profile, file_digest, stat_key
+from eda_engine import DEFAULT_CHUNK_ROWS, EdaAccumulator
+
+STORE_VERSION = 1
+
+
+class _State:
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.mtime_ns = 0
+        self.hash = None
+        self.eda = EdaAccumulator()
+        self.labels = LabelProfile()
+        self.profile_fallback = None
+        self._eda_payload = None
+        self._profile = None
+
+    def invalidate(self):
+        self._eda_payload = None
+        self._profile = None
+
+
+class AggregateStore:
+    """Aggregates of the first existing path in ``dataset_paths``"""
+
+    def __init__(self, dataset_paths, chunk_rows=None):
+        self.dataset_paths = list(dataset_paths)
+        self.chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+        self._lock = threading.RLock()
+        self._state = None
+        self.rebuilds = 0
+        self.appends = 0
+
+    @staticmethod
+    def store_path(path):
+        return path + ".aggregates.pkl"
+
+    def dataset_path(self):
+        for path in self.dataset_paths:
+            if os.path.exists(path):
+                return path
+        return None
+
+    # ----- persistence -----
+    def _load_persisted(self, path):
+        try:
+            with open(self.store_path(path), "rb") as f:
+                version, state = pickle.load(f)
+            if version == STORE_VERSION and state.path == path:
+                return state
+        except Exception:
+            pass
+        return None
+
+    def _persist(self, state):
+        state.invalidate()
+        target = self.store_path(state.path)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump((STORE_VERSION, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, target)
+        except OSError as e:
+            print(f"⚠️ Could not persist aggregate store: {e}")
+
+    # ----- ingestion -----
+    def _ingest(self, state, chunks):
+        for chunk in chunks:
+            state.eda.update(chunk)
+            if state.eda.label_col:
+                state.labels.update(chunk[state.eda.label_col])
+            if state.eda.main_text_col:
+                state.eda.update_words(chunk[state.eda.main_text_col])
+
+    def _rebuild(self, path, key):
+        import pandas as pd
+
+        state = _State(path)
+        self._ingest(state, pd.read_csv(path, chunksize=self.chunk_rows))
+        text_cols = state.eda.text_columns()
+        if text_cols:
+            state.eda.main_text_col = text_cols[0]
+            for chunk in pd.read_csv(path, usecols=[state.eda.main_text_col], chunksize=self.chunk_rows):
+                state.eda.update_words(chunk[state.eda.main_text_col])
+        if not state.eda.label_col:
+            state.profile_fallback = compute_profile(path)
+        state.size, state.mtime_ns = key["size"], key["mtime_ns"]
+        state.hash = file_digest(path)
+        self.rebuilds += 1
+        print(f"✓ Aggregate store rebuilt for {path} ({state.eda.rows} rows)")
+        return state
+
+    def _is_append(self, state, key):
+        """True when the stored content is an unchanged prefix of the file"""
+        if state.size == 0 or key["size"] <= state.size or not state.eda.label_col:
+            return False
+        with open(state.path, "rb") as f:
+            f.seek(state.size - 1)
+            if f.read(1) != b"\n":
+                return False
+        return file_digest(state.path, limit=state.size) == state.hash
+
+    def _merge_tail(self, state, key):
+        import pandas as pd
+
+        with open(state.path, "rb") as f:
+            header = f.readline()
+            f.seek(state.size)
+            tail = f.read(key["size"] - state.size)
+        previous_main = state.eda.main_text_col
+        chunks = pd.read_csv(io.BytesIO(header + tail), chunksize=self.chunk_rows)
+        self._ingest(state, chunks)
+        text_cols = state.eda.text_columns()
+        if (text_cols[0] if text_cols else None) != previous_main:
+            return None  # main text column changed: word counts need a full pass
+        state.size, state.mtime_ns = key["size"], key["mtime_ns"]
+        state.hash = file_digest(state.path)
+        self.appends += 1
+        print(f"✓ Aggregate store merged {len(tail)} appended bytes ({state.eda.rows} rows)")
+        return state
+
+    def _refresh(self, path, key):
+        state = self._state if self._state and self._state.path == path else None
+        if state is None or (state.size, state.mtime_ns) != (key["size"], key["mtime_ns"]):
+            persisted = self._load_persisted(path)
+            if persisted and (persisted.size, persisted.mtime_ns) == (key["size"], key["mtime_ns"]):
+                return persisted
+            state = persisted or state
+        if state is None:
+            new = self._rebuild(path, key)
+        elif (state.size, state.mtime_ns) == (key["size"], key["mtime_ns"]):
+            return state
+        elif state.size == key["size"] and file_digest(path) == state.hash:
+            state.mtime_ns = key["mtime_ns"]
+            new = state
+        elif self._is_append(state, key):
+            new = self._merge_tail(state, key) or self._rebuild(path, key)
+        else:
+            new = self._rebuild(path, key)
+        self._persist(new)
+        return new
+
+    def state(self):
+        """Up-to-date state for the current dataset file, or None"""
+        path = self.dataset_path()
+        if path is None:
+            return None
+        key = stat_key(path)
+        state = self._state
+        if state and state.path == path and (state.size, state.mtime_ns) == (key["size"], key["mtime_ns"]):
+            return state
+        with self._lock:
+            self._state = self._refresh(path, key)
+            return self._state
+
+    # ----- readers -----
+    def dataset_stats(self):
+        """{"stress", "nonStress", "trend"} or None without a dataset"""
+        state = self.state()
+        if state is None:
+            return None
+        with self._lock:
+            if state._profile is None:
+                state._profile = state.profile_fallback or state.labels.profile()
+            return state._profile
+
+    def eda(self):
+        """/eda payload computed from the aggregates, or None without a dataset"""
+        state = self.state()
+        if state is None:
+            return None
+        with self._lock:
+            if state._eda_payload is None:
+                state._eda_payload = state.eda.result()
+            return state._eda_payload
+
+    # ----- writers -----
+    def append(self, rows):
+        """
+        Append a DataFrame of new rows to the dataset and merge them into the
+        aggregates (only the new rows are parsed). Returns the new row count.
+        """
+        with self._lock:
+            state = self.state()
+            if state is None:
+                raise FileNotFoundError("No dataset to append to")
+            rows = rows.reindex(columns=state.eda.columns)
+            with open(state.path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+            rows.to_csv(state.path, mode="a", header=False, index=False)
+            return self.state().eda.rows
+
+    def rebuild(self):
+        with self._lock:
+            path = self.dataset_path()
+            if path is None:
+                return None
+            self._state = self._rebuild(path, stat_key(path))
+            self._persist(self._state)
+            return self._state
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as backend
+
+    parser = argparse.ArgumentParser(description="Maintain the /eda and /dataset-stats aggregate store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    append_cmd = sub.add_parser("append", help="Append rows from a CSV file to the dataset")
+    append_cmd.add_argument("csv")
+    sub.add_parser("rebuild", help="Recompute every aggregate from the dataset")
+    args = parser.parse_args(argv)
+
+    store = backend.AGGREGATE_STORE
+    if args.command == "rebuild":
+        state = store.rebuild()
+        print(f"✓ {state.eda.rows if state else 0} rows")
+        return
+
+    import pandas as pd
+    rows = pd.read_csv(args.csv)
+    total = store.append(rows)
+    print(f"✓ Appended {len(rows)} rows from {args.csv} ({total} rows total)")
+
+
+if __name__ == "__main__":
+    main()
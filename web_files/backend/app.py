@@ -1,16 +1,35 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 import os
+import sys
+import atexit
+import glob
+import hashlib
 import json
-import joblib
+import time
+import threading
 import numpy as np
-import pandas as pd
 from datetime import datetime
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
 from collections import Counter
 import re
 
+# pandas, joblib and scikit-learn are imported where they are used: together
+# they take well over a second to import and are only needed once models or
+# the dataset are loaded, which happens in the background (see load_models).
+
+from aggregate_store import AggregateStore
+from figure_store import VARIANTS as FIGURE_VARIANTS, FigureStore
+from bulk_scoring import BulkInputError, detach_upload, open_records, stream_scores
+from micro_batcher import MicroBatcher, QueueFullError, QueueTimeoutError
+from model_registry import COMMANDS as MODEL_COMMANDS, ModelRegistry, ModelVersion
+from prediction_cache import PredictionCache
+from prediction_log import PredictionLog, parse_time
+from prediction_stats import PredictionStats
+from proc_memory import process_memory, workers_memory
+from telemetry import TELEMETRY, StageTimer
+from text_features import split_model
+
 app = Flask(__name__)
 CORS(app)
 
@@ -37,6 +56,7 @@ class FusionEnsemble:
             'weight': weight
         })
         self.weights.append(weight)
+        self._shared = None
         
     def fit(self, X, y):
         """Fit all models with their respective vectorizers"""
@@ -53,49 +73,210 @@ class FusionEnsemble:
             
             print(f"✓ Features: {X_vec.shape[1]}")
         
+        self._shared = None
         print("✓ Fusion ensemble training complete!")
         return self
     
+    def transform_members(self, texts, observe=None):
+        """
+        Vectorize texts for every member, tokenizing each text only once.
+        Members whose vectorizers share an analyzer configuration reuse the
+        same token / n-gram stream; results match vectorizer.transform exactly.
+        ``observe(member, seconds)`` receives per-member timings (optional).
+        """
+        return self._shared_transformer().transform(texts, observe=observe)
+    
+    def _shared_transformer(self):
+        shared = getattr(self, '_shared', None)
+        if shared is None:
+            from text_features import SharedTextTransformer
+            shared = SharedTextTransformer([m['vectorizer'] for m in self.models])
+            self._shared = shared
+        return shared
+    
+    @staticmethod
+    def member_proba(model, X_vec):
+        """Probability matrix for a single member on its own feature matrix"""
+        if hasattr(model, 'predict_proba'):
+            return model.predict_proba(X_vec)
+        elif hasattr(model, 'decision_function'):
+            # For SVM
+            decision = model.decision_function(X_vec)
+            if decision.ndim == 1:
+                decision = np.column_stack([-decision, decision])
+            # Convert to probabilities
+            from scipy.special import softmax
+            return softmax(decision, axis=1)
+        else:
+            # Fallback: use hard predictions
+            pred = model.predict(X_vec)
+            proba = np.zeros((len(pred), len(np.unique(pred))))
+            proba[np.arange(len(pred)), pred] = 1.0
+            return proba
+    
+    def combine_member_probas(self, probas):
+        """Weighted average of the members' probability matrices"""
+        all_predictions = [proba * model_dict['weight'] for model_dict, proba in zip(self.models, probas)]
+        return np.sum(all_predictions, axis=0) / np.sum(self.weights)
+    
     def predict_proba(self, texts):
         """Get probability predictions from all models"""
-        all_predictions = []
-        
-        for model_dict in self.models:
-            model = model_dict['model']
-            vectorizer = model_dict['vectorizer']
-            weight = model_dict['weight']
-            
-            # Transform with THIS model's vectorizer
-            X_vec = vectorizer.transform(texts)
-            
-            # Get predictions
-            if hasattr(model, 'predict_proba'):
-                proba = model.predict_proba(X_vec)
-            elif hasattr(model, 'decision_function'):
-                # For SVM
-                decision = model.decision_function(X_vec)
-                if decision.ndim == 1:
-                    decision = np.column_stack([-decision, decision])
-                # Convert to probabilities
-                from scipy.special import softmax
-                proba = softmax(decision, axis=1)
-            else:
-                # Fallback: use hard predictions
-                pred = model.predict(X_vec)
-                proba = np.zeros((len(pred), len(np.unique(pred))))
-                proba[np.arange(len(pred)), pred] = 1.0
-            
-            # Weight the predictions
-            all_predictions.append(proba * weight)
-        
-        # Average weighted predictions
-        avg_predictions = np.sum(all_predictions, axis=0) / np.sum(self.weights)
-        return avg_predictions
+        probas = [
+            self.member_proba(model_dict['model'], X_vec)
+            for model_dict, X_vec in zip(self.models, self.transform_members(texts))
+        ]
+        return self.combine_member_probas(probas)
     
     def predict(self, texts):
         """Get class predictions"""
         probas = self.predict_proba(texts)
         return np.argmax(probas, axis=1)
+    
+    def predict_with_proba(self, texts):
+        """Class predictions and probabilities from a single ensemble pass"""
+        probas = self.predict_proba(texts)
+        return np.argmax(probas, axis=1), probas
+    
+    # ----- early-exit cascade -----
+    def member_costs(self, texts):
+        """Seconds each member takes to vectorize and score ``texts``"""
+        costs = [0.0] * len(self.models)
+        
+        def observe(member, seconds):
+            if member != "tokenize":
+                costs[member - 1] += seconds
+        
+        for i, (model_dict, X_vec) in enumerate(zip(self.models, self.transform_members(texts, observe=observe))):
+            started = time.perf_counter()
+            self.member_proba(model_dict['model'], X_vec)
+            costs[i] += time.perf_counter() - started
+        return costs
+    
+    def configure_cascade(self, order=None, margin=0.0):
+        """
+        Evaluate members in ``order`` (0-based indices, cheapest first) and
+        stop for a text as soon as the members still to run cannot change
+        its label: the lead of the top class in the weighted partial sum
+        exceeds the remaining weight. ``margin`` (0 <= margin < 1) lets a
+        text exit once the lead exceeds ``(1 - margin)`` of the remaining
+        weight; 0 is the strict mode, whose labels always match the full
+        ensemble. ``order=None`` turns the cascade off.
+        """
+        if order is None:
+            self._cascade = None
+            return self
+        order = [int(i) for i in order]
+        if sorted(order) != list(range(len(self.models))):
+            raise ValueError(f"Cascade order must be a permutation of 0..{len(self.models) - 1}")
+        if not 0.0 <= margin < 1.0:
+            raise ValueError("Cascade margin must be in [0, 1)")
+        self._cascade = {
+            'order': order,
+            'margin': float(margin),
+            'texts': 0,
+            'exits': [0] * len(order),
+            'lock': threading.Lock(),
+        }
+        return self
+    
+    @property
+    def cascade_enabled(self):
+        return getattr(self, '_cascade', None) is not None
+    
+    def predict_cascade(self, texts, observe_vectorize=None, observe_model=None):
+        """
+        (pred_idx, proba) through the early-exit cascade. Texts that exit
+        early get the weighted average of the members evaluated so far as
+        their probabilities; the others get the full ensemble average.
+        ``observe_*(member, seconds)`` receive per-member timings (optional).
+        """
+        cascade = self._cascade
+        shared = self._shared_transformer()
+        texts = list(texts)
+        started = time.perf_counter()
+        features = shared.analyze(texts) if shared.shared else {}
+        if observe_vectorize is not None:
+            observe_vectorize("tokenize", time.perf_counter() - started)
+        
+        total_weight = float(np.sum(self.weights))
+        tolerance = 1e-9 * total_weight  # float rounding of the partial sums
+        rows = np.arange(len(texts))
+        member_probas = {}  # member -> probabilities of the rows still running
+        partial = None
+        evaluated_weight = 0.0
+        proba = pred_idx = None
+        exits = [0] * len(cascade['order'])
+        for stage, member in enumerate(cascade['order']):
+            model_dict = self.models[member]
+            started = time.perf_counter()
+            if len(rows) == len(texts):
+                member_texts, member_features = texts, features
+            else:
+                member_texts = [texts[r] for r in rows]
+                member_features = {key: [values[r] for r in rows] for key, values in features.items()}
+            X_vec = shared.build(member, member_texts, member_features)
+            if observe_vectorize is not None:
+                observe_vectorize(member + 1, time.perf_counter() - started)
+            started = time.perf_counter()
+            member_probas[member] = self.member_proba(model_dict['model'], X_vec)
+            if observe_model is not None:
+                observe_model(member + 1, time.perf_counter() - started)
+            if proba is None:
+                proba = np.zeros((len(texts), member_probas[member].shape[1]))
+                pred_idx = np.zeros(len(texts), dtype=np.int64)
+            
+            if stage == len(cascade['order']) - 1:
+                # Same arithmetic (and member order) as predict_proba
+                proba[rows] = self.combine_member_probas([member_probas[i] for i in range(len(self.models))])
+                pred_idx[rows] = np.argmax(proba[rows], axis=1)
+                exits[stage] = len(rows)
+                break
+            
+            weighted = member_probas[member] * model_dict['weight']
+            partial = weighted if partial is None else partial + weighted
+            evaluated_weight += model_dict['weight']
+            top2 = np.sort(partial, axis=1)[:, -2:]
+            lead = top2[:, 1] - top2[:, 0]
+            done = lead > (total_weight - evaluated_weight) * (1.0 - cascade['margin']) + tolerance
+            if done.any():
+                proba[rows[done]] = partial[done] / evaluated_weight
+                pred_idx[rows[done]] = np.argmax(partial[done], axis=1)
+                exits[stage] = int(done.sum())
+                keep = ~done
+                rows, partial = rows[keep], partial[keep]
+                member_probas = {i: p[keep] for i, p in member_probas.items()}
+            if len(rows) == 0:
+                break
+        
+        with cascade['lock']:
+            cascade['texts'] += len(texts)
+            cascade['exits'] = [a + b for a, b in zip(cascade['exits'], exits)]
+        return pred_idx, proba
+    
+    def cascade_stats(self):
+        """Fraction of texts that exited after each cascade stage"""
+        cascade = getattr(self, '_cascade', None)
+        if cascade is None:
+            return {"enabled": False}
+        with cascade['lock']:
+            texts, exits = cascade['texts'], list(cascade['exits'])
+        return {
+            "enabled": True,
+            "order": [i + 1 for i in cascade['order']],
+            "margin": cascade['margin'],
+            "strict": cascade['margin'] == 0.0,
+            "texts": texts,
+            "stages": [
+                {"member": member + 1, "exits": n, "fraction": round(n / texts, 4) if texts else 0.0}
+                for member, n in zip(cascade['order'], exits)
+            ],
+        }
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_shared', None)
+        state.pop('_cascade', None)
+        return state
 
 # Resolve paths relative to backend directory
 # In Docker: backend is at /app/backend/, ml_model is at /app/ml_model/
@@ -113,22 +294,93 @@ else:
 
 ML_DIR = os.path.join(REPO_ROOT, "ml_model")
 
-# In-memory stats
-PREDICTION_COUNTS = {"Stress": 0, "Non-Stress": 0}
-RECENT_PREDICTIONS = []  # last 50
+# Prediction stats, shared with serve.py's forked workers (see prediction_stats.py)
+PREDICTION_STATS = PredictionStats(
+    path=os.getenv("PREDICTION_STATS_PATH") or None,
+    slots=int(os.getenv("PREDICTION_STATS_SLOTS", "64")),
+    recent=50,
+)
+
+# Runtime data written by the server (kept out of the source checkout)
+DATA_DIR = os.getenv("DATA_DIR") or os.path.join(
+    os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+    "mental-stress-detection",
+)
+
+# Append-only log of every prediction (see prediction_log.py), opt-in
+PREDICTION_LOG_DIR = os.getenv("PREDICTION_LOG_DIR") or os.path.join(DATA_DIR, "prediction_log")
+PREDICTION_LOG = None
+if os.getenv("PREDICTION_LOG", "0").lower() in ("1", "true", "yes"):
+    PREDICTION_LOG = PredictionLog(
+        PREDICTION_LOG_DIR,
+        segment_bytes=int(float(os.getenv("PREDICTION_LOG_SEGMENT_MB", "64")) * 1024 * 1024),
+        segment_seconds=float(os.getenv("PREDICTION_LOG_SEGMENT_SECONDS", "3600")),
+        flush_interval=float(os.getenv("PREDICTION_LOG_FLUSH_SECONDS", "1")),
+        max_segments=int(os.getenv("PREDICTION_LOG_MAX_SEGMENTS", "500")),
+        max_age=float(os.getenv("PREDICTION_LOG_MAX_AGE_HOURS", "168")) * 3600,
+    )
+    atexit.register(PREDICTION_LOG.close)
+
+
+BUNDLE_DIR = os.getenv("MODEL_BUNDLE_DIR", os.path.join(ML_DIR, "models", "bundles"))
+BUNDLE_VERIFY = os.getenv("MODEL_BUNDLE_VERIFY", "1").lower() not in ("0", "false", "no")
+
+
+def _record_artifact(name, path, fmt):
+    """Expose the on-disk size of a loaded artifact as a telemetry gauge"""
+    try:
+        if fmt == "bundle":
+            from model_bundle import bundle_size
+            size = bundle_size(path)
+        else:
+            size = os.path.getsize(path)
+    except (OSError, ValueError, KeyError):
+        return
+    TELEMETRY.set_gauge("model_artifact_bytes", size, artifact=name, format=fmt)
+
+
+def load_model_bundle(name):
+    """Load ml_model/models/bundles/<name> (see model_bundle.py) if it exists"""
+    bundle_path = os.path.join(BUNDLE_DIR, name)
+    if not os.path.exists(os.path.join(bundle_path, "manifest.json")):
+        return None
+    try:
+        from model_bundle import load_bundle
+        from model_compression import CompressedLinearClassifier
+        started = time.perf_counter()
+        classes = {"FusionEnsemble": FusionEnsemble, "CompressedLinearClassifier": CompressedLinearClassifier}
+        objects, _ = load_bundle(bundle_path, classes=classes, verify=BUNDLE_VERIFY)
+        print(f"✓ Loaded model bundle from: {bundle_path} ({(time.perf_counter() - started) * 1000:.1f} ms)")
+        _record_artifact(name, bundle_path, "bundle")
+        return objects
+    except Exception as e:
+        print(f"⚠️ Error loading model bundle {bundle_path}: {e}")
+        return None
 
 
 def load_fusion_ensemble():
     """Load the fusion ensemble model from ml_model directory"""
+    bundle = load_model_bundle("fusion_ensemble")
+    if bundle is not None:
+        return bundle["model"], bundle.get("label_encoder")
+
     fusion_path = os.path.join(ML_DIR, "models", "fusion_ensemble.pkl")
     label_encoder_path = os.path.join(ML_DIR, "models", "label_encoder.pkl")
     
     if os.path.exists(fusion_path):
+        import joblib
+        # The ensemble is pickled from a notebook as __main__.FusionEnsemble;
+        # make it resolvable when app is imported (serve.py, CLI tools).
+        main_module = sys.modules.get("__main__")
+        if main_module is not None and not hasattr(main_module, "FusionEnsemble"):
+            main_module.FusionEnsemble = FusionEnsemble
         try:
             fusion_model = joblib.load(fusion_path)
             label_encoder = None
             if os.path.exists(label_encoder_path):
                 label_encoder = joblib.load(label_encoder_path)
+                _record_artifact("label_encoder", label_encoder_path, "pickle")
+            _record_artifact("fusion_ensemble", fusion_path, "pickle")
             print(f"✓ Loaded fusion ensemble from: {fusion_path}")
             return fusion_model, label_encoder
         except Exception as e:
@@ -146,9 +398,14 @@ def load_other_models():
     ]
     
     for path in candidates:
+        bundle = load_model_bundle(os.path.splitext(os.path.basename(path))[0])
+        if bundle is not None:
+            return bundle["model"]
         if os.path.exists(path):
             try:
+                import joblib
                 model = joblib.load(path)
+                _record_artifact(os.path.splitext(os.path.basename(path))[0], path, "pickle")
                 print(f"✓ Loaded model from: {path}")
                 return model
             except Exception as e:
@@ -169,6 +426,7 @@ def load_vectorizer():
     for path in vectorizer_candidates:
         if os.path.exists(path):
             try:
+                import joblib
                 vec = joblib.load(path)
                 # Handle dict of vectorizers
                 if isinstance(vec, dict):
@@ -187,80 +445,23 @@ def load_vectorizer():
     return None
 
 
+FALLBACK_CACHE_DIR = os.getenv("FALLBACK_CACHE_DIR", os.path.join(ML_DIR, "models", "cache"))
+
+
 def build_fallback_pipeline():
-    """Build a simple fallback pipeline if no models are found"""
+    """
+    Fallback TF-IDF + LogisticRegression pipeline if no models are found.
+    Cached on disk by dataset content and training parameters (fallback_model.py).
+    """
     try:
-        # Try to load dataset to fit vectorizer
+        from fallback_model import load_or_train
+        
         dataset_paths = [
             os.path.join(ML_DIR, "stress.csv"),
             os.path.join(REPO_ROOT, "stress.csv"),
         ]
-        
-        texts = []
-        for path in dataset_paths:
-            if os.path.exists(path):
-                try:
-                    df = pd.read_csv(path)
-                    # Find text column
-                    text_col = None
-                    for col in ["text", "clean_text", "post_id", "content"]:
-                        if col in df.columns:
-                            text_col = col
-                            break
-                    if text_col is None:
-                        # Use first object column
-                        obj_cols = [c for c in df.columns if df[c].dtype == "object"]
-                        text_col = obj_cols[0] if obj_cols else None
-                    
-                    if text_col:
-                        texts.extend(df[text_col].dropna().astype(str).tolist()[:10000])
-                        break
-                except Exception as e:
-                    print(f"⚠️ Error loading dataset from {path}: {e}")
-                    continue
-        
-        if len(texts) == 0:
-            # Use minimal training data
-            texts = [
-                "I feel calm and relaxed today.",
-                "I am overwhelmed and stressed about my work.",
-                "Everything is fine and I am doing great.",
-                "Panic and anxiety attacks are getting worse.",
-                "I feel happy and content with my life.",
-                "Work is causing me extreme stress and anxiety.",
-            ]
-            y = [0, 1, 0, 1, 0, 1]
-        else:
-            # Try to get labels from dataset
-            try:
-                df = pd.read_csv(dataset_paths[0])
-                label_col = None
-                for col in ["label", "target", "class"]:
-                    if col in df.columns:
-                        label_col = col
-                        break
-                if label_col:
-                    y = df[label_col].values[:len(texts)]
-                else:
-                    y = [0, 1] * (len(texts) // 2)
-            except:
-                y = [0, 1] * (len(texts) // 2)
-        
-        vec = TfidfVectorizer(max_features=5000, ngram_range=(1, 2), min_df=1)
-        X = vec.fit_transform(texts)
-        clf = LogisticRegression(max_iter=1000, random_state=42)
-        clf.fit(X, y)
-        
-        class PrefitVectorizerWrapper:
-            def __init__(self, vectorizer):
-                self.vectorizer = vectorizer
-            def fit(self, X, y=None):
-                return self
-            def transform(self, X):
-                return self.vectorizer.transform(X)
-        
-        from sklearn.pipeline import Pipeline as SKPipeline
-        pipeline = SKPipeline([("tfidf", PrefitVectorizerWrapper(vec)), ("clf", clf)])
+        dataset_path = next((p for p in dataset_paths if os.path.exists(p)), None)
+        pipeline = load_or_train(dataset_path, FALLBACK_CACHE_DIR)
         print("✓ Built fallback pipeline")
         return pipeline
     except Exception as e:
@@ -268,31 +469,340 @@ def build_fallback_pipeline():
         return None
 
 
-# Load models on startup
-print("=" * 70)
-print("Loading Mental Stress Detection Models...")
-print("=" * 70)
+# Synthetic inputs used to check compiled scorers against sklearn
+SAMPLE_TEXTS = [
+    "I feel calm and relaxed today.",
+    "I am overwhelmed and stressed about my work.",
+    "Everything is fine and I am doing great.",
+    "Panic and anxiety attacks are getting worse.",
+    "I can't sleep, my heart is racing and I keep worrying about rent",
+    "We went hiking this weekend and it was lovely",
+    "",
+    "!!!",
+]
 
-FUSION_MODEL, LABEL_ENCODER = load_fusion_ensemble()
-OTHER_MODEL = load_other_models() if FUSION_MODEL is None else None
-FALLBACK_PIPELINE = None
 
-if FUSION_MODEL is None and OTHER_MODEL is None:
-    print("⚠️ No trained models found, building fallback pipeline...")
-    FALLBACK_PIPELINE = build_fallback_pipeline()
+def verification_texts(limit=200):
+    """Synthetic samples plus the first rows of stress.csv when available"""
+    texts = list(SAMPLE_TEXTS)
+    path = os.path.join(ML_DIR, "stress.csv")
+    if os.path.exists(path):
+        try:
+            import pandas as pd
+            df = pd.read_csv(path, nrows=limit)
+            for col in ["text", "clean_text", "content"]:
+                if col in df.columns:
+                    texts.extend(df[col].dropna().astype(str).tolist())
+                    break
+        except Exception as e:
+            print(f"⚠️ Error reading verification texts: {e}")
+    return texts
 
-print("=" * 70)
+
+def compile_serving_model(model):
+    """
+    Fold the resolved model into a term -> weight table (SCORING_MODE=compiled).
+    The compiled scorer is only used if it matches the original predictions.
+    """
+    from compiled_scorer import CompileError, compile_model, verify_compiled
+    try:
+        compiled = compile_model(model)
+        ok, max_diff = verify_compiled(model, compiled, verification_texts())
+    except CompileError as e:
+        print(f"⚠️ Compiled scoring unavailable: {e}")
+        return None
+    except Exception as e:
+        print(f"⚠️ Error compiling model: {e}")
+        return None
+    if not ok:
+        print(f"⚠️ Compiled scorer does not match model (max diff {max_diff:.2e}), using sklearn")
+        return None
+    print(f"✓ Compiled scorer verified: {compiled.n_terms} terms (max diff {max_diff:.2e})")
+    return compiled
+
+
+SCORING_MODE = os.getenv("SCORING_MODE", "sklearn").lower()
+TEXT_NORMALIZATION = os.getenv("TEXT_NORMALIZATION", "1").lower() in ("1", "true", "yes")
+TEXT_NORMALIZER = None  # set by load_model_version when TEXT_NORMALIZATION=1
+COMPACT_VOCABULARY = os.getenv("COMPACT_VOCABULARY", "1").lower() in ("1", "true", "yes")
+
+
+def build_text_normalizer():
+    """
+    The training notebook's text preprocessing for serving (TEXT_NORMALIZATION=1).
+    Checked against the notebook code on the verification texts; on any
+    difference the notebook code itself is used.
+    """
+    from text_normalizer import TextNormalizer, check_parity, load_config, reference_clean, time_per_text
+    try:
+        normalizer = TextNormalizer(load_config(os.path.join(ML_DIR, "preprocessors", "text_preprocessing_results.json")))
+    except Exception as e:
+        print(f"⚠️ Text normalization disabled: {e}")
+        return None
+    texts = verification_texts()
+    mismatches, examples = check_parity(normalizer, texts)
+    if mismatches:
+        print(f"⚠️ Text normalizer differs from the notebook pipeline on {mismatches}/{len(texts)} texts "
+              f"(e.g. {examples[0]['text'][:60]!r}), using the notebook code")
+        normalizer.normalize = lambda text: reference_clean(text, normalizer.config)
+        normalizer.implementation = "notebook"
+        return normalizer
+    normalizer.implementation = "fast"
+    print(f"✓ Text normalizer matches the notebook pipeline on {len(texts)} texts "
+          f"({time_per_text(normalizer.normalize, texts, repeat=1) * 1e6:.0f} µs/text)")
+    return normalizer
+
+
+def text_normalization_info(model_type=None):
+    """Whether requests scored by ``model_type`` are normalized first, and how (for /health and model info)"""
+    applied = TEXT_NORMALIZER is not None and model_type != "fallback"
+    return {
+        "enabled": TEXT_NORMALIZATION,
+        "applied": applied,
+        "implementation": TEXT_NORMALIZER.implementation if applied else None,
+        "config": dict(TEXT_NORMALIZER.config) if applied else None,
+    }
+
+
+def compact_model_vocabulary(model):
+    """Share one read-only term table between the model's vectorizers (COMPACT_VOCABULARY=1)"""
+    from compact_vocab import compact_vocabularies
+    try:
+        stats = compact_vocabularies(model)
+    except Exception as e:
+        print(f"⚠️ Error compacting vocabulary: {e}")
+        return
+    if stats is None:
+        return
+    if hasattr(model, "_shared"):
+        model._shared = None  # rebuild the shared transformer on the new vocabularies
+    print(f"✓ Compact vocabulary: {stats['entries']} entries of {stats['vectorizers']} vectorizers "
+          f"-> {stats['terms']} shared terms")
+
+# Background loading progress, reported by /readyz and /health
+MODEL_STATE = {
+    "status": "idle",  # idle -> loading -> ready | failed
+    "stage": None,
+    "progress": 0.0,
+    "started_at": None,
+    "load_seconds": None,
+    "error": None,
+}
+_MODEL_LOADER = None
+_MODEL_LOADER_LOCK = threading.Lock()
+_STAGE_STARTED = None
+
+
+def _set_stage(stage, progress):
+    """Advance the loading stage; the finished stage's duration goes to telemetry"""
+    global _STAGE_STARTED
+    now = time.perf_counter()
+    if MODEL_STATE["stage"] is not None and _STAGE_STARTED is not None:
+        TELEMETRY.set_gauge("model_load_seconds", round(now - _STAGE_STARTED, 6), stage=MODEL_STATE["stage"])
+    _STAGE_STARTED = now
+    MODEL_STATE["stage"] = stage
+    MODEL_STATE["progress"] = progress
+
+
+def warm_up(version):
+    """Score synthetic inputs so lazy structures are built before traffic arrives"""
+    model, label_encoder, model_type = version.as_tuple()
+    texts = [t for t in SAMPLE_TEXTS if t.strip()]
+    try:
+        predict_batch(texts, model, label_encoder, model_type)
+        for text in texts:
+            predict_batch([text], model, label_encoder, model_type)
+        print(f"✓ Warm-up scored {len(texts)} synthetic texts")
+    except Exception as e:
+        print(f"⚠️ Warm-up failed: {e}")
+
+
+def model_fingerprint():
+    """Size and mtime of the model artifacts, used to notice new files on disk"""
+    paths = glob.glob(os.path.join(ML_DIR, "models", "*.pkl"))
+    if BUNDLE_DIR:
+        paths += glob.glob(os.path.join(BUNDLE_DIR, "*", "manifest.json"))
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_model_version(report=None):
+    """
+    Load, optionally compile and warm up a new ModelVersion (blocking):
+    fusion ensemble first, then the other models, then the fallback pipeline.
+    ``report(stage, progress)`` is told about each stage. Returns None when
+    nothing could be loaded.
+    """
+    global TEXT_NORMALIZER
+    report = report or (lambda stage, progress: None)
+    fingerprint = model_fingerprint()
+    if TEXT_NORMALIZATION:
+        TEXT_NORMALIZER = build_text_normalizer()
+    
+    report("fusion_ensemble", 0.1)
+    model, label_encoder = load_fusion_ensemble()
+    model_type = "fusion_ensemble"
+    if model is None:
+        report("other_models", 0.3)
+        model, label_encoder, model_type = load_other_models(), None, "other_model"
+    if model is None:
+        report("fallback_pipeline", 0.5)
+        print("⚠️ No trained models found, building fallback pipeline...")
+        model, model_type = build_fallback_pipeline(), "fallback"
+    if model is None:
+        return None
+    
+    if COMPACT_VOCABULARY:
+        compact_model_vocabulary(model)
+    if model_type == "fusion_ensemble" and FUSION_CASCADE:
+        configure_fusion_cascade(model)
+    if SCORING_MODE == "compiled":
+        report("compile", 0.7)
+        compiled = compile_serving_model(model)
+        if compiled is not None:
+            model = compiled
+    
+    version = ModelVersion(model, label_encoder, model_type, fingerprint)
+    version.text_normalization = text_normalization_info(model_type)
+    report("warm_up", 0.9)
+    warm_up(version)
+    return version
+
+
+FUSION_CASCADE = os.getenv("FUSION_CASCADE", "0").lower() in ("1", "true", "yes")
+
+
+def configure_fusion_cascade(fusion):
+    """
+    Enable the early-exit cascade (FUSION_CASCADE=1). Members run in
+    FUSION_CASCADE_ORDER (1-based, e.g. "2,4,3,1") or, by default, from the
+    cheapest to the most expensive as measured on the verification texts.
+    """
+    if not hasattr(fusion, "configure_cascade"):
+        print("⚠️ Fusion cascade unavailable for this model")
+        return
+    try:
+        order = os.getenv("FUSION_CASCADE_ORDER")
+        if order:
+            order = [int(i) - 1 for i in order.split(",")]
+        else:
+            costs = fusion.member_costs(verification_texts())
+            order = sorted(range(len(costs)), key=costs.__getitem__)
+        fusion.configure_cascade(order, margin=float(os.getenv("FUSION_CASCADE_MARGIN", "0")))
+    except ValueError as e:
+        print(f"⚠️ Fusion cascade disabled: {e}")
+        return
+    stats = fusion.cascade_stats()
+    mode = "strict" if stats["strict"] else f"margin {stats['margin']}"
+    print(f"✓ Fusion cascade enabled: members {stats['order']} ({mode})")
+
+
+def _publish_model_info(version=None):
+    """Point the model_info gauge at the version now being served"""
+    TELEMETRY.clear_gauge("model_info")
+    normalized = bool(version and version.text_normalization and version.text_normalization["applied"])
+    TELEMETRY.set_gauge("model_info", 1, model_type=version.model_type if version else "none",
+                        version=version.version if version else "none", scoring_mode=SCORING_MODE,
+                        text_normalization="1" if normalized else "0")
+
+
+def load_models():
+    """
+    Load the initial model version and make it the active one (blocking).
+    Runs in a background thread for `python app.py`; serve.py calls it
+    directly in the parent so the workers inherit loaded models.
+    Later versions are loaded by MODEL_REGISTRY (see /admin/models).
+    """
+    started = time.perf_counter()
+    MODEL_STATE.update(status="loading", started_at=datetime.utcnow().isoformat() + "Z", error=None)
+    try:
+        print("=" * 70)
+        print("Loading Mental Stress Detection Models...")
+        print("=" * 70)
+        
+        version = load_model_version(report=_set_stage)
+        if version is not None:
+            MODEL_REGISTRY.activate(version)
+        _set_stage(None, 1.0)
+        MODEL_STATE.update(status="ready")
+    except Exception as e:
+        print(f"⚠️ Error loading models: {e}")
+        MODEL_STATE.update(status="failed", error=str(e))
+    MODEL_STATE["load_seconds"] = round(time.perf_counter() - started, 3)
+    TELEMETRY.set_gauge("model_load_seconds", MODEL_STATE["load_seconds"], stage="total")
+    if MODEL_REGISTRY.active is None:
+        _publish_model_info(None)
+    print(f"✓ Model loading finished in {MODEL_STATE['load_seconds']}s")
+    try:
+        stats = FIGURE_STORE.warm()
+        print(f"✓ Indexed {stats['figures']} figures ({stats['cached_bytes'] / 2**20:.1f} MB in memory)")
+        if not stats["variants_available"]:
+            print("⚠️ Pillow is not installed: /figures?size= returns the original images")
+    except Exception as e:
+        print(f"⚠️ Could not index figures: {e}")
+    print("=" * 70)
+
+
+def start_model_loading():
+    """Start load_models() in a background thread (only once per process)"""
+    global _MODEL_LOADER
+    with _MODEL_LOADER_LOCK:
+        if _MODEL_LOADER is None and MODEL_STATE["status"] == "idle":
+            MODEL_STATE["status"] = "loading"
+            _MODEL_LOADER = threading.Thread(target=load_models, name="model-loader", daemon=True)
+            _MODEL_LOADER.start()
+    return _MODEL_LOADER
+
+
+def models_ready():
+    return MODEL_STATE["status"] in {"ready", "failed"}
 
 
 def resolve_model():
-    """Resolve which model to use for predictions"""
-    if FUSION_MODEL is not None:
-        return FUSION_MODEL, LABEL_ENCODER, "fusion_ensemble"
-    elif OTHER_MODEL is not None:
-        return OTHER_MODEL, None, "other_model"
-    elif FALLBACK_PIPELINE is not None:
-        return FALLBACK_PIPELINE, None, "fallback"
-    return None, None, None
+    """(model, label_encoder, model_type) of the active version"""
+    version = MODEL_REGISTRY.active
+    if version is None:
+        return None, None, None
+    return version.as_tuple()
+
+
+def resolve_version(route_key=None):
+    """
+    (version, is_canary) for one request. Callers keep the returned version
+    for the whole request, so a swap never changes a request in flight.
+    """
+    version, is_canary = MODEL_REGISTRY.resolve(route_key)
+    if version is None:
+        return None, False
+    return version, is_canary
+
+
+MODEL_REGISTRY = ModelRegistry(
+    load_model_version,
+    model_fingerprint,
+    watch_interval=float(os.getenv("MODEL_WATCH_INTERVAL", "0")),
+    on_change=_publish_model_info,
+)
+
+
+PREDICTION_CACHE = PredictionCache(
+    max_size=int(os.getenv("PREDICTION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", "0")),
+)
+
+
+FIGURE_STORE = FigureStore(
+    [os.path.join(ML_DIR, "reports", "figures"), os.path.join(REPO_ROOT, "reports", "figures")],
+    refresh_seconds=float(os.getenv("FIGURE_REFRESH_SECONDS", "60")),
+    max_bytes=int(float(os.getenv("FIGURE_CACHE_MB", "64")) * 2**20),
+)
+FIGURE_MAX_AGE = int(os.getenv("FIGURE_MAX_AGE", "3600"))
 
 
 @app.route("/", methods=["GET"])
@@ -300,16 +810,103 @@ def index():
     return jsonify({
         "service": "Mental Stress Detection Backend",
         "health": "/health",
+        "livez": "/livez",
+        "readyz": "/readyz",
         "predict": "/predict",
+        "predict_batch": "/predict/batch",
+        "predict_stream": "/predict/stream",
+        "prediction_log": "/predictions/log",
+        "prediction_log_stats": "/predictions/log/stats",
         "stats": "/stats",
         "dataset_stats": "/dataset-stats",
         "eda": "/eda",
         "metrics": "/metrics",
+        "metrics_prometheus": "/metrics/prometheus",
         "tests": "/tests",
         "figures": "/figures",
+        "cache_stats": "/cache/stats",
+        "batcher_stats": "/batcher/stats",
+        "cascade_stats": "/cascade/stats",
+        "workers": "/workers",
+        "admin_models": "/admin/models",
     })
 
 
+@app.before_request
+def _ensure_models_loading():
+    # WSGI servers import app without running __main__; load on first request
+    if MODEL_STATE["status"] == "idle":
+        start_model_loading()
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.before_request
+def _ensure_model_watcher():
+    # Started per process on first request (threads do not survive serve.py's fork)
+    MODEL_REGISTRY.ensure_watcher()
+
+
+_ERROR_CLASSES = {400: "bad_request", 404: "not_found", 405: "method_not_allowed", 503: "unavailable"}
+
+
+@app.after_request
+def _record_request(response):
+    """Request latency, counts per model type and failures per error class"""
+    started = g.get("request_started")
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if started is not None:
+        TELEMETRY.observe("request_seconds", time.perf_counter() - started, endpoint=endpoint)
+    TELEMETRY.inc("requests_total", endpoint=endpoint, status=response.status_code,
+                  model_type=g.get("model_type", "none"))
+    if response.status_code >= 400:
+        error = g.get("error_class") or _ERROR_CLASSES.get(response.status_code, f"http_{response.status_code}")
+        TELEMETRY.inc("errors_total", endpoint=endpoint, error=error)
+    return response
+
+
+def _parse_json():
+    """request.get_json(force=True), timed as the json_parse stage"""
+    with TELEMETRY.timer("stage_seconds", stage="json_parse", endpoint=request.url_rule.rule):
+        return request.get_json(force=True)
+
+
+def _serialize(payload):
+    """jsonify(payload), timed as the serialize stage"""
+    with TELEMETRY.timer("stage_seconds", stage="serialize", endpoint=request.url_rule.rule):
+        return jsonify(payload)
+
+
+def _loading_response():
+    return jsonify({
+        "error": "Model loading",
+        "stage": MODEL_STATE["stage"],
+        "progress": MODEL_STATE["progress"],
+    }), 503
+
+
+@app.route("/livez", methods=["GET"])
+def livez():
+    """Liveness: the process is up and answering"""
+    return jsonify({"status": "alive"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: a model is loaded and warmed up"""
+    model, _, model_type = resolve_model()
+    ready = MODEL_STATE["status"] == "ready" and model is not None
+    return jsonify({
+        "ready": ready,
+        "model_type": model_type,
+        "model_version": MODEL_REGISTRY.active.version if MODEL_REGISTRY.active else None,
+        **MODEL_STATE,
+    }), 200 if ready else 503
+
+
 @app.route("/health", methods=["GET"])
 def health():
     model, label_encoder, model_type = resolve_model()
@@ -328,196 +925,523 @@ def health():
         "model_type": model_type,
         "model_attrs": attrs,
         "label_encoder_loaded": label_encoder is not None,
+        "scoring_mode": "compiled" if getattr(model, "is_compiled", False) else "sklearn",
+        "text_normalization": text_normalization_info(model_type) if model is not None else None,
+        "model_registry": MODEL_REGISTRY.status(),
+        "ready": MODEL_STATE["status"] == "ready" and model is not None,
+        "loading": MODEL_STATE,
+        "prediction_cache": PREDICTION_CACHE.stats(),
+        "micro_batching": MICRO_BATCH_ENABLED,
+        "figures": FIGURE_STORE.stats(),
     })
 
 
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(PREDICTION_CACHE.stats())
+
+
+@app.route("/cascade/stats", methods=["GET"])
+def cascade_stats():
+    """Early-exit cascade of the active fusion ensemble: texts exiting at each stage"""
+    model, _, _ = resolve_model()
+    if not hasattr(model, "cascade_stats"):
+        return jsonify({"enabled": False})
+    return jsonify(model.cascade_stats())
+
+
+@app.route("/workers", methods=["GET"])
+def workers():
+    """Resident memory of this process and, under serve.py, of every worker"""
+    master_pid = os.getenv("SERVE_MASTER_PID")
+    data = {"pid": os.getpid(), "memory": process_memory()}
+    if master_pid:
+        data.update(workers_memory(int(master_pid)))
+    return jsonify(data)
+
+
+@app.route("/batcher/stats", methods=["GET"])
+def batcher_stats():
+    batcher = get_micro_batcher()
+    if batcher is None:
+        return jsonify({"enabled": False})
+    return jsonify(batcher.stats())
+
+
+# ===============================
+# Model administration
+# ===============================
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def _admin_denied():
+    """403 response unless X-Admin-Token matches ADMIN_TOKEN (without one: localhost only)"""
+    if ADMIN_TOKEN:
+        if request.headers.get("X-Admin-Token") == ADMIN_TOKEN:
+            return None
+    elif request.remote_addr in ("127.0.0.1", "::1"):
+        return None
+    g.error_class = "forbidden"
+    return jsonify({"error": "Forbidden"}), 403
+
+
+@app.route("/admin/models", methods=["GET"])
+def admin_models():
+    """Active, previous and candidate model versions of this worker"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    return jsonify(MODEL_REGISTRY.status())
+
+
+@app.route("/admin/models/<command>", methods=["POST"])
+def admin_models_command(command):
+    """
+    reload (optionally {"canary_percent": N}), rollback, promote or discard.
+    Commands are applied asynchronously by every worker; a reload loads and
+    warms the new version in the background while the current one keeps serving.
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    if command not in MODEL_COMMANDS:
+        return jsonify({"error": f"Unknown command: {command}"}), 404
+    argument = 0
+    if command == "reload":
+        data = request.get_json(silent=True) or {}
+        try:
+            argument = int(data.get("canary_percent", 0))
+        except (TypeError, ValueError):
+            return jsonify({"error": "canary_percent must be an integer"}), 400
+        if not 0 <= argument <= 100:
+            return jsonify({"error": "canary_percent must be between 0 and 100"}), 400
+    MODEL_REGISTRY.ensure_watcher()
+    seq = MODEL_REGISTRY.request(command, argument)
+    return jsonify({"accepted": command, "command": seq, "status": MODEL_REGISTRY.status()}), 202
+
+
+class PredictionError(Exception):
+    """Raised when a loaded model cannot score the given texts"""
+
+
+def normalize_label(pred_label):
+    """Map raw model output onto the Stress / Non-Stress display labels"""
+    label = str(pred_label)
+    if label.lower() in {"stress", "1", "true", "stressed"}:
+        return "Stress"
+    elif label.lower() in {"non-stress", "0", "false", "not stress", "nonstress", "non stress"}:
+        return "Non-Stress"
+    return label.capitalize()
+
+
+def _confidences(preds, proba, classes):
+    """Pick the probability of each predicted class, row by row"""
+    if proba is None:
+        return [0.5] * len(preds)
+    if classes is not None:
+        index = {c: i for i, c in enumerate(classes)}
+        cols = np.array([index[p] for p in preds])
+        return proba[np.arange(len(preds)), cols].astype(float).tolist()
+    return np.max(proba, axis=1).astype(float).tolist()
+
+
+def predict_batch(texts, model=None, label_encoder=None, model_type=None):
+    """
+    Score a list of texts in a single pass through the resolved model.
+    Each vectorizer and classifier runs once over the whole list.
+    Returns a list of (label, confidence) tuples in input order.
+    """
+    if model is None:
+        model, label_encoder, model_type = resolve_model()
+    if model is None:
+        raise PredictionError("Model not loaded")
+    if len(texts) == 0:
+        return []
+
+    # Stage timings (normalize / vectorize / model / labels) for /metrics/prometheus
+    stages = StageTimer(TELEMETRY, model_type=model_type or "none")
+
+    # The notebook-trained models saw preprocessed text; the fallback pipeline is trained on raw text
+    if TEXT_NORMALIZER is not None and model_type != "fallback":
+        texts = TEXT_NORMALIZER.normalize_batch(texts)
+        stages.lap("normalize")
+
+    # Handle fusion ensemble
+    if model_type == "fusion_ensemble":
+        try:
+            if getattr(model, "cascade_enabled", False):
+                pred_idx, proba = model.predict_cascade(
+                    texts, observe_vectorize=stages.observer("vectorize"), observe_model=stages.observer("model"))
+            elif hasattr(model, "transform_members"):
+                member_X = model.transform_members(texts, observe=stages.observer("vectorize"))
+                stages.lap("vectorize", member="all")
+                observe_model = stages.observer("model")
+                probas = []
+                for member, (model_dict, X_vec) in enumerate(zip(model.models, member_X), start=1):
+                    member_started = time.perf_counter()
+                    probas.append(model.member_proba(model_dict["model"], X_vec))
+                    observe_model(member, time.perf_counter() - member_started)
+                proba = model.combine_member_probas(probas)
+                pred_idx = np.argmax(proba, axis=1)
+            elif hasattr(model, "predict_with_proba"):
+                pred_idx, proba = model.predict_with_proba(texts)
+            else:
+                proba = model.predict_proba(texts)
+                pred_idx = np.argmax(proba, axis=1)
+            stages.lap("model", member="all")
+            if label_encoder is not None:
+                pred_labels = label_encoder.inverse_transform(pred_idx)
+            else:
+                pred_labels = [str(i) for i in pred_idx]
+            confidences = proba[np.arange(len(pred_idx)), pred_idx].astype(float).tolist()
+        except Exception as e:
+            raise PredictionError(f"Prediction failed: {str(e)}")
+
+    # Handle compiled linear models (SCORING_MODE=compiled)
+    elif getattr(model, "is_compiled", False):
+        try:
+            pred_labels, proba = model.predict_with_proba(texts)
+            stages.lap("model")
+            confidences = _confidences(pred_labels, proba, model.classes_)
+        except Exception as e:
+            raise PredictionError(f"Prediction failed: {str(e)}")
+
+    # Handle sklearn pipeline (including the fallback pipeline)
+    elif hasattr(model, "predict") and hasattr(model, "named_steps"):
+        try:
+            # Run the transformers once and feed predict / predict_proba the
+            # same matrix (Pipeline.predict_proba would vectorize again)
+            X = texts
+            for _, step in model.steps[:-1]:
+                if step is not None and step != "passthrough":
+                    X = step.transform(X)
+            stages.lap("vectorize")
+            clf = model.steps[-1][1]
+            pred_labels = clf.predict(X)
+            proba = clf.predict_proba(X) if hasattr(clf, "predict_proba") else None
+            stages.lap("model")
+            confidences = _confidences(pred_labels, proba, getattr(clf, "classes_", None))
+        except Exception as e:
+            raise PredictionError(f"Prediction failed: {str(e)}")
+
+    # Handle other models (dict or tuple with model and vectorizer)
+    elif isinstance(model, (dict, tuple, list)):
+        clf, vectorizer = split_model(model)
+        if clf is None or vectorizer is None:
+            raise PredictionError("Invalid model structure")
+        try:
+            from text_features import transformer_for
+            X = transformer_for(vectorizer).transform(texts)[0]
+            stages.lap("vectorize")
+            pred_labels = clf.predict(X)
+            proba = clf.predict_proba(X) if hasattr(clf, "predict_proba") else None
+            stages.lap("model")
+            confidences = _confidences(pred_labels, proba, getattr(clf, "classes_", None))
+        except Exception as e:
+            raise PredictionError(f"Prediction failed: {str(e)}")
+
+    else:
+        raise PredictionError("Unsupported model type")
+
+    results = [(normalize_label(l), c) for l, c in zip(pred_labels, confidences)]
+    stages.lap("labels")
+    TELEMETRY.inc("predictions_total", len(results), model_type=model_type or "none")
+    return results
+
+
+def record_predictions(results, model_type=None, latency_ms=None):
+    """
+    Add (label, confidence) results to the shared stats and the prediction log.
+    ``latency_ms`` is the time for all of ``results``; each row is logged with
+    its share.
+    """
+    PREDICTION_STATS.record(results)
+    if PREDICTION_LOG is not None:
+        if latency_ms is not None and len(results) > 1:
+            latency_ms /= len(results)
+        PREDICTION_LOG.append(results, model_type, latency_ms)
+
+
+def _request_ms():
+    """Milliseconds since this request started"""
+    started = g.get("request_started")
+    return (time.perf_counter() - started) * 1000.0 if started is not None else None
+
+
+# Optional dispatcher that coalesces concurrent /predict calls into one batch.
+# Created lazily per process: its worker thread does not survive a fork.
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH", "0").lower() in {"1", "true", "yes"}
+MICRO_BATCHER = None
+_MICRO_BATCHER_PID = None
+_MICRO_BATCHER_LOCK = threading.Lock()
+
+
+def get_micro_batcher():
+    """Return this process's MicroBatcher, or None when micro-batching is off"""
+    global MICRO_BATCHER, _MICRO_BATCHER_PID
+    if not MICRO_BATCH_ENABLED:
+        return None
+    if MICRO_BATCHER is None or _MICRO_BATCHER_PID != os.getpid():
+        with _MICRO_BATCHER_LOCK:
+            if MICRO_BATCHER is None or _MICRO_BATCHER_PID != os.getpid():
+                MICRO_BATCHER = MicroBatcher(
+                    predict_batch,
+                    max_batch_size=int(os.getenv("MICRO_BATCH_MAX_SIZE", "32")),
+                    max_wait_ms=float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5")),
+                    max_queue=int(os.getenv("MICRO_BATCH_QUEUE_DEPTH", "1000")),
+                )
+                _MICRO_BATCHER_PID = os.getpid()
+    return MICRO_BATCHER
+
+
+def score_one(text, model, label_encoder, model_type):
+    """Score a single text, through the micro-batcher when it is enabled"""
+    batcher = get_micro_batcher()
+    if batcher is not None:
+        return batcher.score(text, model, label_encoder, model_type)
+    return predict_batch([text], model, label_encoder, model_type)[0]
+
+
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
-        data = request.get_json(force=True)
+        data = _parse_json()
         text = (data or {}).get("text", "")
-        if not text or not str(text).strip():
+        if text is not None and not isinstance(text, str):
+            return jsonify({"error": "Text must be a string"}), 400
+        if not text or not text.strip():
             return jsonify({"error": "No text provided"}), 400
+        if not models_ready():
+            return _loading_response()
         
-        model, label_encoder, model_type = resolve_model()
-        if model is None:
-            return jsonify({"error": "Model not loaded"}), 500
+        # Canary traffic is routed by text (the same text always gets the same
+        # version) and skips the cache, which holds the active version's results
+        version, is_canary = resolve_version(text)
+        model, label_encoder, model_type = version.as_tuple() if version else (None, None, None)
+        g.model_type = model_type
+        try:
+            if is_canary:
+                result = score_one(text, model, label_encoder, model_type)
+            else:
+                result = PREDICTION_CACHE.get_or_compute(
+                    model, text,
+                    lambda: score_one(text, model, label_encoder, model_type),
+                )
+        except PredictionError as e:
+            g.error_class = "prediction_error"
+            return jsonify({"error": str(e)}), 500
+        except QueueFullError as e:
+            g.error_class = "queue_full"
+            return jsonify({"error": str(e)}), 503
+        except QueueTimeoutError as e:
+            g.error_class = "queue_timeout"
+            return jsonify({"error": str(e)}), 504
         
-        # Handle fusion ensemble
-        if model_type == "fusion_ensemble":
-            try:
-                pred_idx = model.predict([text])[0]
-                proba = model.predict_proba([text])[0]
-                
-                if label_encoder is not None:
-                    pred_label = label_encoder.inverse_transform([pred_idx])[0]
-                else:
-                    pred_label = str(pred_idx)
-                
-                confidence = float(proba[pred_idx])
-            except Exception as e:
-                return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+        label, confidence = result
+        record_predictions([result], model_type, _request_ms())
         
-        # Handle sklearn pipeline
-        elif hasattr(model, "predict") and hasattr(model, "named_steps"):
-            try:
-                pred = model.predict([text])[0]
-                proba = None
-                if hasattr(model, "predict_proba"):
-                    proba = model.predict_proba([text])
-                
-                pred_label = str(pred)
-                confidence = 0.5
-                if proba is not None:
-                    classes = getattr(model.named_steps.get("clf", model), "classes_", None)
-                    if classes is not None:
-                        idx = list(classes).index(pred)
-                        confidence = float(proba[0][idx])
-                    else:
-                        confidence = float(np.max(proba[0]))
-            except Exception as e:
-                return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+        return _serialize({"label": label, "probability": round(confidence, 4)})
+    except Exception as e:
+        g.error_class = type(e).__name__
+        return jsonify({"error": str(e)}), 500
+
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch_route():
+    """
+    Score many texts in one request.
+    Accepts {"items": [{"id": ..., "text": ...}, ...]} or {"texts": [...]}.
+    Every item gets a result, or an "error" when its text is missing, empty
+    or not a string.
+    """
+    try:
+        data = _parse_json() or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object with 'items' or 'texts'"}), 400
+        items = data.get("items")
+        if items is None:
+            texts = data.get("texts") or []
+            if not isinstance(texts, list):
+                return jsonify({"error": "'texts' must be a list of strings"}), 400
+            items = [{"id": i, "text": t} for i, t in enumerate(texts)]
+        elif not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return jsonify({"error": "'items' must be a list of objects"}), 400
+        if len(items) == 0:
+            return jsonify({"error": "No items provided"}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} items)"}), 400
+        if not models_ready():
+            return _loading_response()
         
-        # Handle other models (dict with model and vectorizer)
-        elif isinstance(model, dict):
-            try:
-                clf = model.get("model") or model.get("classifier")
-                vectorizer = model.get("vectorizer")
-                if clf is None or vectorizer is None:
-                    return jsonify({"error": "Invalid model structure"}), 500
-                
-                X = vectorizer.transform([text])
-                pred = clf.predict(X)[0]
-                proba = None
-                if hasattr(clf, "predict_proba"):
-                    proba = clf.predict_proba(X)
-                
-                pred_label = str(pred)
-                confidence = 0.5
-                if proba is not None:
-                    classes = getattr(clf, "classes_", None)
-                    if classes is not None:
-                        idx = list(classes).index(pred)
-                        confidence = float(proba[0][idx])
-                    else:
-                        confidence = float(np.max(proba[0]))
-            except Exception as e:
-                return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+        results = [None] * len(items)
+        valid_pos, valid_texts = [], []
+        for pos, item in enumerate(items):
+            item_id = item.get("id", pos)
+            text = item.get("text")
+            if text is not None and not isinstance(text, str):
+                results[pos] = {"id": item_id, "error": "Text must be a string"}
+                continue
+            if not text or not text.strip():
+                results[pos] = {"id": item_id, "error": "No text provided"}
+                continue
+            results[pos] = {"id": item_id}
+            valid_pos.append(pos)
+            valid_texts.append(text)
         
-        else:
-            return jsonify({"error": "Unsupported model type"}), 500
+        version, is_canary = resolve_version()
+        model, label_encoder, model_type = version.as_tuple() if version else (None, None, None)
+        g.model_type = model_type
+        try:
+            if is_canary:
+                scored = predict_batch(valid_texts, model, label_encoder, model_type)
+            else:
+                scored = PREDICTION_CACHE.get_many(
+                    model, valid_texts,
+                    lambda texts: predict_batch(texts, model, label_encoder, model_type),
+                )
+        except PredictionError as e:
+            g.error_class = "prediction_error"
+            return jsonify({"error": str(e)}), 500
         
-        # Normalize label
-        label = str(pred_label)
-        if label.lower() in {"stress", "1", "true", "stressed"}:
-            label = "Stress"
-        elif label.lower() in {"non-stress", "0", "false", "not stress", "nonstress", "non stress"}:
-            label = "Non-Stress"
-        else:
-            label = label.capitalize()
+        for pos, (label, confidence) in zip(valid_pos, scored):
+            results[pos]["label"] = label
+            results[pos]["probability"] = round(confidence, 4)
+        record_predictions(scored, model_type, _request_ms())
         
-        # Update stats
-        PREDICTION_COUNTS[label] = PREDICTION_COUNTS.get(label, 0) + 1
-        RECENT_PREDICTIONS.append({
-            "label": label,
-            "probability": round(confidence, 4),
-            "ts": datetime.utcnow().isoformat() + "Z",
+        return _serialize({
+            "model_type": model_type,
+            "model_version": version.version if version else None,
+            "count": len(scored),
+            "results": results,
         })
-        if len(RECENT_PREDICTIONS) > 50:
-            del RECENT_PREDICTIONS[0: len(RECENT_PREDICTIONS) - 50]
-        
-        return jsonify({"label": label, "probability": round(confidence, 4)})
     except Exception as e:
+        g.error_class = type(e).__name__
         return jsonify({"error": str(e)}), 500
 
 
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "256"))
+
+
+def _bulk_formats():
+    """(input format, output format) from query args / Content-Type / Accept"""
+    content_type = (request.mimetype or "").lower()
+    upload = request.files.get("file") if content_type == "multipart/form-data" else None
+    name = (upload.filename or "").lower() if upload is not None else ""
+    fmt = request.args.get("format")
+    if fmt is None:
+        if "json" in content_type or name.endswith((".ndjson", ".jsonl")):
+            fmt = "ndjson"
+        else:
+            fmt = "csv"
+    output = request.args.get("output")
+    if output is None:
+        output = "csv" if "text/csv" in (request.headers.get("Accept") or "") else "ndjson"
+    return upload, fmt.lower(), output.lower()
+
+
+@app.route("/predict/stream", methods=["POST"])
+def predict_stream_route():
+    """
+    Score an uploaded CSV (``text`` column plus ``id``/``post_id``) or NDJSON
+    file as a stream, in batches of BULK_BATCH_SIZE rows. Results are streamed
+    back as NDJSON (default) or CSV, followed by a rows/sec summary.
+    """
+    if not models_ready():
+        return _loading_response()
+    upload, fmt, output = _bulk_formats()
+    if output not in ("ndjson", "csv"):
+        return jsonify({"error": f"Unsupported output format: {output}"}), 400
+    stream = detach_upload(upload) if upload is not None else request.stream
+    try:
+        records = open_records(stream, fmt)
+    except BulkInputError as e:
+        stream.close()
+        g.error_class = "bulk_input_error"
+        return jsonify({"error": str(e)}), 400
+    
+    # Pin the model version for the whole upload; bypass the cache so a
+    # backfill does not evict the interactive working set
+    version, _ = resolve_version()
+    model, label_encoder, model_type = version.as_tuple() if version else (None, None, None)
+    g.model_type = model_type
+    chunks = stream_scores(
+        records,
+        lambda texts: predict_batch(texts, model, label_encoder, model_type),
+        batch_size=BULK_BATCH_SIZE,
+        output=output,
+        on_scored=lambda scored, seconds: record_predictions(scored, model_type, seconds * 1000.0),
+        model_type=model_type,
+    )
+    
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            if upload is not None:
+                stream.close()
+    
+    mimetype = "text/csv" if output == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={"X-Model-Type": model_type or ""})
+
+
 @app.route("/stats", methods=["GET"])
 def stats():
-    total = sum(PREDICTION_COUNTS.values())
-    return jsonify({
-        "total": total,
-        "stress": PREDICTION_COUNTS.get("Stress", 0),
-        "nonStress": PREDICTION_COUNTS.get("Non-Stress", 0),
-        "recent": RECENT_PREDICTIONS[-20:],
-    })
+    """Totals, rolling 1/5/60-minute windows and recent predictions across all workers"""
+    return jsonify(PREDICTION_STATS.summary(recent=20))
+
+
+def _log_range():
+    """(start, end) epoch seconds from ?start=&end= (ISO-8601 or epoch) or ?since=<seconds>"""
+    since = request.args.get("since")
+    if since is not None:
+        return time.time() - float(since), None
+    return parse_time(request.args.get("start")), parse_time(request.args.get("end"))
+
+
+@app.route("/predictions/log", methods=["GET"])
+def prediction_log():
+    """Logged predictions in a time range (oldest first)"""
+    if PREDICTION_LOG is None:
+        return jsonify({"error": "Prediction log disabled (set PREDICTION_LOG=1)"}), 404
+    try:
+        start, end = _log_range()
+        limit = min(int(request.args.get("limit", "1000")), 10000)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+    return jsonify(PREDICTION_LOG.query(start, end, limit))
+
+
+@app.route("/predictions/log/stats", methods=["GET"])
+def prediction_log_stats():
+    """Label / model type counts, mean probability and latency over a time range"""
+    if PREDICTION_LOG is None:
+        return jsonify({"error": "Prediction log disabled (set PREDICTION_LOG=1)"}), 404
+    try:
+        start, end = _log_range()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+    return jsonify(PREDICTION_LOG.stats(start, end))
+
+
+AGGREGATE_STORE = AggregateStore([
+    os.path.join(ML_DIR, "stress.csv"),
+    os.path.join(REPO_ROOT, "stress.csv"),
+])
 
 
 @app.route("/dataset-stats", methods=["GET"])
 def dataset_stats():
-    dataset_paths = [
-        os.path.join(ML_DIR, "stress.csv"),
-        os.path.join(REPO_ROOT, "stress.csv"),
-    ]
-    
-    df = None
-    for path in dataset_paths:
-        if os.path.exists(path):
-            try:
-                df = pd.read_csv(path)
-                break
-            except Exception:
-                continue
-    
-    if df is None:
-        return jsonify({"stress": 0, "nonStress": 0, "trend": []})
-    
-    label_col = None
-    for col in df.columns:
-        if col.lower() in {"label", "target", "class"}:
-            label_col = col
-            break
-    
-    if label_col is None:
-        num_cols = [c for c in df.columns if pd.api.types.is_integer_dtype(df[c]) or pd.api.types.is_bool_dtype(df[c])]
-        label_col = num_cols[0] if num_cols else (df.columns[0] if len(df.columns) else None)
-    
-    if label_col is None:
-        return jsonify({"stress": 0, "nonStress": 0, "trend": []})
-    
-    # Determine if labels are numeric (0/1) or strings
-    stress_count = 0
-    non_stress_count = 0
-    series = df[label_col]
     try:
-        s_int = pd.to_numeric(series, errors='coerce')
-        if s_int.notna().any():
-            stress_count = int((s_int == 1).sum())
-            non_stress_count = int((s_int == 0).sum())
-        else:
-            raise ValueError
-    except Exception:
-        def is_stress(value: str) -> bool:
-            try:
-                v = str(value).lower()
-                return ("stress" in v) and ("non" not in v)
-            except Exception:
-                return False
-        stress_count = int(series.apply(is_stress).sum())
-        non_stress_count = int(len(series) - stress_count)
-    
-    bins = 7
-    size = len(df)
-    if size == 0:
-        trend = []
-    else:
-        step = max(1, size // bins)
-        trend = []
-        for i in range(0, size, step):
-            chunk = df.iloc[i:i + step]
-            if pd.api.types.is_numeric_dtype(series):
-                s = int((pd.to_numeric(chunk[label_col], errors='coerce') == 1).sum())
-            else:
-                def is_stress_local(value: str) -> bool:
-                    try:
-                        v = str(value).lower()
-                        return ("stress" in v) and ("non" not in v)
-                    except Exception:
-                        return False
-                s = int(chunk[label_col].apply(is_stress_local).sum())
-            ns = int(len(chunk) - s)
-            trend.append({"day": f"{len(trend) + 1}", "stress": s, "nonStress": ns})
-    
-    return jsonify({"stress": stress_count, "nonStress": non_stress_count, "trend": trend})
+        profile = AGGREGATE_STORE.dataset_stats()
+    except Exception as e:
+        print(f"⚠️ Error profiling dataset: {e}")
+        profile = None
+    if profile is None:
+        return jsonify({"stress": 0, "nonStress": 0, "trend": []})
+    return jsonify(profile)
 
 
 def _read_json(path: str):
@@ -545,195 +1469,17 @@ def eda():
         if err is None and data is not None:
             break
     
-    # If no EDA file found, generate basic stats from dataset
+    # If no EDA file found, generate basic stats from the dataset aggregates
     if err or data is None:
-        dataset_paths = [
-            os.path.join(ML_DIR, "stress.csv"),
-            os.path.join(REPO_ROOT, "stress.csv"),
-        ]
-        df = None
-        for path in dataset_paths:
-            if os.path.exists(path):
-                try:
-                    df = pd.read_csv(path)
-                    break
-                except Exception:
-                    continue
+        try:
+            data = AGGREGATE_STORE.eda()
+        except Exception as e:
+            print(f"⚠️ Error computing EDA from dataset: {e}")
+            data = None
         
-        if df is not None:
-            # Generate basic EDA data from dataset
-            label_col = None
-            for col in df.columns:
-                if col.lower() in ["label", "target", "class"]:
-                    label_col = col
-                    break
-            
-            # Basic stats
-            basic_stats = {
-                "shape": list(df.shape),
-                "memory_mb": round(df.memory_usage(deep=True).sum() / 1024**2, 2),
-                "duplicates": int(df.duplicated().sum()),
-                "missing_total": int(df.isnull().sum().sum()),
-            }
-            
-            # Label distribution
-            label_distribution = {}
-            if label_col and label_col in df.columns:
-                label_distribution = df[label_col].value_counts().to_dict()
-                label_distribution = {str(k): int(v) for k, v in label_distribution.items()}
-            
-            # Text columns analysis
-            text_stats = {}
-            text_cols = [c for c in df.columns if df[c].dtype == "object" and df[c].astype(str).str.len().mean() > 10]
-            for col in text_cols[:3]:
-                lengths = df[col].astype(str).str.len()
-                word_counts = df[col].astype(str).str.split().str.len()
-                sentence_counts = df[col].astype(str).str.count(r'[.!?]') + 1
-                
-                text_stats[col] = {
-                    "avg_length": float(lengths.mean()),
-                    "median_length": float(lengths.median()),
-                    "avg_words": float(word_counts.mean()),
-                    "median_words": float(word_counts.median()),
-                    "avg_sentences": float(sentence_counts.mean()),
-                }
-            
-            # Generate word frequencies for text analysis
-            word_frequencies = []
-            text_length_distribution = []
-            if text_cols:
-                main_text_col = text_cols[0]
-                # Get all text
-                all_text = " ".join(df[main_text_col].dropna().astype(str).tolist())
-                # Clean and tokenize
-                words = re.findall(r'\b[a-z]{3,}\b', all_text.lower())
-                # Count frequencies
-                word_freq = Counter(words)
-                # Get top 50 words
-                word_frequencies = [[word, count] for word, count in word_freq.most_common(50)]
-                
-                # Text length distribution
-                text_lengths = df[main_text_col].astype(str).str.len()
-                # Create buckets
-                max_len = int(text_lengths.max()) if len(text_lengths) > 0 else 1000
-                bucket_size = max(100, max_len // 10)
-                buckets = {}
-                for length in text_lengths:
-                    bucket = (length // bucket_size) * bucket_size
-                    buckets[bucket] = buckets.get(bucket, 0) + 1
-                
-                text_length_distribution = [
-                    {"bucket": f"{k}-{k+bucket_size}", "count": v}
-                    for k, v in sorted(buckets.items())
-                ]
-            
-            # Generate subreddit statistics
-            subreddit_stats = None
-            if "subreddit" in df.columns:
-                subreddit_counts = df["subreddit"].value_counts().head(15).to_dict()
-                subreddit_stats = {
-                    "top_subreddits": {str(k): int(v) for k, v in subreddit_counts.items()},
-                    "total_unique": int(df["subreddit"].nunique()),
-                    "subreddit_label_cross": {}
-                }
-                
-                # Cross-tabulation: subreddit vs label
-                if label_col:
-                    top_10_subs = list(subreddit_counts.keys())[:10]
-                    sub_df = df[df["subreddit"].isin(top_10_subs)]
-                    if len(sub_df) > 0:
-                        cross_tab = pd.crosstab(sub_df["subreddit"], sub_df[label_col])
-                        subreddit_stats["subreddit_label_cross"] = {
-                            "subreddits": [str(s) for s in cross_tab.index.tolist()],
-                            "labels": [str(l) for l in cross_tab.columns.tolist()],
-                            "values": cross_tab.values.tolist()
-                        }
-                
-                # Stress rate by subreddit
-                if label_col:
-                    stress_rates = {}
-                    for subreddit in list(subreddit_counts.keys())[:10]:
-                        sub_data = df[df["subreddit"] == subreddit]
-                        if len(sub_data) > 0:
-                            # Determine stress label (1 or "Stress" or highest value)
-                            label_values = sub_data[label_col].value_counts()
-                            if len(label_values) > 0:
-                                # Try to identify stress label
-                                stress_label = None
-                                if pd.api.types.is_numeric_dtype(sub_data[label_col]):
-                                    stress_label = 1
-                                else:
-                                    stress_labels = [str(l).lower() for l in label_values.index]
-                                    if any("stress" in l and "non" not in l for l in stress_labels):
-                                        stress_label = [l for l in label_values.index if "stress" in str(l).lower() and "non" not in str(l).lower()][0]
-                                    else:
-                                        stress_label = label_values.index[0]
-                                
-                                if stress_label is not None:
-                                    stress_count = int(label_values.get(stress_label, 0))
-                                    total = len(sub_data)
-                                    stress_rates[str(subreddit)] = {
-                                        "stress_count": stress_count,
-                                        "total": total,
-                                        "stress_rate": round(stress_count / total, 3) if total > 0 else 0
-                                    }
-                    
-                    subreddit_stats["stress_rates"] = stress_rates
-            
-            # Generate correlation analysis for numeric columns
-            high_correlations = []
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-            if len(numeric_cols) > 1:
-                corr_matrix = df[numeric_cols].corr()
-                # Get upper triangle to avoid duplicates
-                for i in range(len(corr_matrix.columns)):
-                    for j in range(i+1, len(corr_matrix.columns)):
-                        corr_val = corr_matrix.iloc[i, j]
-                        if not pd.isna(corr_val) and abs(corr_val) > 0.5:  # Threshold for "high" correlation
-                            high_correlations.append({
-                                "feature1": str(corr_matrix.columns[i]),
-                                "feature2": str(corr_matrix.columns[j]),
-                                "correlation": float(corr_val)
-                            })
-                # Sort by absolute correlation value
-                high_correlations.sort(key=lambda x: abs(x["correlation"]), reverse=True)
-                high_correlations = high_correlations[:20]  # Top 20
-            
-            # Generate insights
-            insights = []
-            if label_col and len(label_distribution) == 2:
-                counts = list(label_distribution.values())
-                ratio = max(counts) / min(counts) if min(counts) > 0 else 1
-                if ratio > 2:
-                    insights.append({
-                        "type": "warning",
-                        "message": f"Severe class imbalance ({ratio:.1f}:1) - Consider resampling techniques"
-                    })
-                elif ratio > 1.5:
-                    insights.append({
-                        "type": "caution",
-                        "message": f"Moderate class imbalance ({ratio:.1f}:1) - Use stratified sampling"
-                    })
-                else:
-                    insights.append({
-                        "type": "success",
-                        "message": "Classes are well balanced for training"
-                    })
-            
-            data = {
-                "basic_stats": basic_stats,
-                "label_distribution": label_distribution,
-                "class_distribution": label_distribution,
-                "text_stats": text_stats,
-                "insights": insights,
-                "high_correlations": high_correlations,
-                "word_frequencies": word_frequencies,
-                "text_length_distribution": text_length_distribution,
-                "subreddit_stats": subreddit_stats,
-                "timestamp": datetime.utcnow().isoformat() + "Z",
-            }
-        else:
+        if data is None:
             return jsonify({"error": "No EDA data or dataset found"}), 404
+        data = dict(data)
     
     # Ensure data has expected structure
     if not isinstance(data, dict):
@@ -865,6 +1611,39 @@ def metrics():
     return jsonify(data)
 
 
+def _runtime_gauges():
+    """Scrape-time values owned by other components (cache, micro-batcher, memory)"""
+    cache = PREDICTION_CACHE.stats()
+    collected = [
+        ("prediction_cache_entries", "gauge", "Entries in the prediction cache", {}, cache["size"]),
+    ]
+    rss_kb = process_memory().get("rss_kb")
+    if rss_kb is not None:
+        collected.append(("process_resident_bytes", "gauge", "Resident memory of this process", {}, rss_kb * 1024))
+    for counter in ("hits", "misses", "collapsed"):
+        collected.append(("prediction_cache_lookups_total", "counter", "Prediction cache lookups by result",
+                          {"result": counter}, cache.get(counter, 0)))
+    model, _, _ = resolve_model()
+    cascade = model.cascade_stats() if hasattr(model, "cascade_stats") else {"enabled": False}
+    for stage in cascade.get("stages", []):
+        collected.append(("fusion_cascade_exits_total", "counter", "Texts leaving the fusion cascade after each member",
+                          {"member": stage["member"]}, stage["exits"]))
+    batcher = MICRO_BATCHER if _MICRO_BATCHER_PID == os.getpid() else None
+    if batcher is not None:
+        collected.append(("micro_batch_queue_depth", "gauge", "Requests waiting in the micro-batcher", {},
+                          batcher.stats()["queue_depth"]))
+    return collected
+
+
+TELEMETRY.add_collector(_runtime_gauges)
+
+
+@app.route("/metrics/prometheus", methods=["GET"])
+def metrics_prometheus():
+    """Runtime telemetry in the Prometheus text exposition format"""
+    return Response(TELEMETRY.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/tests", methods=["GET"])
 def tests():
     test_files = [
@@ -884,42 +1663,46 @@ def tests():
 
 @app.route("/figures/<path:filename>", methods=["GET"])
 def serve_figure(filename):
-    """Serve figure images from reports/figures directory"""
-    figures_dir = os.path.join(ML_DIR, "reports", "figures")
-    alt_figures_dir = os.path.join(REPO_ROOT, "reports", "figures")
-    
+    """
+    Serve a figure from the in-memory index. Answers If-None-Match /
+    If-Modified-Since with 304 and Range with 206; ?size=thumb|medium
+    returns a smaller variant (the original when Pillow is missing).
+    """
     # Security: ensure filename doesn't contain path traversal
     if ".." in filename or "/" in filename or "\\" in filename:
         return jsonify({"error": "Invalid filename"}), 400
-    
-    # Try ML_DIR first, then REPO_ROOT
-    for fig_dir in [figures_dir, alt_figures_dir]:
-        if os.path.exists(fig_dir):
-            file_path = os.path.join(fig_dir, filename)
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                return send_from_directory(fig_dir, filename)
-    
-    return jsonify({"error": "Figure not found"}), 404
+    size = request.args.get("size") or None
+    if size is not None and size not in FIGURE_VARIANTS:
+        return jsonify({"error": f"Unknown size '{size}'", "sizes": list(FIGURE_VARIANTS)}), 400
+
+    figure = FIGURE_STORE.get(filename)
+    if figure is None:
+        return jsonify({"error": "Figure not found"}), 404
+    try:
+        data, etag, mimetype = FIGURE_STORE.representation(figure, size)
+    except OSError:
+        return jsonify({"error": "Figure not found"}), 404
+
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = figure.mtime
+    response.cache_control.public = True
+    response.cache_control.max_age = FIGURE_MAX_AGE
+    try:
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    except RequestedRangeNotSatisfiable:
+        return jsonify({"error": "Requested range not satisfiable"}), 416, {"Content-Range": f"bytes */{len(data)}"}
 
 
 @app.route("/figures", methods=["GET"])
 def list_figures():
-    """List all available figures"""
-    figures_dir = os.path.join(ML_DIR, "reports", "figures")
-    alt_figures_dir = os.path.join(REPO_ROOT, "reports", "figures")
-    
-    figures = []
-    for fig_dir in [figures_dir, alt_figures_dir]:
-        if os.path.exists(fig_dir):
-            try:
-                files = [f for f in os.listdir(fig_dir) 
-                        if f.lower().endswith(('.png', '.jpg', '.jpeg', '.svg', '.gif'))]
-                figures.extend(files)
-                break
-            except Exception:
-                continue
-    
-    return jsonify({"figures": sorted(set(figures))})
+    """List all available figures (from the index; no directory scan per request)"""
+    index = FIGURE_STORE.index()
+    return jsonify({
+        "figures": sorted(index),
+        "sizes": list(FIGURE_VARIANTS),
+        "items": [index[name].info() for name in sorted(index)],
+    })
 
 
 if __name__ == "__main__":
@@ -928,4 +1711,6 @@ if __name__ == "__main__":
     print(f"📁 ML Directory: {ML_DIR}")
     print(f"📁 Models: {os.path.join(ML_DIR, 'models')}")
     print("=" * 70)
+    # Models load in the background; /readyz turns 200 once they are warm
+    start_model_loading()
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,293 @@
+"""
+Offline multi-core batch scoring.
+
+Loads models with the same discovery as the API (load_fusion_ensemble ->
+load_other_models -> fallback pipeline, via app.load_models) without starting
+Flask, reads a large CSV or Parquet file in chunks and scores the chunks in a
+process pool. Results are appended to the output in input order and a
+checkpoint is written after every chunk, so an interrupted run continues
+where it stopped with ``--resume``.
+
+Usage:
+    python batch_score.py posts.csv scores.csv --workers 8
+    python batch_score.py posts.parquet scores.ndjson --resume
+"""
+import argparse
+import collections
+import csv
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_scoring import ID_COLUMNS, TEXT_COLUMNS
+
+OUTPUT_FIELDS = ["row", "id", "label", "probability", "error"]
+CHECKPOINT_VERSION = 1
+
+_backend = None
+
+
+def _load_backend():
+    """Import app.py and load its models (no server is started)"""
+    global _backend
+    if _backend is None:
+        import app as backend
+        backend.load_models()
+        if backend.resolve_model()[0] is None:
+            raise RuntimeError(f"No model could be loaded: {backend.MODEL_STATE.get('error')}")
+        _backend = backend
+    return _backend
+
+
+def _score_chunk(task):
+    """Worker: score one chunk; returns (index, results, seconds)"""
+    index, first_row, ids, texts = task
+    backend = _load_backend()
+    started = time.perf_counter()
+    results, valid_pos, valid_texts = [], [], []
+    for offset, (item_id, text) in enumerate(zip(ids, texts)):
+        result = {"row": first_row + offset, "id": item_id}
+        if text is None or not str(text).strip():
+            result["error"] = "No text provided"
+        else:
+            valid_pos.append(offset)
+            valid_texts.append(str(text))
+        results.append(result)
+    if valid_texts:
+        model, label_encoder, model_type = backend.resolve_model()
+        try:
+            scored = backend.predict_batch(valid_texts, model, label_encoder, model_type)
+            for pos, (label, confidence) in zip(valid_pos, scored):
+                results[pos]["label"] = label
+                results[pos]["probability"] = round(confidence, 4)
+        except backend.PredictionError as e:
+            for pos in valid_pos:
+                results[pos]["error"] = str(e)
+    return index, results, time.perf_counter() - started
+
+
+# ===============================
+# Input
+# ===============================
+def _pick_column(columns, names):
+    lowered = {str(c).lower(): c for c in columns}
+    return next((lowered[n] for n in names if n in lowered), None)
+
+
+def read_chunks(path, chunk_rows, skip_rows=0):
+    """Yield DataFrames of ``chunk_rows`` rows with only the id/text columns"""
+    import pandas as pd
+
+    if path.lower().endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet requires pyarrow (pip install pyarrow)")
+        parquet = pq.ParquetFile(path)
+        names = parquet.schema_arrow.names
+        text_col = _pick_column(names, TEXT_COLUMNS)
+        if text_col is None:
+            raise RuntimeError(f"{path} has no text column")
+        id_col = _pick_column(names, ID_COLUMNS)
+        columns = [c for c in (id_col, text_col) if c is not None]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            df = batch.to_pandas()
+            if skip_rows >= len(df):
+                skip_rows -= len(df)
+                continue
+            yield df.iloc[skip_rows:].rename(columns={text_col: "text", **({id_col: "id"} if id_col else {})})
+            skip_rows = 0
+        return
+
+    header = pd.read_csv(path, nrows=0).columns
+    text_col = _pick_column(header, TEXT_COLUMNS)
+    if text_col is None:
+        raise RuntimeError(f"{path} has no text column")
+    id_col = _pick_column(header, ID_COLUMNS)
+    usecols = [c for c in (id_col, text_col) if c is not None]
+    # Rows already done are parsed and dropped rather than skipped by line
+    # number, which would miscount quoted multi-line texts
+    reader = pd.read_csv(path, usecols=usecols, chunksize=chunk_rows, dtype={c: str for c in usecols},
+                         keep_default_na=False)
+    for df in reader:
+        if skip_rows >= len(df):
+            skip_rows -= len(df)
+            continue
+        yield df.iloc[skip_rows:].rename(columns={text_col: "text", **({id_col: "id"} if id_col else {})})
+        skip_rows = 0
+
+
+# ===============================
+# Output / checkpoint
+# ===============================
+class _Output:
+    def __init__(self, path, resume_bytes=None):
+        self.path = path
+        self.ndjson = path.lower().endswith((".ndjson", ".jsonl"))
+        if resume_bytes is not None and os.path.exists(path):
+            # Drop anything written after the last checkpoint
+            with open(path, "r+b") as f:
+                f.truncate(resume_bytes)
+            self._f = open(path, "a", newline="")
+        else:
+            self._f = open(path, "w", newline="")
+            if not self.ndjson:
+                csv.writer(self._f).writerow(OUTPUT_FIELDS)
+
+    def write(self, results):
+        if self.ndjson:
+            self._f.write("".join(json.dumps(r) + "\n" for r in results))
+        else:
+            buffer = io.StringIO()
+            csv.DictWriter(buffer, fieldnames=OUTPUT_FIELDS).writerows(results)
+            self._f.write(buffer.getvalue())
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self._f.close()
+
+
+def _input_key(path):
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_checkpoint(path, input_path, output_path):
+    try:
+        with open(path, "r") as f:
+            ckpt = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if ckpt.get("version") != CHECKPOINT_VERSION or ckpt.get("input") != _input_key(input_path):
+        print("⚠️ Checkpoint does not match the input file, starting over")
+        return None
+    if ckpt.get("output") != os.path.abspath(output_path) or not os.path.exists(output_path):
+        print("⚠️ Checkpoint output missing, starting over")
+        return None
+    return ckpt
+
+
+def save_checkpoint(path, ckpt):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(ckpt, f)
+    os.replace(tmp, path)
+
+
+def _summary(rows, seconds, chunk_latencies, chunk_rows):
+    lat = np.array(chunk_latencies) * 1000.0 if chunk_latencies else np.zeros(1)
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "chunks": len(chunk_latencies),
+        "chunk_ms": {
+            "p50": round(float(np.percentile(lat, 50)), 2),
+            "p95": round(float(np.percentile(lat, 95)), 2),
+            "p99": round(float(np.percentile(lat, 99)), 2),
+            "max": round(float(lat.max()), 2),
+        },
+        "ms_per_row": round(float(lat.sum()) / max(1, rows), 4),
+        "chunk_rows": chunk_rows,
+    }
+
+
+def run(input_path, output_path, workers=None, chunk_rows=2000, checkpoint_path=None, resume=False):
+    """Score ``input_path`` into ``output_path``; returns the summary dict"""
+    workers = max(1, workers or os.cpu_count() or 1)
+    checkpoint_path = checkpoint_path or output_path + ".ckpt.json"
+    ckpt = load_checkpoint(checkpoint_path, input_path, output_path) if resume else None
+    rows_done = ckpt["rows_done"] if ckpt else 0
+    if ckpt:
+        print(f"✓ Resuming after {rows_done} rows")
+    ckpt = ckpt or {
+        "version": CHECKPOINT_VERSION,
+        "input": _input_key(input_path),
+        "output": os.path.abspath(output_path),
+        "rows_done": 0,
+        "output_bytes": None,
+    }
+
+    # Load once in the parent: forked workers share the models copy-on-write
+    backend = _load_backend()
+    _, _, model_type = backend.resolve_model()
+    print(f"✓ Scoring {input_path} with {model_type} on {workers} worker(s)")
+
+    output = _Output(output_path, resume_bytes=ckpt["output_bytes"] if rows_done else None)
+    if ckpt["output_bytes"] is None:
+        ckpt["output_bytes"] = output._f.tell()
+        save_checkpoint(checkpoint_path, ckpt)
+
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    started = time.perf_counter()
+    latencies, scored_rows = [], 0
+    next_row = rows_done + 1
+    pending = collections.deque()
+
+    def drain_one():
+        nonlocal scored_rows
+        _, results, seconds = pending.popleft().get()
+        latencies.append(seconds)
+        ckpt["output_bytes"] = output.write(results)
+        ckpt["rows_done"] += len(results)
+        scored_rows += len(results)
+        save_checkpoint(checkpoint_path, ckpt)
+
+    try:
+        with ctx.Pool(workers) as pool:
+            for index, df in enumerate(read_chunks(input_path, chunk_rows, skip_rows=rows_done)):
+                ids = df["id"].tolist() if "id" in df.columns else list(range(next_row, next_row + len(df)))
+                texts = df["text"].where(df["text"].notna(), None).tolist()
+                pending.append(pool.apply_async(_score_chunk, ((index, next_row, ids, texts),)))
+                next_row += len(df)
+                # Bounded read-ahead keeps memory flat
+                while len(pending) >= workers * 2:
+                    drain_one()
+            while pending:
+                drain_one()
+    finally:
+        output.close()
+
+    summary = _summary(scored_rows, time.perf_counter() - started, latencies, chunk_rows)
+    summary.update(model_type=model_type, total_rows=ckpt["rows_done"], output=output_path)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet file offline with the backend's models")
+    parser.add_argument("input", help="CSV or Parquet file with a text column (and id/post_id)")
+    parser.add_argument("output", help="Output file (.csv, or .ndjson/.jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-rows", type=int, default=2000)
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.ckpt.json)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = run(args.input, args.output, args.workers, args.chunk_rows, args.checkpoint, args.resume)
+    except (OSError, RuntimeError) as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+
+    print("=" * 70)
+    print(f"Rows scored:  {summary['rows']} ({summary['total_rows']} in output)")
+    print(f"Time:         {summary['seconds']}s  ({summary['rows_per_sec']} rows/sec)")
+    lat = summary["chunk_ms"]
+    print(f"Chunk latency ({summary['chunk_rows']} rows): p50 {lat['p50']} ms  p95 {lat['p95']} ms  "
+          f"p99 {lat['p99']} ms  max {lat['max']} ms")
+    print(f"Per row:      {summary['ms_per_row']} ms (worker time)")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
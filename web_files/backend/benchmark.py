@@ -0,0 +1,329 @@
+"""
+In-process micro-benchmarks for every inference component.
+
+Components: the fusion ensemble, each of its members, best_model.pkl,
+publication_model.pkl and the fallback pipeline (whichever can be loaded).
+Every component is split into the stages that predict_batch runs, on the
+same code path (text normalizer, compact vocabularies, SharedTextTransformer):
+
+    normalize  training-notebook text preprocessing (TEXT_NORMALIZATION=1;
+               not applied to the fallback pipeline)
+    vectorize  texts -> feature matrix (shared tokenization for the fusion)
+    model      feature matrix -> predictions + probabilities
+    labels     label decoding, normalize_label and confidence extraction
+
+and timed at several batch sizes and text lengths drawn from stress.csv.
+Results (p50/p95/p99 latency, throughput, peak traced memory) are written to
+JSON and compared against a stored baseline; a stage whose p50 grows by more
+than ``--threshold`` is reported as a regression (exit status 1).
+
+Usage:
+    python benchmark.py                         # run, compare with baseline
+    python benchmark.py --save-baseline         # record a new baseline
+    python benchmark.py --components fusion,best_model --batch-sizes 1,32
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmark_baseline.json")
+STAGES = ("normalize", "vectorize", "model", "labels")
+LENGTH_BUCKETS = {"short": (0.0, 1 / 3), "medium": (1 / 3, 2 / 3), "long": (2 / 3, 1.0)}
+
+
+class Component:
+    """A model split into normalize / vectorize / model / labels callables"""
+
+    def __init__(self, name, normalize, vectorize, model, labels):
+        self.name = name
+        self.normalize = normalize
+        self.vectorize = vectorize
+        self.model = model
+        self.labels = labels
+
+    def run(self, texts):
+        return self.labels(*self.model(self.vectorize(self.normalize(texts))))
+
+
+def _unchanged(texts):
+    return texts
+
+
+def _transform(vectorizer):
+    """vectorizer.transform the way predict_batch runs it"""
+    from text_features import transformer_for
+    return lambda texts: transformer_for(vectorizer).transform(texts)[0]
+
+
+def _fusion_components(backend, fusion, label_encoder, normalize):
+    def decode(pred_idx, proba):
+        if label_encoder is not None:
+            pred_labels = label_encoder.inverse_transform(pred_idx)
+        else:
+            pred_labels = [str(i) for i in pred_idx]
+        confidences = proba[np.arange(len(pred_idx)), pred_idx].astype(float).tolist()
+        return [(backend.normalize_label(l), c) for l, c in zip(pred_labels, confidences)]
+
+    def fusion_model(member_X):
+        proba = fusion.combine_member_probas(
+            [fusion.member_proba(m["model"], X) for m, X in zip(fusion.models, member_X)])
+        return np.argmax(proba, axis=1), proba
+
+    components = [Component("fusion", normalize, fusion.transform_members, fusion_model, decode)]
+    for i, member in enumerate(fusion.models, start=1):
+        def member_model(X, clf=member["model"]):
+            proba = fusion.member_proba(clf, X)
+            return np.argmax(proba, axis=1), proba
+        components.append(Component(f"fusion_member{i}", normalize, _transform(member["vectorizer"]),
+                                    member_model, decode))
+    return components
+
+
+def _estimator_component(backend, name, clf, normalize, vectorize):
+    def model(X):
+        pred = clf.predict(X)
+        proba = clf.predict_proba(X) if hasattr(clf, "predict_proba") else None
+        return pred, proba
+
+    def labels(pred, proba):
+        confidences = backend._confidences(pred, proba, getattr(clf, "classes_", None))
+        return [(backend.normalize_label(l), c) for l, c in zip(pred, confidences)]
+
+    return Component(name, normalize, vectorize, model, labels)
+
+
+def _load_named(backend, name):
+    """Bundle or pickle ml_model/models/<name>, like load_other_models"""
+    bundle = backend.load_model_bundle(name)
+    if bundle is not None:
+        return bundle["model"]
+    path = os.path.join(backend.ML_DIR, "models", f"{name}.pkl")
+    if not os.path.exists(path):
+        return None
+    import joblib
+    return joblib.load(path)
+
+
+def load_components(backend, wanted=None):
+    """Every loadable component, optionally filtered by name prefix"""
+    components = []
+    normalizer = backend.build_text_normalizer() if backend.TEXT_NORMALIZATION else None
+    normalize = normalizer.normalize_batch if normalizer is not None else _unchanged
+    fusion, label_encoder = backend.load_fusion_ensemble()
+    if fusion is not None:
+        if backend.COMPACT_VOCABULARY:
+            backend.compact_model_vocabulary(fusion)
+        components.extend(_fusion_components(backend, fusion, label_encoder, normalize))
+
+    for name in ("best_model", "publication_model"):
+        try:
+            artifact = _load_named(backend, name)
+        except Exception as e:
+            print(f"⚠️ Could not load {name}: {e}")
+            continue
+        if artifact is None:
+            continue
+        clf, vectorizer = backend.split_model(artifact)
+        if clf is None or vectorizer is None:
+            print(f"⚠️ {name}: unsupported artifact structure")
+            continue
+        if backend.COMPACT_VOCABULARY:
+            backend.compact_model_vocabulary(artifact)
+        components.append(_estimator_component(backend, name, clf, normalize, _transform(vectorizer)))
+
+    pipeline = backend.build_fallback_pipeline()
+    if pipeline is not None:
+        def transform(texts, steps=pipeline.steps[:-1]):
+            for _, step in steps:
+                texts = step.transform(texts)
+            return texts
+        # The fallback pipeline is trained on raw text: predict_batch does not normalize for it
+        components.append(_estimator_component(backend, "fallback", pipeline.steps[-1][1], _unchanged, transform))
+
+    if wanted:
+        components = [c for c in components if any(c.name.startswith(w) for w in wanted)]
+    return components
+
+
+def sample_texts(backend, per_bucket=2048, seed=13):
+    """{bucket: texts} from stress.csv, split at the length terciles"""
+    import pandas as pd
+
+    path = os.path.join(backend.ML_DIR, "stress.csv")
+    texts = pd.read_csv(path, usecols=["text"])["text"].dropna().astype(str)
+    lengths = texts.str.len()
+    rng = np.random.default_rng(seed)
+    buckets = {}
+    for name, (lo, hi) in LENGTH_BUCKETS.items():
+        mask = (lengths >= lengths.quantile(lo)) & (lengths <= lengths.quantile(hi))
+        pool = texts[mask].tolist()
+        buckets[name] = [pool[i] for i in rng.integers(0, len(pool), per_bucket)]
+    return buckets
+
+
+def _percentiles(samples_ms):
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p95_ms": round(float(np.percentile(arr, 95)), 4),
+        "p99_ms": round(float(np.percentile(arr, 99)), 4),
+        "mean_ms": round(float(arr.mean()), 4),
+        "n": int(arr.size),
+    }
+
+
+def bench_component(component, texts, batch_size, time_budget, min_iters, max_iters):
+    """Per-stage timings for one component / batch size / text bucket"""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts) - batch_size + 1, batch_size)] or [texts]
+    component.run(batches[0])  # warm-up
+
+    timings = {stage: [] for stage in STAGES + ("total",)}
+    deadline = time.perf_counter() + time_budget
+    i = 0
+    while i < max_iters and (i < min_iters or time.perf_counter() < deadline):
+        batch = batches[i % len(batches)]
+        t0 = time.perf_counter()
+        normalized = component.normalize(batch)
+        t1 = time.perf_counter()
+        X = component.vectorize(normalized)
+        t2 = time.perf_counter()
+        out = component.model(X)
+        t3 = time.perf_counter()
+        component.labels(*out)
+        t4 = time.perf_counter()
+        for stage, seconds in zip(STAGES + ("total",), (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+            timings[stage].append(seconds * 1000.0)
+        i += 1
+
+    tracemalloc.start()
+    component.run(batches[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results = {}
+    for stage, samples in timings.items():
+        stats = _percentiles(samples)
+        stats["throughput_rows_per_s"] = round(batch_size / (stats["p50_ms"] / 1000.0), 1) if stats["p50_ms"] > 0 else None
+        if stage == "total":
+            stats["peak_mem_mb"] = round(peak / 1024**2, 3)
+        results[stage] = stats
+    return results
+
+
+def run(components, buckets, batch_sizes, time_budget=0.5, min_iters=5, max_iters=2000):
+    results = {}
+    for component in components:
+        try:
+            component.run(buckets[next(iter(buckets))][:1])
+        except Exception as e:
+            print(f"⚠️ Skipping {component.name}: {e}")
+            continue
+        for batch_size in batch_sizes:
+            for bucket, texts in buckets.items():
+                try:
+                    stages = bench_component(component, texts, batch_size, time_budget, min_iters, max_iters)
+                except Exception as e:
+                    print(f"⚠️ {component.name} b{batch_size} {bucket}: {e}")
+                    continue
+                for stage, stats in stages.items():
+                    results[f"{component.name}/{stage}/b{batch_size}/{bucket}"] = stats
+                total = stages["total"]
+                print(f"  {component.name:<16} b={batch_size:<5} {bucket:<7} "
+                      f"p50 {total['p50_ms']:>9.3f} ms  p99 {total['p99_ms']:>9.3f} ms  "
+                      f"{total['throughput_rows_per_s'] or 0:>10.0f} rows/s  peak {total['peak_mem_mb']:.1f} MB",
+                      flush=True)
+    return results
+
+
+def environment():
+    import sklearn
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms=0.02):
+    """Keys whose p50 grew by more than ``threshold`` (relative) and ``min_delta_ms``"""
+    regressions = []
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        old, new = base["p50_ms"], stats["p50_ms"]
+        if new > old * (1 + threshold) and new - old > min_delta_ms:
+            regressions.append({"key": key, "baseline_p50_ms": old, "p50_ms": new,
+                                "change": round(new / old - 1, 3) if old else None})
+    return sorted(regressions, key=lambda r: -(r["change"] or 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for each inference component")
+    parser.add_argument("--components", default=None, help="Comma-separated name prefixes (e.g. fusion,best_model)")
+    parser.add_argument("--batch-sizes", default="1,32,1024")
+    parser.add_argument("--time-budget", type=float, default=0.5, help="Seconds per component/batch/bucket")
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCHMARK_THRESHOLD", "0.2")),
+                        help="Allowed relative p50 increase before flagging a regression")
+    args = parser.parse_args(argv)
+
+    import app as backend
+
+    wanted = [w.strip() for w in args.components.split(",")] if args.components else None
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    components = load_components(backend, wanted)
+    if not components:
+        print("⚠️ No components to benchmark")
+        sys.exit(1)
+    buckets = sample_texts(backend, per_bucket=max(batch_sizes) * 2)
+
+    print("=" * 70)
+    print(f"Benchmarking {', '.join(c.name for c in components)}")
+    print("=" * 70)
+    results = run(components, buckets, batch_sizes, time_budget=args.time_budget)
+    report = {"environment": environment(), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"✓ Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"✓ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No baseline at {args.baseline} (run with --save-baseline)")
+        return
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline.get("results", {}), args.threshold)
+    if not regressions:
+        print(f"✓ No regressions above {args.threshold:.0%} against {args.baseline}")
+        return
+    print(f"⚠️ {len(regressions)} regression(s) above {args.threshold:.0%}:")
+    for r in regressions:
+        print(f"  {r['key']:<45} {r['baseline_p50_ms']:>9.3f} -> {r['p50_ms']:>9.3f} ms (+{r['change']:.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
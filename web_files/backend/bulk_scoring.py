@@ -0,0 +1,197 @@
+"""
+Streaming bulk scoring for POST /predict/stream.
+
+The uploaded body (CSV shaped like stress.csv, or NDJSON) is read row by row
+from the request stream, scored in fixed-size batches and written back as
+NDJSON or CSV with chunked transfer encoding. At most one batch of input and
+one batch of output is held in memory, regardless of the upload size.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+import time
+
+TEXT_COLUMNS = ("text",)
+ID_COLUMNS = ("id", "post_id")
+OUTPUT_FIELDS = ["row", "id", "label", "probability", "error"]
+
+
+class BulkInputError(Exception):
+    """Raised when the upload cannot be parsed"""
+
+
+def _text_lines(stream, encoding="utf-8"):
+    """Decode a binary stream lazily, keeping line endings (csv needs them)"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    while True:
+        block = stream.read(64 * 1024)
+        if not block:
+            break
+        buffer += decoder.decode(block)
+        # Only "\n" ends a line; the piece after the last one may be incomplete
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+def _csv_records(stream):
+    reader = csv.reader(_text_lines(stream))
+    try:
+        header = next(reader)
+    except StopIteration:
+        raise BulkInputError("Empty upload")
+    columns = [c.strip().lower() for c in header]
+    text_idx = next((columns.index(c) for c in TEXT_COLUMNS if c in columns), None)
+    if text_idx is None:
+        raise BulkInputError(f"CSV header has no text column (expected one of {', '.join(TEXT_COLUMNS)})")
+    id_idx = next((columns.index(c) for c in ID_COLUMNS if c in columns), None)
+
+    def records():
+        for row_number, row in enumerate(reader, start=1):
+            if not row:
+                continue
+            text = row[text_idx] if text_idx < len(row) else ""
+            item_id = row[id_idx] if id_idx is not None and id_idx < len(row) else row_number
+            yield row_number, item_id, text
+    return records()
+
+
+def _ndjson_records(stream):
+    def records():
+        row_number = 0
+        for line in _text_lines(stream):
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                yield row_number, row_number, None
+                continue
+            if not isinstance(obj, dict):
+                obj = {"text": obj}
+            item_id = next((obj[c] for c in ID_COLUMNS if c in obj), row_number)
+            yield row_number, item_id, obj.get("text", "")
+    return records()
+
+
+def open_records(stream, fmt):
+    """
+    Iterator of (row_number, id, text) for an uploaded stream.
+    CSV headers are read eagerly so a bad upload fails before streaming starts.
+    """
+    if fmt == "csv":
+        return _csv_records(stream)
+    if fmt == "ndjson":
+        return _ndjson_records(stream)
+    raise BulkInputError(f"Unsupported input format: {fmt}")
+
+
+def detach_upload(file_storage):
+    """
+    Independent handle on a multipart upload. Flask closes request.files when
+    the view returns, before a streamed response is consumed; fileno() spools
+    the upload to its temporary file, which the duplicated descriptor keeps.
+    """
+    handle = os.fdopen(os.dup(file_storage.stream.fileno()), "rb")
+    handle.seek(0)
+    return handle
+
+
+def _batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Encoder:
+    def __init__(self, output):
+        self.output = output
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+
+    def header(self):
+        if self.output != "csv":
+            return ""
+        self._writer.writeheader()
+        return self._take()
+
+    def rows(self, results):
+        if self.output == "csv":
+            self._writer.writerows(results)
+            return self._take()
+        return "".join(json.dumps(r) + "\n" for r in results)
+
+    def summary(self, summary):
+        if self.output == "csv":
+            return "# " + " ".join(f"{k}={v}" for k, v in summary.items()) + "\n"
+        return json.dumps({"summary": summary}) + "\n"
+
+    def _take(self):
+        text = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return text
+
+
+def stream_scores(records, score_many, batch_size=256, output="ndjson", on_scored=None, model_type=None):
+    """
+    Generator of encoded output chunks (one per batch) followed by a summary
+    with rows/sec. ``score_many(texts)`` returns [(label, confidence), ...];
+    ``on_scored(results, seconds)`` is called after every scored batch.
+    """
+    encoder = _Encoder(output)
+    started = time.perf_counter()
+    rows = scored_rows = errors = 0
+    yield encoder.header()
+    try:
+        for batch in _batches(records, batch_size):
+            results, texts, positions = [], [], []
+            for row_number, item_id, text in batch:
+                result = {"row": row_number, "id": item_id}
+                if text is None:
+                    result["error"] = "Invalid JSON line"
+                elif not str(text).strip():
+                    result["error"] = "No text provided"
+                else:
+                    positions.append(len(results))
+                    texts.append(str(text))
+                results.append(result)
+            if texts:
+                batch_started = time.perf_counter()
+                scored = score_many(texts)
+                batch_seconds = time.perf_counter() - batch_started
+                for pos, (label, confidence) in zip(positions, scored):
+                    results[pos]["label"] = label
+                    results[pos]["probability"] = round(confidence, 4)
+                if on_scored is not None:
+                    on_scored(scored, batch_seconds)
+            rows += len(results)
+            scored_rows += len(texts)
+            errors += len(results) - len(texts)
+            yield encoder.rows(results)
+    except Exception as e:
+        # Headers are already sent; report the failure in-band and stop
+        errors += 1
+        yield encoder.rows([{"row": rows + 1, "id": None, "error": f"Aborted: {e}"}])
+
+    elapsed = time.perf_counter() - started
+    yield encoder.summary({
+        "model_type": model_type,
+        "rows": rows,
+        "scored": scored_rows,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+    })
@@ -0,0 +1,182 @@
+"""
+Compact, read-only vocabularies shared by several fitted vectorizers.
+
+A fitted TF-IDF vectorizer keeps its ``vocabulary_`` as a dict of
+term -> column. The fusion ensemble carries five of them (its members plus
+FeatureUnion parts) with mostly the same n-grams, so every term is stored
+several times. ``compact_vocabularies(model)`` replaces them with:
+
+- one ``TermTable``: every distinct term once, UTF-8 encoded in a sorted
+  fixed-width bytes array; a term's id is its position, found by binary
+  search
+- one ``CompactVocabulary`` per vectorizer: an int32 array term id -> column
+  (-1 when the vectorizer does not use the term)
+
+Both are plain numpy arrays, memory-mapped read-only when the model is
+loaded from a bundle, so forked workers share them instead of each holding
+a dict of Python strings. Only models with several vectorizers are
+compacted: a single one (best_model.pkl) has nothing to de-duplicate, and
+its dict is faster to search than the table.
+
+``CompactVocabulary`` is a read-only Mapping, so scikit-learn code keeps
+working; the serving path (text_features.py) instead looks every n-gram up
+once in the table (one vectorised search per batch) and maps the ids of all
+vectorizers with numpy. Pickling a CompactVocabulary stores a plain dict.
+"""
+from bisect import bisect_left
+from collections.abc import Mapping
+from itertools import chain
+
+import numpy as np
+
+
+class TermTable:
+    """Distinct terms in sorted order; a term's id is its position"""
+
+    def __init__(self, terms):
+        # ``terms``: sorted strings, or their sorted "S" array (e.g. memory-mapped)
+        if not isinstance(terms, np.ndarray):
+            encoded = [term.encode("utf-8", "surrogatepass") for term in terms]
+            if any(term.endswith(b"\0") for term in encoded):
+                raise ValueError("Terms ending in a NUL byte cannot be stored in a TermTable")
+            terms = np.array(encoded, dtype=f"S{max(map(len, encoded), default=1)}")
+        # UTF-8 byte order is code point order, so str-sorted terms stay sorted
+        self.array = terms
+        self._size = len(terms)
+
+    def __len__(self):
+        return self._size
+
+    @classmethod
+    def from_vocabularies(cls, vocabularies):
+        return cls(sorted(set().union(*vocabularies)))
+
+    def terms(self):
+        return [term.decode("utf-8", "surrogatepass") for term in self.array.tolist()]
+
+    def find(self, terms):
+        """Term ids of ``terms`` (strings); terms missing from the table get ``len(self)``"""
+        encoded = [term.encode("utf-8", "surrogatepass") for term in terms]
+        if not encoded or not self._size:
+            return np.full(len(encoded), self._size, dtype=np.int64)
+        # Longer terms are truncated to the array width and trailing NULs are
+        # dropped; comparing lengths rejects both
+        queries = np.array(encoded, dtype=self.array.dtype)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        ids = np.searchsorted(self.array, queries)
+        found = (ids < self._size) & (np.char.str_len(queries) == lengths)
+        found[found] = self.array[ids[found]] == queries[found]
+        ids[~found] = self._size
+        return ids
+
+    def get(self, term, default=None):
+        """Id of one term, or ``default`` (for one term, bisect beats a numpy call)"""
+        key = term.encode("utf-8", "surrogatepass")
+        term_id = bisect_left(self.array, key)
+        if term_id < self._size and self.array[term_id] == key:
+            return term_id
+        return default
+
+    def lookup(self, feature_lists):
+        """
+        (rows, ids) for every feature of every document; features missing
+        from the table get id ``len(self)``.
+        """
+        # Search each distinct feature once (n-grams repeat across a batch)
+        positions = {}
+        inverse = [positions.setdefault(feature, len(positions)) for feature in chain.from_iterable(feature_lists)]
+        ids = self.find(list(positions))[np.asarray(inverse, dtype=np.int64)]
+        lengths = [len(features) for features in feature_lists]
+        rows = np.repeat(np.arange(len(feature_lists), dtype=np.int64), lengths)
+        return rows, ids
+
+
+class CompactVocabulary(Mapping):
+    """term -> column of one vectorizer, through a shared TermTable"""
+
+    def __init__(self, table, columns):
+        # columns[len(table)] is -1 so that TermTable.lookup misses map to -1
+        self.table = table
+        self.columns = np.asarray(columns)  # keeps a memory map (bundle) shared
+        self._column = self.columns.item  # Python int, without a numpy scalar
+        self._size = int(np.count_nonzero(self.columns >= 0))
+
+    @classmethod
+    def build(cls, table, vocabulary):
+        columns = np.full(len(table) + 1, -1, dtype=np.int32)
+        ids = table.find(list(vocabulary))
+        if np.any(ids == len(table)):
+            raise ValueError("Vocabulary has terms missing from the TermTable")
+        columns[ids] = np.fromiter(vocabulary.values(), dtype=np.int32, count=len(vocabulary))
+        return cls(table, columns)
+
+    def __getitem__(self, term):
+        term_id = self.table.get(term) if isinstance(term, str) else None
+        column = -1 if term_id is None else self._column(term_id)
+        if column < 0:
+            raise KeyError(term)
+        return column
+
+    def __contains__(self, term):
+        term_id = self.table.get(term) if isinstance(term, str) else None
+        return term_id is not None and self._column(term_id) >= 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        terms = self.table.terms()
+        columns = self.columns[:-1]
+        used = np.flatnonzero(columns >= 0)
+        for term_id in used[np.argsort(columns[used], kind="stable")]:
+            yield terms[term_id]
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+
+def _leaf_vectorizers(vec):
+    """Fitted Count/Tfidf vectorizers inside ``vec`` (itself or FeatureUnion parts)"""
+    transformer_list = getattr(vec, "transformer_list", None)
+    if transformer_list is not None:
+        for _, trans in transformer_list:
+            if trans is not None and trans != "drop":
+                yield from _leaf_vectorizers(trans)
+    elif isinstance(getattr(vec, "vocabulary_", None), Mapping):
+        yield vec
+
+
+def model_vectorizers(model):
+    """Every vectorizer of a FusionEnsemble or (classifier, vectorizer) tuple / dict"""
+    if hasattr(model, "models") and hasattr(model, "weights"):
+        vectorizers = [member["vectorizer"] for member in model.models]
+    elif isinstance(model, (dict, tuple, list)):
+        from text_features import split_model  # text_features imports this module
+        vectorizers = [split_model(model)[1]]
+    else:
+        vectorizers = []
+    return [leaf for vec in vectorizers if vec is not None for leaf in _leaf_vectorizers(vec)]
+
+
+def compact_vocabularies(model):
+    """
+    Point every vectorizer of ``model`` at one shared TermTable (in place).
+    Returns {"vectorizers", "entries", "terms"}, or None if nothing changed.
+    A single vectorizer is left alone: there is nothing to share, and its
+    dict lookups are faster than a table search.
+    """
+    vectorizers = model_vectorizers(model)
+    if len(vectorizers) < 2:
+        return None
+    vocabularies = [vec.vocabulary_ for vec in vectorizers]
+    tables = {id(v.table) for v in vocabularies if isinstance(v, CompactVocabulary)}
+    if len(tables) == 1 and all(isinstance(v, CompactVocabulary) for v in vocabularies):
+        return None  # already shared (e.g. loaded from a bundle)
+    table = TermTable.from_vocabularies(vocabularies)
+    for vec, vocabulary in zip(vectorizers, vocabularies):
+        vec.vocabulary_ = CompactVocabulary.build(table, vocabulary)
+    return {
+        "vectorizers": len(vectorizers),
+        "entries": sum(len(v) for v in vocabularies),
+        "terms": len(table),
+    }
@@ -0,0 +1,444 @@
+"""
+Compiled linear scoring for TF-IDF + linear classifier models.
+
+Every model we serve is a bag-of-n-grams TF-IDF vectorizer followed by a
+linear classifier (LogisticRegression, RidgeClassifier, bagged SGD).  For a
+document with term counts ``tf`` the decision value is
+
+    sum_t tf_t * idf_t * w_t / ||tf * idf|| + b
+
+so the vocabulary, IDF vector and coefficients can be folded into a single
+term -> weight table (``idf_t * w_t``) per output.  Scoring then becomes a
+table lookup per n-gram, a norm and a handful of numpy reductions, with no
+sklearn call chain in between.
+
+``compile_model`` builds a compiled scorer for a FusionEnsemble, a
+(classifier, vectorizer) tuple / dict, or a vectorizer + classifier Pipeline.
+``verify_compiled`` checks it against the original model's predictions.
+"""
+import numpy as np
+
+from compact_vocab import CompactVocabulary
+from text_features import SharedTextTransformer, _Leaf, _Union, split_model
+
+
+class CompileError(Exception):
+    """Raised when a model cannot be folded into a linear weight table"""
+
+
+def _expit(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    x = x - np.max(x, axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= np.sum(x, axis=1, keepdims=True)
+    return x
+
+
+# ===============================
+# Vectorizer side: term tables
+# ===============================
+class _TermTable:
+    """One TF-IDF vectorizer (or FeatureUnion part) folded with its coefficients"""
+
+    def __init__(self, leaf, weight, offset):
+        vec = leaf.vec
+        tfidf = getattr(vec, "_tfidf", None)
+        self.leaf = leaf
+        self.weight = 1.0 if weight is None else float(weight)
+        self.offset = offset
+        self.n_terms = leaf.n_features
+        self.vocabulary = vec.vocabulary_
+        self.binary = bool(vec.binary)
+        if tfidf is not None:
+            self.idf = np.asarray(tfidf.idf_, dtype=np.float64) if tfidf.use_idf else None
+            self.norm = tfidf.norm
+            self.sublinear = bool(tfidf.sublinear_tf)
+        else:
+            self.idf, self.norm, self.sublinear = None, None, False
+        if self.norm not in (None, "l1", "l2"):
+            raise CompileError(f"Unsupported TF-IDF norm: {self.norm}")
+        self.table = None
+        self.local = None
+
+    def fold(self, W):
+        """Fold idf into this part's slice of the (n_features, n_outputs) coefficients"""
+        part = W[self.offset:self.offset + self.n_terms]
+        if self.idf is not None:
+            part = part * self.idf[:, None]
+        self.table = np.ascontiguousarray(part * self.weight)
+
+    def score(self, hits, n, out):
+        """Add this part's normalized contribution to ``out`` (n_texts, n_outputs)"""
+        r, c, tf = hits
+        if self.local is not None:
+            c = self.local[c]
+            keep = c >= 0
+            r, c, tf = r[keep], c[keep], tf[keep]
+        if len(c) == 0:
+            return
+        if self.binary:
+            tf = np.ones_like(tf)
+        if self.sublinear:
+            tf = np.log(tf) + 1.0
+
+        if self.norm is not None:
+            w = tf * self.idf[c] if self.idf is not None else tf
+            if self.norm == "l2":
+                norms = np.sqrt(np.bincount(r, weights=w * w, minlength=n))
+            else:
+                norms = np.bincount(r, weights=np.abs(w), minlength=n)
+            norms[norms == 0.0] = 1.0
+            tf = tf / norms[r]
+
+        contrib = self.table[c] * tf[:, None]
+        for j in range(out.shape[1]):
+            out[:, j] += np.bincount(r, weights=contrib[:, j], minlength=n)
+
+
+class _TermIndex:
+    """
+    Merged vocabulary of every term table that reads the same n-gram stream,
+    so each n-gram is looked up once no matter how many members use it.
+    """
+
+    def __init__(self, tables):
+        self.ngram_key = tables[0].leaf.ngram_key
+        self.table = None
+        shared = {id(t.vocabulary.table) for t in tables if isinstance(t.vocabulary, CompactVocabulary)}
+        if len(shared) == 1 and all(isinstance(t.vocabulary, CompactVocabulary) for t in tables):
+            # Already merged by compact_vocabularies: look terms up in the shared table
+            for table in tables:
+                table.local = np.asarray(table.vocabulary.columns[:-1], dtype=np.int64)
+            self.table = tables[0].vocabulary.table
+            self.vocabulary = None
+        elif len(tables) == 1 and not isinstance(tables[0].vocabulary, CompactVocabulary):
+            tables[0].local = None
+            self.vocabulary = tables[0].vocabulary
+        else:
+            vocabulary = {}
+            for table in tables:
+                for term in table.vocabulary:
+                    vocabulary.setdefault(term, len(vocabulary))
+            for table in tables:
+                local = np.full(len(vocabulary), -1, dtype=np.int64)
+                for term, idx in table.vocabulary.items():
+                    local[vocabulary[term]] = idx
+                table.local = local
+            self.vocabulary = vocabulary
+        self.size = len(self.table if self.table is not None else self.vocabulary)
+
+    def hits(self, feature_lists):
+        """(row, term id, count) triples for every in-vocabulary n-gram"""
+        if self.table is not None:
+            rows, cols = self.table.lookup(feature_lists)
+            keep = cols < self.size
+            rows, cols = rows[keep], cols[keep]
+        else:
+            vocabulary_get = self.vocabulary.get
+            rows, cols = [], []
+            for r, features in enumerate(feature_lists):
+                for feature in features:
+                    idx = vocabulary_get(feature)
+                    if idx is not None:
+                        rows.append(r)
+                        cols.append(idx)
+            rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+        if not len(cols):
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        keys, tf = np.unique(rows * self.size + cols, return_counts=True)
+        return keys // self.size, keys % self.size, tf.astype(np.float64)
+
+
+def _index_tables(tables):
+    """Group term tables by n-gram stream into merged _TermIndex objects"""
+    groups = {}
+    for table in tables:
+        groups.setdefault(table.leaf.ngram_key, []).append(table)
+    return [_TermIndex(group) for group in groups.values()]
+
+
+def _hits(indices, features):
+    return {index.ngram_key: index.hits(features[index.ngram_key]) for index in indices}
+
+
+def _term_tables(plan, weight=None, offset=0):
+    """Flatten a text_features plan into term tables with column offsets"""
+    if isinstance(plan, _Leaf):
+        return [_TermTable(plan, weight, offset)], offset + plan.n_features
+    if isinstance(plan, _Union):
+        tables = []
+        for sub, sub_weight in plan.parts:
+            if sub_weight is not None:
+                sub_weight = sub_weight if weight is None else sub_weight * weight
+            else:
+                sub_weight = weight
+            sub_tables, offset = _term_tables(sub, sub_weight, offset)
+            tables.extend(sub_tables)
+        return tables, offset
+    raise CompileError(f"Unsupported vectorizer: {type(plan.vec).__name__}")
+
+
+# ===============================
+# Classifier side: linear heads
+# ===============================
+def _proba_kind(clf):
+    """How a single linear classifier turns decisions into predict_proba"""
+    if not hasattr(clf, "predict_proba"):
+        return None
+    name = type(clf).__name__
+    if name == "LogisticRegression":
+        if len(clf.classes_) > 2 and getattr(clf, "multi_class", "auto") == "ovr":
+            return "ovr"
+        return "logistic"
+    if name == "SGDClassifier" and getattr(clf, "loss", None) in ("log_loss", "log"):
+        return "ovr" if len(clf.classes_) > 2 else "logistic"
+    raise CompileError(f"Unsupported probability model: {name}")
+
+
+def _linear_coefs(clf, n_features):
+    coef = getattr(clf, "coef_", None)
+    intercept = getattr(clf, "intercept_", None)
+    if coef is None or intercept is None:
+        raise CompileError(f"Not a linear classifier: {type(clf).__name__}")
+    if hasattr(coef, "toarray"):
+        coef = coef.toarray()
+    coef = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+    if coef.shape[1] != n_features:
+        raise CompileError("Classifier/vectorizer feature count mismatch")
+    return coef.T, np.atleast_1d(np.asarray(intercept, dtype=np.float64))
+
+
+class _DecisionRules:
+    """
+    Decision -> prediction/probability rules of the original classifier.
+    kind is one of: "linear" (plain classifier) or "bagging_votes" /
+    "bagging_proba" (BaggingClassifier over binary linear estimators);
+    proba_kind applies to "linear" and has_proba tells whether the
+    original classifier had predict_proba.
+    """
+
+    def predict_idx(self, dec):
+        """Indices into classes_, matching clf.predict"""
+        if self.kind == "linear":
+            if dec.shape[1] == 1:
+                return (dec[:, 0] > 0).astype(np.intp)
+            return np.argmax(dec, axis=1)
+        return np.argmax(self.proba(dec), axis=1)
+
+    def proba(self, dec):
+        """Matches clf.predict_proba; only valid when has_proba"""
+        if self.kind == "bagging_votes":
+            votes = (dec > 0).mean(axis=1)
+            return np.column_stack([1.0 - votes, votes])
+        if self.kind == "bagging_proba":
+            p = _expit(dec).mean(axis=1)
+            return np.column_stack([1.0 - p, p])
+        if self.proba_kind == "logistic":
+            if dec.shape[1] == 1:
+                p = _expit(dec[:, 0])
+                return np.column_stack([1.0 - p, p])
+            return _softmax(dec.copy())
+        p = _expit(dec)
+        p /= p.sum(axis=1, keepdims=True)
+        return p
+
+    def member_proba(self, dec):
+        """Matches FusionEnsemble.member_proba for this classifier"""
+        if self.has_proba:
+            return self.proba(dec)
+        if dec.shape[1] == 1:
+            dec = np.column_stack([-dec[:, 0], dec[:, 0]])
+        return _softmax(dec.copy())
+
+
+class _LinearHead(_DecisionRules):
+    """A fitted linear classifier as a (n_features, n_outputs) weight matrix plus its rules"""
+
+    def __init__(self, clf, n_features):
+        try:
+            self.classes_ = np.asarray(clf.classes_)
+        except AttributeError:
+            raise CompileError(f"Classifier is not fitted: {type(clf).__name__}")
+        self.has_proba = hasattr(clf, "predict_proba")
+
+        if isinstance(clf, _DecisionRules):
+            # Already in this form (model_compression.CompressedLinearClassifier)
+            W, b = _linear_coefs(clf, n_features)
+            self.kind, self.proba_kind = clf.kind, clf.proba_kind
+        elif hasattr(clf, "estimators_") and hasattr(clf, "estimators_features_"):
+            if len(self.classes_) != 2:
+                raise CompileError("Only binary bagging ensembles can be compiled")
+            W = np.zeros((n_features, len(clf.estimators_)))
+            b = np.zeros(len(clf.estimators_))
+            kinds = set()
+            for j, (est, features) in enumerate(zip(clf.estimators_, clf.estimators_features_)):
+                est_classes = list(getattr(est, "classes_", []))
+                if est_classes != [0, 1]:
+                    raise CompileError("Bagged estimator did not see both classes")
+                coef, intercept = _linear_coefs(est, len(features))
+                np.add.at(W[:, j], np.asarray(features), coef[:, 0])
+                b[j] = intercept[0]
+                kinds.add(_proba_kind(est))
+            if kinds == {None}:
+                self.kind = "bagging_votes"
+            elif kinds == {"logistic"}:
+                self.kind = "bagging_proba"
+            else:
+                raise CompileError("Mixed bagged estimator types")
+            self.proba_kind = None
+        else:
+            W, b = _linear_coefs(clf, n_features)
+            self.kind = "linear"
+            self.proba_kind = _proba_kind(clf)
+        self.W = W
+        self.b = b
+
+
+class CompiledLinearModel:
+    """A vectorizer + linear classifier folded into term -> weight tables"""
+
+    is_compiled = True
+
+    def __init__(self, clf, vectorizer, analyzer=None, plan=None):
+        standalone = analyzer is None
+        if standalone:
+            analyzer = SharedTextTransformer([vectorizer])
+            plan = analyzer.plans[0]
+        self.analyzer = analyzer
+        self.tables, n_features = _term_tables(plan)
+        self.head = _LinearHead(clf, n_features)
+        for table in self.tables:
+            table.fold(self.head.W)
+        # Members of a compiled ensemble are indexed by the ensemble instead
+        self.indices = _index_tables(self.tables) if standalone else None
+        self.classes_ = self.head.classes_
+        self.has_proba = self.head.has_proba
+
+    @property
+    def n_terms(self):
+        return sum(t.n_terms for t in self.tables)
+
+    def decision(self, hits, n):
+        dec = np.zeros((n, self.head.W.shape[1]))
+        for table in self.tables:
+            table.score(hits[table.leaf.ngram_key], n, dec)
+        dec += self.head.b
+        return dec
+
+    def _decide(self, texts):
+        if isinstance(texts, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        texts = list(texts)
+        hits = _hits(self.indices, self.analyzer.analyze(texts))
+        return self.decision(hits, len(texts))
+
+    def predict(self, texts):
+        return self.classes_[self.head.predict_idx(self._decide(texts))]
+
+    def predict_proba(self, texts):
+        if not self.has_proba:
+            raise AttributeError("Compiled model has no predict_proba")
+        return self.head.proba(self._decide(texts))
+
+    def predict_with_proba(self, texts):
+        """Predicted labels and probabilities (None without predict_proba)"""
+        dec = self._decide(texts)
+        proba = self.head.proba(dec) if self.has_proba else None
+        return self.classes_[self.head.predict_idx(dec)], proba
+
+
+class CompiledFusionEnsemble:
+    """FusionEnsemble with every member compiled; one shared analysis pass"""
+
+    is_compiled = True
+
+    def __init__(self, ensemble):
+        self.analyzer = SharedTextTransformer([m['vectorizer'] for m in ensemble.models])
+        self.members = [
+            (CompiledLinearModel(m['model'], m['vectorizer'], self.analyzer, plan), m['weight'])
+            for m, plan in zip(ensemble.models, self.analyzer.plans)
+        ]
+        self.indices = _index_tables([t for member, _ in self.members for t in member.tables])
+        self.weights = list(ensemble.weights)
+
+    @property
+    def n_terms(self):
+        return sum(member.n_terms for member, _ in self.members)
+
+    def predict_proba(self, texts):
+        if isinstance(texts, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        texts = list(texts)
+        hits = _hits(self.indices, self.analyzer.analyze(texts))
+        all_predictions = []
+        for member, weight in self.members:
+            dec = member.decision(hits, len(texts))
+            all_predictions.append(member.head.member_proba(dec) * weight)
+        return np.sum(all_predictions, axis=0) / np.sum(self.weights)
+
+    def predict(self, texts):
+        return np.argmax(self.predict_proba(texts), axis=1)
+
+    def predict_with_proba(self, texts):
+        probas = self.predict_proba(texts)
+        return np.argmax(probas, axis=1), probas
+
+
+def _split_pipeline(model):
+    """(classifier, vectorizer) for a two-step vectorizer + classifier Pipeline"""
+    steps = getattr(model, "steps", None)
+    if not steps or len(steps) != 2:
+        raise CompileError("Only vectorizer + classifier pipelines can be compiled")
+    vectorizer, clf = steps[0][1], steps[1][1]
+    # build_fallback_pipeline wraps the fitted vectorizer
+    vectorizer = getattr(vectorizer, "vectorizer", vectorizer)
+    return clf, vectorizer
+
+
+def compile_model(model):
+    """
+    Compile a served model into term -> weight tables.
+    Accepts a FusionEnsemble, a (classifier, vectorizer) tuple/dict or a
+    vectorizer + classifier Pipeline; raises CompileError otherwise.
+    """
+    if hasattr(model, "models") and hasattr(model, "weights"):
+        return CompiledFusionEnsemble(model)
+    if hasattr(model, "named_steps"):
+        clf, vectorizer = _split_pipeline(model)
+    elif isinstance(model, (dict, tuple, list)):
+        clf, vectorizer = split_model(model)
+    else:
+        raise CompileError(f"Unsupported model type: {type(model).__name__}")
+    if clf is None or vectorizer is None:
+        raise CompileError("Invalid model structure")
+    return CompiledLinearModel(clf, vectorizer)
+
+
+def verify_compiled(model, compiled, texts, atol=1e-6):
+    """
+    Compare compiled scores with the original model on ``texts``.
+    Returns (ok, max_abs_diff); labels must match exactly and
+    probabilities (or decisions for models without predict_proba) within atol.
+    """
+    texts = list(texts)
+    if isinstance(compiled, CompiledFusionEnsemble):
+        expected = model.predict_proba(texts)
+        got = compiled.predict_proba(texts)
+        same_labels = np.array_equal(np.argmax(expected, axis=1), np.argmax(got, axis=1))
+    else:
+        clf, vectorizer = _split_pipeline(model) if hasattr(model, "named_steps") else split_model(model)
+        X = vectorizer.transform(texts)
+        dec = compiled._decide(texts)
+        if compiled.has_proba:
+            expected, got = clf.predict_proba(X), compiled.head.proba(dec)
+        else:
+            expected = np.atleast_2d(clf.decision_function(X))
+            expected = expected.reshape(len(texts), -1)
+            got = dec
+        same_labels = np.array_equal(clf.predict(X), compiled.classes_[compiled.head.predict_idx(dec)])
+    max_diff = float(np.max(np.abs(np.asarray(expected) - np.asarray(got)))) if len(texts) else 0.0
+    return bool(same_labels and max_diff <= atol), max_diff
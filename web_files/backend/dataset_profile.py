@@ -0,0 +1,147 @@
+"""
+Label profile of the training dataset for /dataset-stats.
+
+The profile (stress / non-stress counts and the 7-bin trend) is computed
+vectorized from the label column. ``LabelProfile`` accumulates it chunk by
+chunk so the aggregate store (aggregate_store.py) can merge appended rows
+without re-reading the dataset.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+TREND_BINS = 7
+LABEL_NAMES = {"label", "target", "class"}
+
+
+def file_digest(path, limit=None):
+    """blake2b of the file, or of its first ``limit`` bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            block = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def stat_key(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _string_is_stress(series):
+    """Vectorized ``"stress" in v and "non" not in v`` on lower-cased strings"""
+    values = series.astype(str).str.lower()
+    return (values.str.contains("stress", regex=False) & ~values.str.contains("non", regex=False)).to_numpy()
+
+
+def _read_label_column(path):
+    """Return the label column, reading only that column when it is named"""
+    import pandas as pd
+
+    header = pd.read_csv(path, nrows=0).columns
+    for col in header:
+        if col.lower() in LABEL_NAMES:
+            return pd.read_csv(path, usecols=[col])[col]
+
+    # No conventional name: same heuristic as before, which needs dtypes
+    df = pd.read_csv(path)
+    num_cols = [c for c in df.columns if pd.api.types.is_integer_dtype(df[c]) or pd.api.types.is_bool_dtype(df[c])]
+    label_col = num_cols[0] if num_cols else (df.columns[0] if len(df.columns) else None)
+    return df[label_col] if label_col is not None else None
+
+
+def label_indicator(series):
+    """
+    (stress indicator used for the trend, stress count, non-stress count)
+    with the /dataset-stats semantics: numeric labels count 1 / 0, string
+    labels count anything mentioning "stress" but not "non".
+    """
+    import pandas as pd
+
+    numeric = pd.to_numeric(series, errors="coerce")
+    if numeric.notna().any():
+        stress_count = int((numeric == 1).sum())
+        non_stress_count = int((numeric == 0).sum())
+    else:
+        flags = _string_is_stress(series)
+        stress_count = int(flags.sum())
+        non_stress_count = int(len(series) - stress_count)
+
+    if pd.api.types.is_numeric_dtype(series):
+        indicator = (numeric == 1).to_numpy()
+    else:
+        indicator = _string_is_stress(series)
+    return indicator, stress_count, non_stress_count
+
+
+def trend_bins(indicator, bins=TREND_BINS):
+    """Split rows into consecutive chunks of ``size // bins`` rows"""
+    size = len(indicator)
+    if size == 0:
+        return []
+    step = max(1, size // bins)
+    starts = np.arange(0, size, step)
+    stress = np.add.reduceat(indicator.astype(np.int64), starts)
+    lengths = np.diff(np.append(starts, size))
+    return [
+        {"day": f"{i + 1}", "stress": int(s), "nonStress": int(n - s)}
+        for i, (s, n) in enumerate(zip(stress, lengths))
+    ]
+
+
+def compute_profile(path):
+    series = _read_label_column(path)
+    if series is None:
+        return {"stress": 0, "nonStress": 0, "trend": []}
+    indicator, stress_count, non_stress_count = label_indicator(series)
+    return {"stress": stress_count, "nonStress": non_stress_count, "trend": trend_bins(indicator)}
+
+
+class LabelProfile:
+    """Incremental version of ``label_indicator`` + ``trend_bins``"""
+
+    def __init__(self):
+        self.total = 0
+        self.numeric_present = 0
+        self.ones = 0
+        self.zeros = 0
+        self.string_stress = 0
+        self.numeric_dtype = True
+        self._numeric_flags = []
+        self._string_flags = []
+
+    def update(self, series):
+        import pandas as pd
+
+        numeric = pd.to_numeric(series, errors="coerce")
+        ones = (numeric == 1).to_numpy()
+        strings = _string_is_stress(series)
+        self.total += len(series)
+        self.numeric_present += int(numeric.notna().sum())
+        self.ones += int(ones.sum())
+        self.zeros += int((numeric == 0).sum())
+        self.string_stress += int(strings.sum())
+        self.numeric_dtype &= pd.api.types.is_numeric_dtype(series)
+        self._numeric_flags.append(ones)
+        self._string_flags.append(strings)
+
+    @staticmethod
+    def _joined(parts):
+        if len(parts) > 1:
+            parts[:] = [np.concatenate(parts)]
+        return parts[0] if parts else np.zeros(0, dtype=bool)
+
+    def profile(self):
+        if self.numeric_present:
+            stress_count, non_stress_count = self.ones, self.zeros
+        else:
+            stress_count, non_stress_count = self.string_stress, self.total - self.string_stress
+        indicator = self._joined(self._numeric_flags if self.numeric_dtype else self._string_flags)
+        return {"stress": stress_count, "nonStress": non_stress_count, "trend": trend_bins(indicator)}
@@ -0,0 +1,309 @@
+"""
+Streaming EDA engine for the /eda fallback (no reports/eda_results.json).
+
+The dataset is read in chunks of ``EDA_CHUNK_ROWS`` rows and every statistic
+is accumulated incrementally, so memory is bounded by the chunk size plus
+the aggregates themselves:
+
+- shape, memory, missing values
+- duplicate rows (one 64-bit row hash per row)
+- label distribution and the subreddit x label crosstab (Counters)
+- per text column: exact length / word-count histograms (Counters keyed by
+  length, so means and medians stay exact) and sentence totals
+- word frequencies of the main text column (second pass over that column only)
+- numeric column co-moments for pairwise-complete correlations
+
+The output has the same schema as the previous in-memory implementation.
+"""
+import os
+import re
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_CHUNK_ROWS = int(os.getenv("EDA_CHUNK_ROWS", "50000"))
+LABEL_NAMES = ("label", "target", "class")
+WORD_RE = re.compile(r'\b[a-z]{3,}\b')
+SENTENCE_RE = r'[.!?]'
+
+
+def _is_stress_label(value):
+    v = str(value).lower()
+    return "stress" in v and "non" not in v
+
+
+def _median(counter):
+    """Median of the values described by a {value: count} Counter"""
+    n = sum(counter.values())
+    if n == 0:
+        return float("nan")
+    lo, hi = (n - 1) // 2, n // 2
+    seen = 0
+    low_value = None
+    for value in sorted(counter):
+        seen += counter[value]
+        if low_value is None and seen > lo:
+            low_value = value
+        if seen > hi:
+            return (low_value + value) / 2.0
+    return float(low_value)
+
+
+def _mean(counter):
+    n = sum(counter.values())
+    return sum(v * c for v, c in counter.items()) / n if n else float("nan")
+
+
+class _TextColumn:
+    """Length, word-count and sentence accumulators for one object column"""
+
+    def __init__(self):
+        self.lengths = Counter()
+        self.words = Counter()
+        self.sentences = 0
+        self.rows = 0
+
+    def update(self, series):
+        text = series.astype(str)
+        self.lengths.update(text.str.len().value_counts().to_dict())
+        self.words.update(text.str.split().str.len().value_counts().to_dict())
+        self.sentences += int(text.str.count(SENTENCE_RE).sum()) + len(text)
+        self.rows += len(text)
+
+    def stats(self):
+        return {
+            "avg_length": float(_mean(self.lengths)),
+            "median_length": float(_median(self.lengths)),
+            "avg_words": float(_mean(self.words)),
+            "median_words": float(_median(self.words)),
+            "avg_sentences": float(self.sentences / self.rows) if self.rows else float("nan"),
+        }
+
+
+class _Moments:
+    """Pairwise-complete co-moments of the numeric columns (shifted sums)"""
+
+    def __init__(self, columns, shift):
+        k = len(columns)
+        self.columns = list(columns)
+        self.shift = np.asarray(shift, dtype=np.float64)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def update(self, values):
+        x = values - self.shift
+        present = ~np.isnan(x)
+        m = present.astype(np.float64)
+        x0 = np.where(present, x, 0.0)
+        self.n += m.T @ m
+        self.sx += x0.T @ m
+        self.sxx += (x0 * x0).T @ m
+        self.sxy += x0.T @ x0
+
+    def correlation(self):
+        n, sx, sy = self.n, self.sx, self.sx.T
+        sxx, syy = self.sxx, self.sxx.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * self.sxy - sx * sy
+            var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+            corr = cov / np.sqrt(var)
+        corr[(n < 2) | ~(var > 0)] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+class EdaAccumulator:
+    """Incremental /eda statistics; feed chunks with ``update``"""
+
+    def __init__(self):
+        self.columns = None
+        self.label_col = None
+        self.rows = 0
+        self.memory_bytes = 0
+        self.missing = 0
+        self.row_hashes = []
+        self.label_counts = Counter()
+        self.label_numeric = True
+        self.subreddit_counts = Counter()
+        self.subreddit_labels = Counter()
+        self.object_columns = {}
+        self.non_numeric = set()
+        self.moments = None
+        self.main_text_col = None
+        self.word_counts = Counter()
+
+    def _init_columns(self, chunk):
+        self.columns = list(chunk.columns)
+        for col in self.columns:
+            if col.lower() in LABEL_NAMES:
+                self.label_col = col
+                break
+
+    def update(self, chunk):
+        """Accumulate one DataFrame chunk (all columns)"""
+        import pandas as pd
+
+        if self.columns is None:
+            self._init_columns(chunk)
+        self.rows += len(chunk)
+        self.memory_bytes += int(chunk.memory_usage(deep=True, index=False).sum())
+        self.missing += int(chunk.isnull().sum().sum())
+        self.row_hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy(dtype=np.uint64))
+
+        label = chunk[self.label_col] if self.label_col else None
+        if label is not None:
+            self.label_counts.update(label.value_counts().to_dict())
+            self.label_numeric &= pd.api.types.is_numeric_dtype(label)
+
+        if "subreddit" in chunk.columns:
+            self.subreddit_counts.update(chunk["subreddit"].value_counts().to_dict())
+            if label is not None:
+                pairs = chunk[["subreddit", self.label_col]].dropna()
+                grouped = pairs.groupby(["subreddit", self.label_col]).size()
+                self.subreddit_labels.update(grouped.to_dict())
+
+        for col in chunk.columns:
+            if chunk[col].dtype == "object":
+                self.object_columns.setdefault(col, _TextColumn())
+            if col in self.object_columns:
+                self.object_columns[col].update(chunk[col])
+
+        numeric = chunk.select_dtypes(include=[np.number]).columns
+        self.non_numeric.update(c for c in chunk.columns if c not in numeric)
+        if self.moments is None:
+            numeric_cols = list(numeric)
+            shift = np.nan_to_num(chunk[numeric_cols].mean().to_numpy(dtype=np.float64)) if numeric_cols else []
+            self.moments = _Moments(numeric_cols, shift)
+        if self.moments.columns:
+            numeric_set = set(numeric)
+            values = np.full((len(chunk), len(self.moments.columns)), np.nan)
+            idx = [i for i, c in enumerate(self.moments.columns) if c in numeric_set]
+            values[:, idx] = chunk[[self.moments.columns[i] for i in idx]].to_numpy(dtype=np.float64)
+            self.moments.update(values)
+
+    def text_columns(self):
+        """Object columns whose mean string length exceeds 10, in column order"""
+        return [c for c in self.columns or [] if c in self.object_columns
+                and _mean(self.object_columns[c].lengths) > 10]
+
+    def update_words(self, series):
+        """Accumulate word frequencies for the main text column"""
+        text = " ".join(series.dropna().astype(str).tolist())
+        self.word_counts.update(WORD_RE.findall(text.lower()))
+
+    def _duplicates(self):
+        if not self.row_hashes:
+            return 0
+        hashes = np.concatenate(self.row_hashes)
+        self.row_hashes = [hashes]
+        return int(len(hashes) - len(np.unique(hashes)))
+
+    def _subreddit_stats(self):
+        if not self.subreddit_counts:
+            return None
+        top = self.subreddit_counts.most_common(15)
+        stats = {
+            "top_subreddits": {str(k): int(v) for k, v in top},
+            "total_unique": len(self.subreddit_counts),
+            "subreddit_label_cross": {},
+        }
+        if not self.label_col:
+            return stats
+
+        top_10 = [k for k, _ in top[:10]]
+        labels = sorted({l for (s, l) in self.subreddit_labels if s in top_10})
+        subs = sorted({s for (s, l) in self.subreddit_labels if s in top_10})
+        if subs:
+            stats["subreddit_label_cross"] = {
+                "subreddits": [str(s) for s in subs],
+                "labels": [str(l) for l in labels],
+                "values": [[int(self.subreddit_labels.get((s, l), 0)) for l in labels] for s in subs],
+            }
+
+        stress_rates = {}
+        for subreddit in top_10:
+            label_values = Counter({l: c for (s, l), c in self.subreddit_labels.items() if s == subreddit})
+            if not label_values:
+                continue
+            ordered = [l for l, _ in label_values.most_common()]
+            if self.label_numeric:
+                stress_label = 1
+            else:
+                matches = [l for l in ordered if _is_stress_label(l)]
+                stress_label = matches[0] if matches else ordered[0]
+            stress_count = int(label_values.get(stress_label, 0))
+            total = int(self.subreddit_counts[subreddit])
+            stress_rates[str(subreddit)] = {
+                "stress_count": stress_count,
+                "total": total,
+                "stress_rate": round(stress_count / total, 3) if total > 0 else 0,
+            }
+        stats["stress_rates"] = stress_rates
+        return stats
+
+    def _high_correlations(self):
+        if self.moments is None:
+            return []
+        keep = [i for i, c in enumerate(self.moments.columns) if c not in self.non_numeric]
+        if len(keep) < 2:
+            return []
+        corr = self.moments.correlation()
+        names = self.moments.columns
+        high = []
+        for a in range(len(keep)):
+            for b in range(a + 1, len(keep)):
+                value = corr[keep[a], keep[b]]
+                if not np.isnan(value) and abs(value) > 0.5:
+                    high.append({"feature1": str(names[keep[a]]), "feature2": str(names[keep[b]]),
+                                 "correlation": float(value)})
+        high.sort(key=lambda x: abs(x["correlation"]), reverse=True)
+        return high[:20]
+
+    def _length_distribution(self):
+        if not self.main_text_col:
+            return []
+        lengths = self.object_columns[self.main_text_col].lengths
+        max_len = int(max(lengths)) if lengths else 1000
+        bucket_size = max(100, max_len // 10)
+        buckets = Counter()
+        for length, count in lengths.items():
+            buckets[(length // bucket_size) * bucket_size] += count
+        return [{"bucket": f"{k}-{k + bucket_size}", "count": v} for k, v in sorted(buckets.items())]
+
+    def result(self):
+        """The /eda payload"""
+        label_distribution = {str(k): int(v) for k, v in self.label_counts.most_common()}
+        text_cols = self.text_columns()
+        insights = []
+        if self.label_col and len(label_distribution) == 2:
+            counts = list(label_distribution.values())
+            ratio = max(counts) / min(counts) if min(counts) > 0 else 1
+            if ratio > 2:
+                insights.append({"type": "warning",
+                                 "message": f"Severe class imbalance ({ratio:.1f}:1) - Consider resampling techniques"})
+            elif ratio > 1.5:
+                insights.append({"type": "caution",
+                                 "message": f"Moderate class imbalance ({ratio:.1f}:1) - Use stratified sampling"})
+            else:
+                insights.append({"type": "success", "message": "Classes are well balanced for training"})
+
+        return {
+            "basic_stats": {
+                "shape": [self.rows, len(self.columns or [])],
+                "memory_mb": round(self.memory_bytes / 1024**2, 2),
+                "duplicates": self._duplicates(),
+                "missing_total": self.missing,
+            },
+            "label_distribution": label_distribution,
+            "class_distribution": label_distribution,
+            "text_stats": {col: self.object_columns[col].stats() for col in text_cols[:3]},
+            "insights": insights,
+            "high_correlations": self._high_correlations(),
+            "word_frequencies": [[w, c] for w, c in self.word_counts.most_common(50)],
+            "text_length_distribution": self._length_distribution(),
+            "subreddit_stats": self._subreddit_stats(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+        }
+
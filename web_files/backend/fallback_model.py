@@ -0,0 +1,181 @@
+"""
+Fallback TF-IDF + LogisticRegression pipeline with a content-addressed cache.
+
+Used when no trained model artifact is available. Training reads the dataset
+once (text and label columns together) and the fitted pipeline is stored as
+``fallback-<key>.joblib``, where the key hashes the dataset content, the
+training parameters and the scikit-learn version. Later startups (and other
+workers or replicas sharing the directory) load that file instead of
+retraining; a changed dataset or parameter set produces a new key.
+
+Writers take an exclusive lock on ``<entry>.lock`` so concurrent workers
+train once; the others wait and load the result. Entries are written to a
+temporary file and renamed into place, so a reader never sees a partial one.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import time
+
+from dataset_profile import file_digest
+
+CACHE_VERSION = 1
+TEXT_COLUMNS = ["text", "clean_text", "post_id", "content"]
+LABEL_COLUMNS = ["label", "target", "class"]
+DEFAULT_PARAMS = {
+    "max_rows": 10000,
+    "max_features": 5000,
+    "ngram_range": [1, 2],
+    "min_df": 1,
+    "max_iter": 1000,
+    "random_state": 42,
+}
+KEEP_ENTRIES = 3
+
+# Used when no dataset can be found
+MINIMAL_TEXTS = [
+    "I feel calm and relaxed today.",
+    "I am overwhelmed and stressed about my work.",
+    "Everything is fine and I am doing great.",
+    "Panic and anxiety attacks are getting worse.",
+    "I feel happy and content with my life.",
+    "Work is causing me extreme stress and anxiety.",
+]
+MINIMAL_LABELS = [0, 1, 0, 1, 0, 1]
+
+
+class PrefitVectorizerWrapper:
+    """Pipeline step around an already fitted vectorizer (fit is a no-op)"""
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        return self.vectorizer.transform(X)
+
+
+def read_training_data(path, max_rows):
+    """(texts, labels) from one pass over the dataset"""
+    import pandas as pd
+
+    header = list(pd.read_csv(path, nrows=0).columns)
+    text_col = next((c for c in TEXT_COLUMNS if c in header), None)
+    label_col = next((c for c in LABEL_COLUMNS if c in header), None)
+    if text_col is not None:
+        df = pd.read_csv(path, usecols=[c for c in (text_col, label_col) if c is not None])
+    else:
+        df = pd.read_csv(path)
+        obj_cols = [c for c in df.columns if df[c].dtype == "object"]
+        text_col = obj_cols[0] if obj_cols else None
+        if text_col is None:
+            return [], []
+    df = df[df[text_col].notna()].head(max_rows)
+    texts = df[text_col].astype(str).tolist()
+    if label_col is not None:
+        labels = df[label_col].values
+    else:
+        labels = [i % 2 for i in range(len(texts))]
+    return texts, labels
+
+
+def train(texts, labels, params):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    vec = TfidfVectorizer(max_features=params["max_features"], ngram_range=tuple(params["ngram_range"]),
+                          min_df=params["min_df"])
+    X = vec.fit_transform(texts)
+    clf = LogisticRegression(max_iter=params["max_iter"], random_state=params["random_state"])
+    clf.fit(X, labels)
+    return Pipeline([("tfidf", PrefitVectorizerWrapper(vec)), ("clf", clf)])
+
+
+def cache_key(dataset_path, params):
+    """Hash of the dataset content, training parameters and library versions"""
+    import sklearn
+
+    material = {
+        "version": CACHE_VERSION,
+        "dataset": file_digest(dataset_path),
+        "params": params,
+        "sklearn": sklearn.__version__,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def _prune(cache_dir, keep):
+    """Drop all but the ``keep`` most recently used entries"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith("fallback-") and name.endswith(".joblib"):
+            path = os.path.join(cache_dir, name)
+            entries.append((os.path.getmtime(path), path))
+    for _, path in sorted(entries, reverse=True)[keep:]:
+        for stale in (path, path + ".lock"):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _train_from(dataset_path, params):
+    started = time.perf_counter()
+    texts, labels = read_training_data(dataset_path, params["max_rows"])
+    if not texts:
+        texts, labels = MINIMAL_TEXTS, MINIMAL_LABELS
+    pipeline = train(texts, labels, params)
+    print(f"✓ Trained fallback pipeline on {len(texts)} rows in {time.perf_counter() - started:.1f}s")
+    return pipeline
+
+
+def load_or_train(dataset_path, cache_dir, params=None):
+    """
+    The fallback pipeline for ``dataset_path`` (None: minimal built-in data),
+    loaded from ``cache_dir`` when an entry for the same content and
+    parameters exists, trained and stored otherwise.
+    """
+    import joblib
+
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    if dataset_path is None:
+        return train(MINIMAL_TEXTS, MINIMAL_LABELS, params)
+
+    entry = os.path.join(cache_dir, f"fallback-{cache_key(dataset_path, params)}.joblib")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        lock = open(entry + ".lock", "a")
+    except OSError as e:
+        print(f"⚠️ Fallback cache unavailable ({e}), training without it")
+        return _train_from(dataset_path, params)
+
+    with lock:
+        # Whoever gets the lock first trains; the others then find the entry
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(entry):
+            try:
+                pipeline = joblib.load(entry)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable fallback cache {entry}: {e}")
+            else:
+                try:
+                    os.utime(entry)  # mark as recently used for _prune
+                except OSError:
+                    pass
+                print(f"✓ Loaded cached fallback pipeline: {entry}")
+                return pipeline
+
+        pipeline = _train_from(dataset_path, params)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        try:
+            joblib.dump(pipeline, tmp)
+            os.replace(tmp, entry)
+            print(f"✓ Cached fallback pipeline as {entry}")
+        except OSError as e:
+            print(f"⚠️ Could not write fallback cache {entry}: {e}")
+    _prune(cache_dir, KEEP_ENTRIES)
+    return pipeline
@@ -0,0 +1,195 @@
+"""
+In-memory index of the report figures served by /figures.
+
+The figure directories are scanned once at startup and then at most every
+``refresh_seconds``; unchanged files (same mtime and size) keep their
+entry. Each entry holds the file's bytes (up to ``max_bytes`` in total;
+files past the budget are read from disk per request), a strong ETag (content hash)
+and the modification time, so the route can answer conditional and range
+requests without touching the filesystem.
+
+Smaller variants (``VARIANTS``: resized to a maximum width and recompressed)
+are rendered with Pillow (requirements.txt), cached per entry and
+precomputed by ``warm()``. Where Pillow is not installed (development
+environments) every variant is the original.
+"""
+import functools
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".svg", ".gif")
+RESIZABLE = (".png", ".jpg", ".jpeg")
+VARIANTS = {"thumb": 320, "medium": 960}  # name -> maximum width in pixels
+
+
+def _etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+@functools.lru_cache(maxsize=None)
+def _pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def render_variant(data, width):
+    """(bytes, mimetype) of the image resized to ``width`` and recompressed, or None"""
+    Image = _pillow()
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        fmt = img.format
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "JPEG":
+            img.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+            return out.getvalue(), "image/jpeg"
+        # PNG: reduce to a 256-colour palette, which suits plots and word clouds
+        if img.mode not in ("P", "L"):
+            img = img.convert("RGBA").quantize(256, method=Image.Quantize.FASTOCTREE)
+        img.save(out, "PNG", optimize=True)
+        return out.getvalue(), "image/png"
+
+
+class Figure:
+    """One indexed figure file"""
+
+    def __init__(self, name, path, st):
+        self.name = name
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.stamp = (st.st_mtime_ns, st.st_size)
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.data = None  # None: read from disk per request (over the memory budget)
+        self.etag = None
+        self.variants = {}  # variant name -> (bytes, etag, mimetype)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def content(self):
+        return self.data if self.data is not None else self.read()
+
+    def info(self):
+        return {"name": self.name, "bytes": self.size, "etag": self.etag, "mimetype": self.mimetype,
+                "variants": {name: len(v[0]) for name, v in self.variants.items()}}
+
+
+class FigureStore:
+    """``directories`` are searched in order; the first one holding a name wins"""
+
+    def __init__(self, directories, refresh_seconds=60.0, max_bytes=64 << 20):
+        self.directories = directories
+        self.refresh_seconds = refresh_seconds
+        self.max_bytes = max_bytes
+        self._index = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        previous = self._index or {}
+        index = {}
+        budget = self.max_bytes
+        for directory in self.directories:
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError:
+                continue
+            for name in names:
+                if name in index or not name.lower().endswith(EXTENSIONS):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                old = previous.get(name)
+                if old is not None and old.path == path and old.stamp == (st.st_mtime_ns, st.st_size):
+                    figure = old
+                else:
+                    figure = Figure(name, path, st)
+                    try:
+                        data = figure.read()
+                    except OSError:
+                        continue
+                    figure.etag = _etag(data)
+                    figure.data = data
+                if figure.data is not None and figure.size > budget:
+                    figure.data = None
+                if figure.data is not None:
+                    budget -= figure.size
+                index[name] = figure
+        return index
+
+    def _due(self):
+        if self._index is None:
+            return True
+        return self.refresh_seconds > 0 and time.monotonic() - self._scanned_at >= self.refresh_seconds
+
+    def index(self):
+        """name -> Figure, rescanned when older than ``refresh_seconds`` (0: never)"""
+        if self._due():
+            with self._lock:
+                if self._due():
+                    self._index = self._scan()
+                    self._scanned_at = time.monotonic()
+        return self._index
+
+    def names(self):
+        return sorted(self.index())
+
+    def get(self, name):
+        return self.index().get(name)
+
+    def representation(self, figure, variant=None):
+        """(bytes, etag, mimetype) of ``figure`` or one of its VARIANTS"""
+        if variant is None or not figure.name.lower().endswith(RESIZABLE):
+            return figure.content(), figure.etag, figure.mimetype
+        cached = figure.variants.get(variant)
+        if cached is None:
+            data = figure.content()
+            try:
+                rendered = render_variant(data, VARIANTS[variant])
+            except Exception as e:
+                print(f"⚠️ Could not render {variant} variant of {figure.name}: {e}")
+                rendered = None
+            if rendered is None or len(rendered[0]) >= len(data):
+                cached = (data, figure.etag, figure.mimetype)  # no smaller version
+            else:
+                cached = (rendered[0], _etag(rendered[0]), rendered[1])
+            if _pillow() is not None:
+                figure.variants[variant] = cached
+        return cached
+
+    def warm(self):
+        """Index the directories and precompute every variant; returns a summary"""
+        index = self.index()
+        if _pillow() is not None:
+            for figure in index.values():
+                for variant in VARIANTS:
+                    self.representation(figure, variant)
+        return self.stats()
+
+    def stats(self):
+        index = self._index or {}
+        return {
+            "figures": len(index),
+            "bytes": sum(f.size for f in index.values()),
+            "cached_bytes": sum(len(f.data) for f in index.values() if f.data is not None),
+            "variant_bytes": sum(len(v[0]) for f in index.values() for v in f.variants.values()
+                                 if v[1] != f.etag),
+            "variants_available": _pillow() is not None,
+        }
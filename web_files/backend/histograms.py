@@ -0,0 +1,101 @@
+"""
+Histograms for runtime telemetry (fixed buckets) and load testing (log-linear).
+"""
+import bisect
+import threading
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style upper bounds)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        """{"count", "sum", "buckets": [[upper_bound, cumulative_count], ...]}"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, c in zip(list(self.buckets) + ["+Inf"], counts):
+            running += c
+            cumulative.append([bound, running])
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+
+class HdrHistogram:
+    """
+    Log-linear histogram in the style of HdrHistogram: values are kept with
+    ``significant_bits`` bits of precision (7 bits ~ 1% relative error) over
+    any range, so tail percentiles stay accurate without preset buckets.
+    Not thread-safe; keep one per thread and ``merge``.
+    """
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _key(self, value):
+        shift = max(0, value.bit_length() - self.significant_bits)
+        return (value >> shift) << shift
+
+    def record(self, value):
+        """Record a non-negative integer value (e.g. microseconds)"""
+        value = max(0, int(value))
+        key = self._key(value)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for key, c in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + c
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = max(1, int(round(p / 100.0 * self.count + 0.5 - 1e-9)))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= target:
+                # Upper end of the bucket, capped at the true maximum
+                width = 1 << max(0, key.bit_length() - self.significant_bits)
+                return min(key + width - 1, self.max)
+        return self.max
+
+    def snapshot(self, percentiles=(50, 90, 99, 99.9)):
+        """{"count", "mean", "min", "max", "p50", ...} (in recorded units)"""
+        snap = {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+        }
+        for p in percentiles:
+            snap[f"p{p:g}"] = self.percentile(p)
+        return snap
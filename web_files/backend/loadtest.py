@@ -0,0 +1,357 @@
+"""
+End-to-end load generator with a concurrency sweep.
+
+Starts the backend locally (``python app.py`` or ``serve.py``) on a free port,
+waits for /readyz, then drives a weighted mix of endpoints with N closed-loop
+clients for each concurrency level. For every level and endpoint it records
+an HDR-style latency histogram, error counts by class and achieved
+throughput, and writes a JSON report with stable key order so two releases
+can be diffed (or compared with ``--compare``).
+
+Only the standard library and the backend itself are needed.
+
+Usage:
+    python loadtest.py --levels 1,4,16,64 --duration 10
+    python loadtest.py --mix predict:70,stats:10,eda:10,dataset-stats:10
+    python loadtest.py --url http://localhost:8001 --compare old_report.json
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+from histograms import HdrHistogram
+
+ENDPOINTS = {
+    "predict": ("POST", "/predict"),
+    "predict-batch": ("POST", "/predict/batch"),
+    "stats": ("GET", "/stats"),
+    "eda": ("GET", "/eda"),
+    "dataset-stats": ("GET", "/dataset-stats"),
+    "health": ("GET", "/health"),
+}
+DEFAULT_MIX = "predict:80,stats:10,eda:5,dataset-stats:5"
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition(":")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_texts(limit=5000):
+    path = os.path.join(os.path.dirname(os.path.dirname(BACKEND_DIR)), "ml_model", "stress.csv")
+    texts = []
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row.get("text"):
+                    texts.append(row["text"])
+                if len(texts) >= limit:
+                    break
+    except OSError:
+        pass
+    return texts or ["I am so stressed about my exams", "Feeling calm and relaxed today"]
+
+
+class _Body:
+    """Request bodies; a per-request nonce keeps /predict out of the cache"""
+
+    def __init__(self, texts, cache_busting):
+        self.texts = texts
+        self.cache_busting = cache_busting
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _text(self, rng):
+        text = rng.choice(self.texts)
+        if self.cache_busting:
+            with self._lock:
+                self._counter += 1
+                text = f"{text} lt{self._counter}"
+        return text
+
+    def build(self, name, rng):
+        if name == "predict":
+            return json.dumps({"text": self._text(rng)})
+        if name == "predict-batch":
+            return json.dumps({"texts": [self._text(rng) for _ in range(32)]})
+        return None
+
+
+class _Client(threading.Thread):
+    """One closed-loop client on a keep-alive connection"""
+
+    def __init__(self, host, port, mix, bodies, stop_at, record_from, seed):
+        super().__init__(daemon=True)
+        self.host, self.port = host, port
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.bodies = bodies
+        self.stop_at, self.record_from = stop_at, record_from
+        self.rng = random.Random(seed)
+        self.histograms = {n: HdrHistogram() for n in self.names}
+        self.errors = {n: {} for n in self.names}
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return self._conn
+
+    def _request(self, method, path, body):
+        conn = self._connection()
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.getheader("Connection", "").lower() == "close":
+                conn.close()
+                self._conn = None
+            return response.status, None
+        except Exception as e:
+            conn.close()
+            self._conn = None
+            return None, type(e).__name__
+
+    def run(self):
+        while True:
+            now = time.perf_counter()
+            if now >= self.stop_at:
+                break
+            name = self.rng.choices(self.names, self.weights)[0]
+            method, path = ENDPOINTS[name]
+            body = self.bodies.build(name, self.rng)
+            started = time.perf_counter()
+            status, exc = self._request(method, path, body)
+            elapsed_us = (time.perf_counter() - started) * 1e6
+            if started < self.record_from:
+                continue
+            self.histograms[name].record(elapsed_us)
+            error = exc or (f"http_{status}" if status >= 400 else None)
+            if error:
+                self.errors[name][error] = self.errors[name].get(error, 0) + 1
+        if self._conn is not None:
+            self._conn.close()
+
+
+def run_level(host, port, mix, bodies, concurrency, duration, warmup):
+    start = time.perf_counter()
+    record_from = start + warmup
+    stop_at = record_from + duration
+    clients = [_Client(host, port, mix, bodies, stop_at, record_from, seed=i) for i in range(concurrency)]
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+
+    endpoints = {}
+    total_requests = total_errors = 0
+    overall = HdrHistogram()
+    for name in mix:
+        hist = HdrHistogram()
+        errors = {}
+        for c in clients:
+            hist.merge(c.histograms[name])
+            for key, n in c.errors[name].items():
+                errors[key] = errors.get(key, 0) + n
+        overall.merge(hist)
+        n_errors = sum(errors.values())
+        total_requests += hist.count
+        total_errors += n_errors
+        endpoints[name] = {
+            "requests": hist.count,
+            "throughput_rps": round(hist.count / duration, 2),
+            "error_rate": round(n_errors / hist.count, 4) if hist.count else 0.0,
+            "errors": dict(sorted(errors.items())),
+            "latency_ms": _ms(hist.snapshot()),
+        }
+    return {
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "requests": total_requests,
+        "throughput_rps": round(total_requests / duration, 2),
+        "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+        "latency_ms": _ms(overall.snapshot()),
+        "endpoints": endpoints,
+    }
+
+
+def _ms(snapshot):
+    return {k: (round(v / 1000.0, 3) if isinstance(v, (int, float)) and k != "count" else v)
+            for k, v in snapshot.items()}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(server, workers, log_path, ready_timeout=300):
+    """Start the backend on a free port; returns (process, port)"""
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), HOST="127.0.0.1")
+    if server == "serve":
+        cmd = [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers)]
+    else:
+        cmd = [sys.executable, os.path.join(BACKEND_DIR, "app.py")]
+    log = open(log_path, "w")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited early (see {log_path})")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/readyz")
+            status = conn.getresponse().status
+            conn.close()
+            if status == 200:
+                return proc, port
+        except OSError:
+            pass
+        time.sleep(0.25)
+    proc.terminate()
+    raise SystemExit(f"Server not ready after {ready_timeout}s (see {log_path})")
+
+
+def knee(levels, latency_factor=2.0, min_gain=1.1):
+    """First concurrency where throughput stops scaling and p99 degrades"""
+    if not levels:
+        return None
+    base_p99 = levels[0]["latency_ms"]["p99"] or 0
+    for prev, cur in zip(levels, levels[1:]):
+        if (cur["throughput_rps"] < prev["throughput_rps"] * min_gain
+                and (cur["latency_ms"]["p99"] or 0) > base_p99 * latency_factor):
+            return cur["concurrency"]
+    return None
+
+
+def print_levels(levels):
+    print(f"{'conc':>5} {'rps':>9} {'err%':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for level in levels:
+        lat = level["latency_ms"]
+        print(f"{level['concurrency']:>5} {level['throughput_rps']:>9.1f} {level['error_rate'] * 100:>6.2f} "
+              f"{lat['p50'] or 0:>9.2f} {lat['p90'] or 0:>9.2f} {lat['p99'] or 0:>9.2f} {lat['max'] or 0:>9.2f}")
+        for name, ep in level["endpoints"].items():
+            el = ep["latency_ms"]
+            print(f"{'':>5}   {name:<14} {ep['throughput_rps']:>8.1f} rps  err {ep['error_rate'] * 100:.2f}%  "
+                  f"p50 {el['p50'] or 0:.2f}  p99 {el['p99'] or 0:.2f} ms")
+
+
+def compare_reports(old, new):
+    """Print throughput / p50 / p99 changes per level and endpoint"""
+    old_levels = {l["concurrency"]: l for l in old.get("levels", [])}
+    print(f"{'conc':>5} {'endpoint':<14} {'rps':>17} {'p50 ms':>19} {'p99 ms':>19}")
+    for level in new.get("levels", []):
+        before = old_levels.get(level["concurrency"])
+        if before is None:
+            continue
+        rows = [("(all)", before, level)] + [
+            (name, before["endpoints"].get(name), ep) for name, ep in level["endpoints"].items()
+        ]
+        for name, b, a in rows:
+            if not b:
+                continue
+            cells = []
+            for get in (lambda x: x["throughput_rps"], lambda x: x["latency_ms"]["p50"], lambda x: x["latency_ms"]["p99"]):
+                vb, va = get(b) or 0, get(a) or 0
+                change = f"{(va / vb - 1) * 100:+.0f}%" if vb else "n/a"
+                cells.append(f"{vb:>7.1f}->{va:<7.1f}{change:>5}")
+            print(f"{level['concurrency']:>5} {name:<14} " + " ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrency sweep against the stress detection API")
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds recorded per level")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unrecorded seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint:weight pairs, e.g. predict:80,eda:20")
+    parser.add_argument("--url", default=None, help="Target a running server instead of starting one")
+    parser.add_argument("--server", choices=["app", "serve"], default="app")
+    parser.add_argument("--workers", type=int, default=2, help="Workers for --server serve")
+    parser.add_argument("--allow-cache-hits", action="store_true",
+                        help="Send raw dataset texts (repeats hit the prediction cache)")
+    parser.add_argument("--output", default="loadtest_report.json")
+    parser.add_argument("--compare", default=None, help="Previous report to compare against")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    levels = [int(l) for l in args.levels.split(",")]
+    bodies = _Body(load_texts(), cache_busting=not args.allow_cache_hits)
+
+    proc = None
+    if args.url:
+        target = urlparse(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        log_path = os.path.splitext(args.output)[0] + ".server.log"
+        print(f"Starting {args.server} server (log: {log_path})...")
+        proc, port = start_server(args.server, args.workers, log_path)
+        host = "127.0.0.1"
+        print(f"✓ Server ready on port {port}")
+
+    results = []
+    try:
+        for concurrency in levels:
+            print(f"→ concurrency {concurrency} for {args.duration:g}s", flush=True)
+            results.append(run_level(host, port, mix, bodies, concurrency, args.duration, args.warmup))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "server": args.url or args.server,
+            "workers": args.workers if args.server == "serve" and not args.url else None,
+            "mix": mix,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "cache_busting": not args.allow_cache_hits,
+        },
+        "levels": results,
+        "knee_concurrency": knee(results),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print("=" * 70)
+    print_levels(results)
+    if report["knee_concurrency"]:
+        print(f"⚠️ Latency breaks down at concurrency {report['knee_concurrency']}")
+    print(f"✓ Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Micro-batching dispatcher for /predict.
+
+Concurrent requests each submit one text; a single worker thread collects
+them until either ``max_batch_size`` texts are queued or the oldest one has
+waited ``max_wait_ms``, scores the whole batch with one model call and hands
+every caller its own result. A caller that stops waiting cancels its item,
+and a cancelled item is dropped from the batch instead of scored.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from histograms import Histogram
+
+
+class QueueFullError(Exception):
+    """Raised when the dispatcher queue is at its configured depth"""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a queued text is not scored within the caller's timeout"""
+
+
+class _Item:
+    __slots__ = ("text", "model", "label_encoder", "model_type", "future", "enqueued")
+
+    def __init__(self, text, model, label_encoder, model_type):
+        self.text = text
+        self.model = model
+        self.label_encoder = label_encoder
+        self.model_type = model_type
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Coalesce single-text scoring calls into batches.
+    ``score_many(texts, model, label_encoder, model_type)`` must return one
+    result per text, in order.
+    """
+
+    def __init__(self, score_many, max_batch_size=32, max_wait_ms=5.0, max_queue=1000):
+        self.score_many = score_many
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024])
+        self.queue_wait_ms = Histogram([0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000])
+        self.batches = 0
+        self.rejected = 0
+        self.abandoned = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text, model, label_encoder, model_type):
+        """Queue a text and return a Future for its result"""
+        item = _Item(text, model, label_encoder, model_type)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError(f"Prediction queue full ({self.max_queue} pending)")
+        return item.future
+
+    def score(self, text, model, label_encoder, model_type, timeout=30.0):
+        """Blocking helper: submit and wait for the result"""
+        future = self.submit(text, model, label_encoder, model_type)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Still queued: cancelled, so the worker skips it. Already being
+            # scored: the result is discarded.
+            future.cancel()
+            raise QueueTimeoutError(f"Prediction not scored within {timeout:g}s") from None
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        for item in batch:
+            self.queue_wait_ms.observe((started - item.enqueued) * 1000.0)
+        # Drop items whose caller gave up; the rest can no longer be cancelled
+        live = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        self.abandoned += len(batch) - len(live)
+        batch = live
+        if not batch:
+            return
+        self.batch_sizes.observe(len(batch))
+        self.batches += 1
+
+        # Items queued across a model swap are scored with the model they saw
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item.model), []).append(item)
+        for items in groups.values():
+            head = items[0]
+            try:
+                results = self.score_many(
+                    [item.text for item in items], head.model, head.label_encoder, head.model_type
+                )
+            except Exception as e:
+                for item in items:
+                    item.future.set_exception(e)
+                continue
+            for item, result in zip(items, results):
+                item.future.set_result(result)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._flush(batch)
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
@@ -0,0 +1,427 @@
+"""
+Memory-mappable model bundle format.
+
+A bundle is a directory that replaces a joblib pickle:
+
+    manifest.json          object graph (classes, params, small attributes)
+                           plus a sha256 checksum and size for every file
+    arrays/NNNN.npy        raw numpy arrays (coefficients, IDF vectors,
+                           intercepts, bagging feature maps); loaded with
+                           mmap_mode="r" so pages are shared between processes
+    vocab/NNNN.bin         vocabulary terms, UTF-8, concatenated in index order
+    vocab/NNNN.offsets.npy term boundaries into the .bin file
+    vocab/NNNN.npy         a compact vocabulary's shared term table
+
+A compact vocabulary (compact_vocab.py) stores its shared term table once
+per bundle, as a sorted fixed-width UTF-8 bytes array, and each vectorizer's
+term id -> column map as an array; both are memory-mapped on load, so no
+process builds a term dict. Bundles that stored the table in the .bin /
+.offsets.npy layout still load (into an in-memory table).
+
+Estimators are rebuilt the same way unpickling does it (``cls.__new__`` +
+``__setstate__``), so the loaded objects behave exactly like the pickled ones.
+Only classes (never functions) from scikit-learn / numpy / scipy, plus
+explicitly passed overrides (FusionEnsemble), can be instantiated from a
+manifest, and ``(cls, args)`` constructor calls are limited to scikit-learn
+classes (the Cython helpers that need them).
+
+Usage:
+    python model_bundle.py export            # every pickle in ml_model/models
+    python model_bundle.py verify <bundle>   # checksums only
+"""
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from compact_vocab import CompactVocabulary, TermTable
+
+FORMAT_NAME = "stress-model-bundle"
+FORMAT_VERSION = 1
+
+# Arrays smaller than this are stored inline in the manifest
+INLINE_ARRAY_LIMIT = 256
+ALLOWED_PACKAGES = ("sklearn", "numpy", "scipy")
+REDUCE_PACKAGES = ("sklearn",)
+
+
+class BundleError(Exception):
+    """Raised for unsupported objects on export or invalid bundles on load"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _in_packages(module_name, packages):
+    """True for ``packages`` themselves and their submodules"""
+    return module_name.split(".", 1)[0] in packages
+
+
+def _class_path(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+# ===============================
+# Export
+# ===============================
+class _Writer:
+    def __init__(self, root):
+        self.root = root
+        self.files = {}
+        self._counter = 0
+        self._tables = {}  # id(TermTable) -> manifest entry
+        os.makedirs(os.path.join(root, "arrays"), exist_ok=True)
+        os.makedirs(os.path.join(root, "vocab"), exist_ok=True)
+
+    def _next(self):
+        self._counter += 1
+        return f"{self._counter:04d}"
+
+    def _register(self, rel):
+        path = os.path.join(self.root, rel)
+        self.files[rel] = {"sha256": _sha256(path), "bytes": os.path.getsize(path)}
+
+    def array(self, arr):
+        if arr.dtype == object:
+            return {"__objarray__": [self.encode(v) for v in arr.tolist()], "shape": list(arr.shape)}
+        if arr.size < INLINE_ARRAY_LIMIT:
+            return {"__ndarray__": arr.tolist(), "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        rel = f"arrays/{self._next()}.npy"
+        np.save(os.path.join(self.root, rel), np.ascontiguousarray(arr), allow_pickle=False)
+        self._register(rel)
+        return {"__npy__": rel}
+
+    def terms(self, terms):
+        """Write terms as a .bin blob + offsets; returns their manifest entry"""
+        encoded = [t.encode("utf-8") for t in terms]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        name = self._next()
+        rel_bin, rel_off = f"vocab/{name}.bin", f"vocab/{name}.offsets.npy"
+        with open(os.path.join(self.root, rel_bin), "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(os.path.join(self.root, rel_off), offsets, allow_pickle=False)
+        self._register(rel_bin)
+        self._register(rel_off)
+        return {"__vocab__": rel_bin, "offsets": rel_off, "size": len(terms)}
+
+    def vocabulary(self, vocab):
+        terms = [None] * len(vocab)
+        for term, idx in vocab.items():
+            terms[idx] = term
+        return self.terms(terms)
+
+    def term_table(self, table):
+        """Write a TermTable's sorted bytes array as .npy (always a file, to be memory-mapped)"""
+        rel = f"vocab/{self._next()}.npy"
+        np.save(os.path.join(self.root, rel), np.ascontiguousarray(table.array), allow_pickle=False)
+        self._register(rel)
+        return {"__terms__": rel, "size": len(table)}
+
+    def compact_vocabulary(self, vocab):
+        table = vocab.table
+        if id(table) not in self._tables:
+            self._tables[id(table)] = self.term_table(table)
+        return {"__compact_vocab__": self._tables[id(table)], "columns": self.array(np.asarray(vocab.columns))}
+
+    def encode(self, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, np.generic):
+            return {"__npscalar__": value.dtype.str, "value": value.item()}
+        if isinstance(value, np.ndarray):
+            return self.array(value)
+        if isinstance(value, tuple):
+            return {"__tuple__": [self.encode(v) for v in value]}
+        if isinstance(value, list):
+            return [self.encode(v) for v in value]
+        if isinstance(value, CompactVocabulary):
+            return self.compact_vocabulary(value)
+        if isinstance(value, (set, frozenset)):
+            return {"__frozenset__" if isinstance(value, frozenset) else "__set__":
+                    sorted(self.encode(v) for v in value)}
+        if isinstance(value, dict):
+            if (len(value) >= INLINE_ARRAY_LIMIT
+                    and all(isinstance(k, str) for k in value)
+                    and all(isinstance(v, (int, np.integer)) for v in value.values())
+                    and set(int(v) for v in value.values()) == set(range(len(value)))):
+                return self.vocabulary(value)
+            if all(isinstance(k, str) for k in value):
+                return {"__dict__": {k: self.encode(v) for k, v in value.items()}}
+            return {"__items__": [[self.encode(k), self.encode(v)] for k, v in value.items()]}
+        if isinstance(value, type):
+            return {"__type__": _class_path(value)}
+        if isinstance(value, np.dtype):
+            return {"__dtype__": value.str}
+        if hasattr(value, "__getstate__") and hasattr(value, "__dict__") and "<locals>" not in type(value).__qualname__:
+            state = value.__getstate__()
+            if not isinstance(state, dict):
+                raise BundleError(f"Unsupported state for {type(value).__name__}")
+            return {"__object__": _class_path(type(value)),
+                    "state": {k: self.encode(v) for k, v in state.items()}}
+        reduced = value.__reduce__() if hasattr(value, "__reduce__") else None
+        if (isinstance(reduced, tuple) and len(reduced) == 2 and isinstance(reduced[0], type)
+                and _in_packages(reduced[0].__module__, REDUCE_PACKAGES)):
+            # Cython helpers such as SGD loss functions: (cls, args)
+            return {"__reduce__": _class_path(reduced[0]), "args": [self.encode(a) for a in reduced[1]]}
+        raise BundleError(f"Cannot store object of type {type(value).__name__}")
+
+
+def export_bundle(objects, bundle_dir, info=None):
+    """
+    Write ``objects`` (name -> model / label encoder / ...) as a bundle.
+    The bundle is built in a temporary directory and swapped into place.
+    """
+    parent = os.path.dirname(os.path.abspath(bundle_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".bundle-", dir=parent)
+    try:
+        writer = _Writer(tmp)
+        encoded = {name: writer.encode(obj) for name, obj in objects.items()}
+        try:
+            import sklearn
+            sklearn_version = sklearn.__version__
+        except ImportError:
+            sklearn_version = None
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "created": datetime.utcnow().isoformat() + "Z",
+            "sklearn_version": sklearn_version,
+            "info": info or {},
+            "objects": encoded,
+            "files": writer.files,
+        }
+        with open(os.path.join(tmp, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        if os.path.exists(bundle_dir):
+            old = bundle_dir + ".old"
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(bundle_dir, old)
+            os.rename(tmp, bundle_dir)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.rename(tmp, bundle_dir)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return bundle_dir
+
+
+# ===============================
+# Load
+# ===============================
+class _Reader:
+    def __init__(self, root, classes, mmap):
+        self.root = root
+        self.classes = classes or {}
+        self.mmap_mode = "r" if mmap else None
+        self._tables = {}  # table path -> TermTable shared by compact vocabularies
+
+    def resolve(self, path, packages=ALLOWED_PACKAGES):
+        module_name, qualname = path.split(":", 1)
+        if qualname in self.classes:
+            return self.classes[qualname]
+        if not _in_packages(module_name, packages):
+            raise BundleError(f"Refusing to load class {path}")
+        obj = importlib.import_module(module_name)
+        for part in qualname.split("."):
+            obj = getattr(obj, part)
+        if not isinstance(obj, type):
+            raise BundleError(f"Refusing to load {path}: not a class")
+        return obj
+
+    def terms(self, spec):
+        offsets = np.load(os.path.join(self.root, spec["offsets"]), mmap_mode=self.mmap_mode)
+        with open(os.path.join(self.root, spec["__vocab__"]), "rb") as f:
+            blob = f.read().decode("utf-8")
+        bounds = offsets.tolist()
+        # ASCII fast path: byte offsets equal character offsets
+        if len(blob) == bounds[-1]:
+            return [blob[bounds[i]:bounds[i + 1]] for i in range(spec["size"])]
+        raw = blob.encode("utf-8")
+        return [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(spec["size"])]
+
+    def vocabulary(self, spec):
+        return {term: i for i, term in enumerate(self.terms(spec))}
+
+    def compact_vocabulary(self, spec):
+        table_spec = spec["__compact_vocab__"]
+        if "__terms__" in table_spec:
+            key = table_spec["__terms__"]
+            if key not in self._tables:
+                terms = np.load(os.path.join(self.root, key), mmap_mode=self.mmap_mode, allow_pickle=False)
+                self._tables[key] = TermTable(terms)
+        else:
+            # Bundles written before term tables were stored as arrays
+            key = table_spec["__vocab__"]
+            if key not in self._tables:
+                self._tables[key] = TermTable(self.terms(table_spec))
+        return CompactVocabulary(self._tables[key], self.decode(spec["columns"]))
+
+    def decode(self, value):
+        if not isinstance(value, (dict, list)):
+            return value
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if "__npy__" in value:
+            return np.load(os.path.join(self.root, value["__npy__"]), mmap_mode=self.mmap_mode, allow_pickle=False)
+        if "__ndarray__" in value:
+            return np.array(value["__ndarray__"], dtype=np.dtype(value["dtype"])).reshape(value["shape"])
+        if "__objarray__" in value:
+            arr = np.empty(len(value["__objarray__"]), dtype=object)
+            arr[:] = [self.decode(v) for v in value["__objarray__"]]
+            return arr.reshape(value["shape"])
+        if "__npscalar__" in value:
+            return np.dtype(value["__npscalar__"]).type(value["value"])
+        if "__tuple__" in value:
+            return tuple(self.decode(v) for v in value["__tuple__"])
+        if "__frozenset__" in value:
+            return frozenset(self.decode(v) for v in value["__frozenset__"])
+        if "__set__" in value:
+            return set(self.decode(v) for v in value["__set__"])
+        if "__vocab__" in value:
+            return self.vocabulary(value)
+        if "__compact_vocab__" in value:
+            return self.compact_vocabulary(value)
+        if "__dict__" in value:
+            return {k: self.decode(v) for k, v in value["__dict__"].items()}
+        if "__items__" in value:
+            return {self.decode(k): self.decode(v) for k, v in value["__items__"]}
+        if "__type__" in value:
+            return self.resolve(value["__type__"])
+        if "__dtype__" in value:
+            return np.dtype(value["__dtype__"])
+        if "__object__" in value:
+            cls = self.resolve(value["__object__"])
+            obj = cls.__new__(cls)
+            state = {k: self.decode(v) for k, v in value["state"].items()}
+            if hasattr(obj, "__setstate__"):
+                obj.__setstate__(state)
+            else:
+                obj.__dict__.update(state)
+            return obj
+        if "__reduce__" in value:
+            cls = self.resolve(value["__reduce__"], REDUCE_PACKAGES)
+            return cls(*[self.decode(a) for a in value["args"]])
+        raise BundleError(f"Unknown manifest entry: {sorted(value)[:3]}")
+
+
+def read_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format in {bundle_dir}")
+    return manifest
+
+
+def verify_bundle(bundle_dir, manifest=None):
+    """Check size and sha256 of every file listed in the manifest"""
+    manifest = manifest or read_manifest(bundle_dir)
+    for rel, meta in manifest["files"].items():
+        path = os.path.join(bundle_dir, rel)
+        if not os.path.exists(path) or os.path.getsize(path) != meta["bytes"]:
+            raise BundleError(f"Missing or truncated bundle file: {rel}")
+        if _sha256(path) != meta["sha256"]:
+            raise BundleError(f"Checksum mismatch: {rel}")
+    return manifest
+
+
+def load_bundle(bundle_dir, classes=None, mmap=True, verify=True):
+    """
+    Load every object of a bundle; returns (objects dict, manifest).
+    ``classes`` maps class names (e.g. "FusionEnsemble") to local classes.
+    """
+    manifest = read_manifest(bundle_dir)
+    if verify:
+        verify_bundle(bundle_dir, manifest)
+    reader = _Reader(bundle_dir, classes, mmap)
+    objects = {name: reader.decode(enc) for name, enc in manifest["objects"].items()}
+    return objects, manifest
+
+
+def bundle_size(bundle_dir):
+    """Total bytes of the files referenced by a bundle's manifest"""
+    return sum(meta["bytes"] for meta in read_manifest(bundle_dir)["files"].values())
+
+
+# ===============================
+# CLI
+# ===============================
+def _export_models(models_dir, out_dir):
+    """Export every known pickle in models_dir into out_dir/<name>/"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import joblib
+    import app as backend
+    from compact_vocab import compact_vocabularies
+
+    main_module = sys.modules.get("__main__")
+    if main_module is not None and not hasattr(main_module, "FusionEnsemble"):
+        main_module.FusionEnsemble = backend.FusionEnsemble
+
+    label_encoder_path = os.path.join(models_dir, "label_encoder.pkl")
+    for name in ["fusion_ensemble", "best_model", "publication_model", "model_pipeline"]:
+        path = os.path.join(models_dir, f"{name}.pkl")
+        if not os.path.exists(path):
+            continue
+        try:
+            objects = {"model": joblib.load(path)}
+            compact_vocabularies(objects["model"])
+            if name == "fusion_ensemble" and os.path.exists(label_encoder_path):
+                objects["label_encoder"] = joblib.load(label_encoder_path)
+            target = os.path.join(out_dir, name)
+            export_bundle(objects, target, info={"source": os.path.basename(path)})
+            loaded, _ = load_bundle(target, classes={"FusionEnsemble": backend.FusionEnsemble})
+            model_type = "fusion_ensemble" if name == "fusion_ensemble" else "other_model"
+            texts = [t for t in backend.SAMPLE_TEXTS if t.strip()]
+            try:
+                expected = backend.predict_batch(texts, objects["model"], objects.get("label_encoder"), model_type)
+            except backend.PredictionError as e:
+                print(f"⚠️ {name}: pickle cannot score ({e}); round-trip check skipped")
+            else:
+                actual = backend.predict_batch(texts, loaded["model"], loaded.get("label_encoder"), model_type)
+                if expected != actual:
+                    raise BundleError("round-trip predictions differ from the pickle")
+            print(f"✓ Exported {path} -> {target} ({bundle_size(target) / 1024:.0f} KB)")
+        except Exception as e:
+            print(f"⚠️ Could not export {path}: {e}")
+
+
+def main(argv=None):
+    import argparse
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Export / verify memory-mappable model bundles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="Export model pickles as bundles")
+    export_cmd.add_argument("--models-dir", default=None)
+    export_cmd.add_argument("--out-dir", default=None)
+    verify_cmd = sub.add_parser("verify", help="Verify bundle checksums")
+    verify_cmd.add_argument("bundle")
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        verify_bundle(args.bundle)
+        print(f"✓ {args.bundle}: all checksums match")
+        return
+
+    sys.path.insert(0, backend_dir)
+    import app as backend
+    models_dir = args.models_dir or os.path.join(backend.ML_DIR, "models")
+    out_dir = args.out_dir or os.path.join(models_dir, "bundles")
+    _export_models(models_dir, out_dir)
+
+
+if __name__ == "__main__":
+    main()
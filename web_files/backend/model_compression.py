@@ -0,0 +1,362 @@
+"""
+Coefficient pruning and float32 / int8 quantization for the served linear models.
+
+Every model we serve is a TF-IDF vectorizer (or a FeatureUnion of them) in
+front of a linear classifier, so each classifier can be read as a
+(n_features, n_outputs) weight matrix (see compiled_scorer.py).
+``compress_model`` then:
+
+1. merges the estimators of a BaggingClassifier into one linear model with
+   their average coefficients (``merge_bagging``; the vote of ten models
+   becomes the sign of their mean decision)
+2. zeroes every weight whose contribution ``|idf * w|`` is below ``prune``
+   times the largest one of the same output
+3. stores what remains as float32, or as int8 codes with one scale per output
+4. drops the vocabulary terms left without a non-zero weight, and the
+   vectorizer's ``stop_words_`` list (only kept for introspection)
+
+The result has the shape of the input ((classifier, vectorizer) tuple or
+FusionEnsemble) with a CompressedLinearClassifier on a pruned vectorizer, so
+the backend scores it like the original. Pruned terms no longer count
+towards the TF-IDF norm, so outputs are approximate: the CLI writes a report
+of the memory saved against the accuracy change on the held-out split of
+stress.csv, and the compressed models as bundles (model_bundle.py).
+
+Usage:
+    python model_compression.py                          # int8, prune 1%
+    python model_compression.py --dtype float32 --prune 0 --keep-bagging
+    MODEL_BUNDLE_DIR=ml_model/models/compressed python app.py
+"""
+import copy
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from compiled_scorer import _DecisionRules, _LinearHead, _term_tables
+from text_features import SharedTextTransformer, split_model
+
+DTYPES = ("float32", "int8")
+MODEL_NAMES = ("fusion_ensemble", "best_model", "publication_model")
+
+
+class CompressedLinearClassifier(_DecisionRules):
+    """
+    Stand-in for a fitted linear classifier (or bagged linear ensemble) on
+    the columns of a pruned vectorizer. Coefficients are float32, or int8
+    codes times a per-output float32 scale.
+    """
+
+    def __init__(self, head, W, dtype="int8"):
+        self.classes_ = head.classes_
+        self.kind, self.proba_kind, self.has_proba = head.kind, head.proba_kind, head.has_proba
+        self.intercept = np.asarray(head.b, dtype=np.float64)
+        if dtype == "int8":
+            scale = np.abs(W).max(axis=0) / 127.0
+            scale[scale == 0.0] = 1.0
+            self.codes = np.round(W / scale).astype(np.int8)
+            self.scale = scale.astype(np.float32)
+        elif dtype == "float32":
+            self.codes = W.astype(np.float32)
+            self.scale = None
+        else:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+
+    @property
+    def coef_(self):
+        W = self.codes.astype(np.float64)
+        if self.scale is not None:
+            W *= self.scale
+        return W.T
+
+    @property
+    def intercept_(self):
+        return self.intercept
+
+    def _decision(self, X):
+        dec = np.asarray(X @ self.codes, dtype=np.float64)
+        if self.scale is not None:
+            dec *= self.scale
+        dec += self.intercept
+        return dec
+
+    def decision_function(self, X):
+        dec = self._decision(X)
+        return dec[:, 0] if self.kind == "linear" and dec.shape[1] == 1 else dec
+
+    def predict(self, X):
+        return self.classes_[self.predict_idx(self._decision(X))]
+
+    @property
+    def predict_proba(self):
+        # Only present when the original classifier had predict_proba, so
+        # hasattr() checks (FusionEnsemble.member_proba) see the same model
+        if not self.has_proba:
+            raise AttributeError("predict_proba is not available for this classifier")
+        return lambda X: self.proba(self._decision(X))
+
+
+def _n_features(vec):
+    if hasattr(vec, "transformer_list"):
+        return sum(_n_features(t) for _, t in vec.transformer_list if t is not None and t != "drop")
+    return len(vec.vocabulary_)
+
+
+def _prune_vectorizer(vec, keep):
+    """Copy of a fitted vectorizer restricted to the columns where ``keep`` is True"""
+    if hasattr(vec, "transformer_list"):
+        pruned = copy.copy(vec)
+        parts, offset = [], 0
+        for name, trans in vec.transformer_list:
+            if trans is None or trans == "drop":
+                parts.append((name, trans))
+                continue
+            n = _n_features(trans)
+            parts.append((name, _prune_vectorizer(trans, keep[offset:offset + n])))
+            offset += n
+        pruned.transformer_list = parts
+        return pruned
+
+    pruned = copy.copy(vec)
+    terms = sorted(vec.vocabulary_, key=vec.vocabulary_.get)
+    pruned.vocabulary_ = {term: i for i, term in enumerate(t for t, k in zip(terms, keep) if k)}
+    if getattr(vec, "_tfidf", None) is not None:
+        pruned._tfidf = copy.copy(vec._tfidf)
+        pruned._tfidf.n_features_in_ = len(pruned.vocabulary_)
+        if getattr(vec, "use_idf", False):
+            pruned._tfidf.idf_ = np.asarray(vec.idf_, dtype=np.float32)[keep]
+    pruned.dtype = np.float32
+    if hasattr(pruned, "stop_words_"):
+        del pruned.stop_words_
+    return pruned
+
+
+def compress_pair(clf, vectorizer, prune=0.01, dtype="int8", merge_bagging=True):
+    """(CompressedLinearClassifier, pruned vectorizer) for a fitted pair"""
+    tables, n_features = _term_tables(SharedTextTransformer([vectorizer]).plans[0])
+    head = _LinearHead(clf, n_features)
+    W, b = head.W, head.b
+    if merge_bagging and head.kind in ("bagging_votes", "bagging_proba"):
+        W, b = W.mean(axis=1, keepdims=True), b.mean(keepdims=True)
+        head.proba_kind = "logistic" if head.kind == "bagging_proba" else None
+        head.has_proba = head.kind == "bagging_proba"
+        head.kind = "linear"
+    head.W, head.b = W, b
+
+    if prune > 0:
+        for table in tables:
+            table.fold(W)
+        folded = np.abs(np.vstack([table.table for table in tables]))
+        W = np.where(folded < prune * folded.max(axis=0), 0.0, W)
+
+    compressed = CompressedLinearClassifier(head, W, dtype)
+    keep = (compressed.codes != 0).any(axis=1)
+    compressed.codes = np.ascontiguousarray(compressed.codes[keep])
+    return compressed, _prune_vectorizer(vectorizer, keep)
+
+
+def compress_model(model, prune=0.01, dtype="int8", merge_bagging=True):
+    """Compressed copy of a FusionEnsemble or (classifier, vectorizer) tuple / dict"""
+    options = {"prune": prune, "dtype": dtype, "merge_bagging": merge_bagging}
+    if hasattr(model, "models") and hasattr(model, "weights"):
+        compressed = copy.copy(model)
+        compressed.__dict__.pop("_shared", None)
+        compressed.__dict__.pop("_cascade", None)
+        compressed.models = []
+        for member in model.models:
+            clf, vectorizer = compress_pair(member["model"], member["vectorizer"], **options)
+            compressed.models.append({**member, "model": clf, "vectorizer": vectorizer})
+        return compressed
+    clf, vectorizer = split_model(model)
+    if clf is None or vectorizer is None:
+        raise ValueError(f"Unsupported model type: {type(model).__name__}")
+    clf, vectorizer = compress_pair(clf, vectorizer, **options)
+    return {**model, "model": clf, "vectorizer": vectorizer} if isinstance(model, dict) else (clf, vectorizer)
+
+
+# ===============================
+# Report
+# ===============================
+def _pairs(model):
+    if hasattr(model, "models"):
+        return [(m["model"], m["vectorizer"]) for m in model.models]
+    return [split_model(model)]
+
+
+def model_size(model):
+    """Serialized bytes, vocabulary terms, stored coefficients and linear estimators"""
+    terms = coefficients = estimators = 0
+    for clf, vectorizer in _pairs(model):
+        terms += _n_features(vectorizer)
+        if isinstance(clf, CompressedLinearClassifier):
+            coefficients += clf.codes.size
+            estimators += clf.codes.shape[1] if clf.kind != "linear" else 1
+        else:
+            for est in getattr(clf, "estimators_", [clf]):
+                coefficients += np.asarray(est.coef_).size
+                estimators += 1
+    return {
+        "bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        "vocabulary_terms": terms,
+        "coefficients": coefficients,
+        "estimators": estimators,
+    }
+
+
+def held_out_split(dataset_path, test_size=0.2, random_state=42):
+    """The stratified 80/20 split used by the training notebooks: (texts, labels) of the test part"""
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(dataset_path)
+    df = df[df["text"].notna()]
+    _, texts, _, labels = train_test_split(
+        df["text"].astype(str).tolist(), df["label"].tolist(),
+        test_size=test_size, random_state=random_state, stratify=df["label"].tolist(),
+    )
+    return texts, labels
+
+
+def evaluate(backend, model, label_encoder, model_type, texts, labels):
+    """Accuracy / F1 of the served labels, plus the raw predictions"""
+    from sklearn.metrics import accuracy_score, f1_score
+
+    started = time.perf_counter()
+    results = backend.predict_batch(texts, model, label_encoder, model_type)
+    seconds = time.perf_counter() - started
+    expected = [backend.normalize_label(label) for label in labels]
+    predicted = [label for label, _ in results]
+    return {
+        "accuracy": round(accuracy_score(expected, predicted), 4),
+        "f1": round(f1_score(expected, predicted, pos_label="Stress"), 4),
+        "seconds": round(seconds, 3),
+    }, results
+
+
+def compare(original, compressed):
+    """How far the compressed model's served results are from the original's"""
+    agree = [a[0] == b[0] for a, b in zip(original, compressed)]
+    diffs = [abs(a[1] - b[1]) for a, b, same in zip(original, compressed, agree) if same]
+    return {
+        "label_agreement": round(sum(agree) / len(agree), 4) if agree else 1.0,
+        "max_confidence_diff": round(max(diffs), 4) if diffs else 0.0,
+    }
+
+
+# ===============================
+# CLI
+# ===============================
+def compress_all(backend, models_dir, out_dir, dataset_path, names, prune, dtype, merge_bagging):
+    """Compress, evaluate and export every available model; returns the report"""
+    import joblib
+    from model_bundle import export_bundle, load_bundle, bundle_size
+
+    # Notebook pickles reference __main__.FusionEnsemble
+    main_module = sys.modules.get("__main__")
+    if main_module is not None and not hasattr(main_module, "FusionEnsemble"):
+        main_module.FusionEnsemble = backend.FusionEnsemble
+
+    texts, labels = held_out_split(dataset_path)
+    if backend.TEXT_NORMALIZATION:
+        backend.TEXT_NORMALIZER = backend.build_text_normalizer()  # score the split the way it is served
+    report = {
+        "created": datetime.utcnow().isoformat() + "Z",
+        "dataset": os.path.basename(dataset_path),
+        "held_out_rows": len(texts),
+        "prune": prune,
+        "dtype": dtype,
+        "merge_bagging": merge_bagging,
+        "models": {},
+    }
+    classes = {"FusionEnsemble": backend.FusionEnsemble, "CompressedLinearClassifier": CompressedLinearClassifier}
+    label_encoder_path = os.path.join(models_dir, "label_encoder.pkl")
+    for name in names:
+        path = os.path.join(models_dir, f"{name}.pkl")
+        if not os.path.exists(path):
+            continue
+        try:
+            model = joblib.load(path)
+            label_encoder = None
+            if name == "fusion_ensemble" and os.path.exists(label_encoder_path):
+                label_encoder = joblib.load(label_encoder_path)
+            model_type = "fusion_ensemble" if name == "fusion_ensemble" else "other_model"
+            compressed = compress_model(model, prune=prune, dtype=dtype, merge_bagging=merge_bagging)
+
+            before, original_results = evaluate(backend, model, label_encoder, model_type, texts, labels)
+            after, compressed_results = evaluate(backend, compressed, label_encoder, model_type, texts, labels)
+
+            target = os.path.join(out_dir, name)
+            objects = {"model": compressed}
+            if label_encoder is not None:
+                objects["label_encoder"] = label_encoder
+            export_bundle(objects, target, info={"source": os.path.basename(path), "compression": {
+                "prune": prune, "dtype": dtype, "merge_bagging": merge_bagging}})
+            loaded, _ = load_bundle(target, classes=classes)
+            served = backend.predict_batch(texts[:50], loaded["model"], loaded.get("label_encoder"), model_type)
+            if served != compressed_results[:50]:
+                raise ValueError("bundle round-trip predictions differ")
+
+            size_before, size_after = model_size(model), model_size(compressed)
+            size_after["bundle_bytes"] = bundle_size(target)
+            report["models"][name] = {
+                "original": {**size_before, "pickle_bytes": os.path.getsize(path), **before},
+                "compressed": {**size_after, **after},
+                "bytes_saved": size_before["bytes"] - size_after["bytes"],
+                "size_ratio": round(size_after["bytes"] / size_before["bytes"], 4),
+                "accuracy_change": round(after["accuracy"] - before["accuracy"], 4),
+                "f1_change": round(after["f1"] - before["f1"], 4),
+                **compare(original_results, compressed_results),
+            }
+            entry = report["models"][name]
+            print(f"✓ {name}: {size_before['bytes'] / 1024:.0f} KB -> {size_after['bytes'] / 1024:.0f} KB, "
+                  f"{size_before['vocabulary_terms']} -> {size_after['vocabulary_terms']} terms, "
+                  f"accuracy {before['accuracy']:.4f} -> {after['accuracy']:.4f} "
+                  f"(labels agree {entry['label_agreement']:.2%}) -> {target}")
+        except Exception as e:
+            print(f"⚠️ Could not compress {path}: {e}")
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Prune and quantize the served linear models")
+    parser.add_argument("--models-dir", default=None)
+    parser.add_argument("--out-dir", default=None, help="Bundle directory (default: <models-dir>/compressed)")
+    parser.add_argument("--dataset", default=None, help="CSV for the held-out report (default: ml_model/stress.csv)")
+    parser.add_argument("--report", default=None,
+                        help="Report path (default: ml_model/reports/compression_report.json)")
+    parser.add_argument("--models", default=",".join(MODEL_NAMES), help="Comma-separated model names")
+    parser.add_argument("--prune", type=float, default=0.01,
+                        help="Drop weights below this fraction of the largest one per output (default: 0.01)")
+    parser.add_argument("--dtype", choices=DTYPES, default="int8")
+    parser.add_argument("--keep-bagging", action="store_true", help="Keep bagged estimators instead of merging them")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, backend_dir)
+    import app as backend
+    models_dir = args.models_dir or os.path.join(backend.ML_DIR, "models")
+    report = compress_all(
+        backend,
+        models_dir,
+        args.out_dir or os.path.join(models_dir, "compressed"),
+        args.dataset or os.path.join(backend.ML_DIR, "stress.csv"),
+        [n.strip() for n in args.models.split(",") if n.strip()],
+        args.prune,
+        args.dtype,
+        not args.keep_bagging,
+    )
+    report_path = args.report or os.path.join(backend.ML_DIR, "reports", "compression_report.json")
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Report written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
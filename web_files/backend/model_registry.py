@@ -0,0 +1,270 @@
+"""
+Model registry: hot reload, atomic swap, rollback and canary routing.
+
+The served model is a ``ModelVersion``. Requests take one reference to it
+(``resolve``) and keep using it to the end, so swapping the registry's
+routing tuple never affects a request in flight. A reload loads and warms
+the new version in a background thread first, then swaps it in; the version
+it replaced is kept for ``rollback``. A reload can instead stage the new
+version as a canary that receives ``canary_percent`` of the traffic until it
+is promoted or discarded.
+
+Commands (reload / rollback / promote / discard) are appended to a small
+shared memory log created at import, so under serve.py a command received
+by one worker is applied, in order, by every worker; each process polls the
+log from its own thread. serve.py's master applies the commands too, so a
+worker it restarts is forked with the current routing and only applies
+commands newer than that. The same thread can watch the model files and
+reload when their fingerprint changes.
+"""
+import functools
+import mmap
+import multiprocessing
+import os
+import random
+import threading
+import time
+import weakref
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+COMMANDS = ("reload", "rollback", "promote", "discard")
+_LOG_SIZE = 64  # commands kept in the shared log: [seq, (command, argument) * _LOG_SIZE]
+
+
+class ModelVersion:
+    """A loaded (and warmed up) model with its label encoder and type"""
+
+    def __init__(self, model, label_encoder, model_type, fingerprint=None):
+        self.model = model
+        self.label_encoder = label_encoder
+        self.model_type = model_type
+        self.fingerprint = fingerprint
+        self.text_normalization = None  # set by the loader: how request texts are preprocessed
+        self.version = None
+        self.loaded_at = datetime.utcnow().isoformat() + "Z"
+
+    def as_tuple(self):
+        return self.model, self.label_encoder, self.model_type
+
+    def info(self):
+        return {
+            "version": self.version,
+            "model_type": self.model_type,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "scoring_mode": "compiled" if getattr(self.model, "is_compiled", False) else "sklearn",
+            "text_normalization": self.text_normalization,
+        }
+
+
+def _after_fork(ref):
+    """New thread lock in a forked child: the parent's poll thread may have held the old one"""
+    registry = ref()
+    if registry is not None:
+        registry._lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    ``loader()`` returns a new, warmed-up ModelVersion (or None);
+    ``fingerprint()`` summarises the artifacts on disk for the file watcher;
+    ``on_change(active)`` is called after every change of the routing.
+    """
+
+    def __init__(self, loader, fingerprint, watch_interval=0.0, poll_interval=0.5, on_change=None):
+        self.loader = loader
+        self.fingerprint = fingerprint
+        self.on_change = on_change
+        self.watch_interval = watch_interval
+        self.poll_interval = poll_interval
+        self.previous = None
+        self.reloads = 0
+        self.last_error = None
+        self._routing = (None, None, 0)  # (active, candidate, canary percent)
+        self._versions = 0
+        self._lock = threading.Lock()
+        log_words = 1 + 2 * _LOG_SIZE
+        self._commands = np.ndarray((log_words,), dtype=np.int64, buffer=mmap.mmap(-1, 8 * log_words))
+        self._commands_lock = multiprocessing.Lock()
+        self._seen = 0
+        self._pid = None
+        self._thread = None
+        os.register_at_fork(after_in_child=functools.partial(_after_fork, weakref.ref(self)))
+
+    # ----- routing -----
+    @property
+    def active(self):
+        return self._routing[0]
+
+    @property
+    def candidate(self):
+        return self._routing[1]
+
+    def resolve(self, route_key=None):
+        """(version, is_canary) for one request; ``route_key`` makes canary routing sticky"""
+        active, candidate, percent = self._routing
+        if candidate is None or percent <= 0:
+            return active, False
+        if route_key is None:
+            bucket = random.randrange(100)
+        else:
+            bucket = zlib.crc32(str(route_key).encode("utf-8")) % 100
+        if bucket < percent:
+            return candidate, True
+        return active, False
+
+    # ----- local transitions (this process) -----
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.active)
+
+    def _number(self, version):
+        self._versions += 1
+        version.version = f"v{self._versions}"
+        return version
+
+    def activate(self, version):
+        """Serve ``version`` now, keeping the current one for rollback"""
+        with self._lock:
+            active, _, _ = self._routing
+            self._routing = (self._number(version), None, 0)
+            if active is not None:
+                self.previous = active
+        self._changed()
+
+    def rollback(self):
+        with self._lock:
+            active, _, _ = self._routing
+            if self.previous is None:
+                return False
+            self._routing = (self.previous, None, 0)
+            self.previous = active
+        self._changed()
+        return True
+
+    def stage_candidate(self, version, percent):
+        with self._lock:
+            active, _, _ = self._routing
+            self._routing = (active, self._number(version), max(0, min(100, int(percent))))
+        self._changed()
+
+    def promote(self):
+        with self._lock:
+            active, candidate, _ = self._routing
+            if candidate is None:
+                return False
+            self._routing = (candidate, None, 0)
+            self.previous = active
+        self._changed()
+        return True
+
+    def discard(self):
+        with self._lock:
+            active, candidate, _ = self._routing
+            self._routing = (active, None, 0)
+        self._changed()
+        return candidate is not None
+
+    def reload(self, canary_percent=0):
+        """Load a new version (blocking) and activate it, or stage it as a canary"""
+        started = time.perf_counter()
+        try:
+            version = self.loader()
+        except Exception as e:
+            version, self.last_error = None, str(e)
+        if version is None:
+            self.last_error = self.last_error or "No model could be loaded"
+            print(f"⚠️ Model reload failed, keeping {self.active.version if self.active else 'no model'}: "
+                  f"{self.last_error}")
+            return None
+        self.last_error = None
+        self.reloads += 1
+        if canary_percent > 0:
+            self.stage_candidate(version, canary_percent)
+            print(f"✓ Staged {version.version} ({version.model_type}) as canary for {canary_percent}% "
+                  f"of traffic ({time.perf_counter() - started:.1f}s)")
+        else:
+            self.activate(version)
+            print(f"✓ Swapped in {version.version} ({version.model_type}) in {time.perf_counter() - started:.1f}s")
+        return version
+
+    # ----- commands shared by all workers -----
+    def request(self, command, argument=0):
+        """Append a command for every process (applied by their poll threads); returns its number"""
+        with self._commands_lock:
+            seq = int(self._commands[0]) + 1
+            slot = 1 + 2 * ((seq - 1) % _LOG_SIZE)
+            self._commands[slot:slot + 2] = (COMMANDS.index(command), int(argument))
+            self._commands[0] = seq
+        return seq
+
+    def _apply_commands(self):
+        latest = int(self._commands[0])
+        if latest == self._seen:
+            return
+        first = self._seen + 1
+        if latest - first >= _LOG_SIZE:
+            # Too far behind to replay in order: just load the current files
+            first = latest + 1
+            self.reload()
+        for seq in range(first, latest + 1):
+            slot = 1 + 2 * ((seq - 1) % _LOG_SIZE)
+            command, argument = COMMANDS[int(self._commands[slot])], int(self._commands[slot + 1])
+            if command == "reload":
+                self.reload(canary_percent=argument)
+            elif command == "rollback" and self.rollback():
+                print(f"✓ Rolled back to {self.active.version}")
+            elif command == "promote" and self.promote():
+                print(f"✓ Promoted {self.active.version}")
+            elif command == "discard":
+                self.discard()
+        self._seen = latest
+
+    def ensure_watcher(self):
+        """Start this process's poll thread (once per process; threads do not survive fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        watched = self.fingerprint() if self.watch_interval > 0 else None
+        pending = None
+        next_watch = time.monotonic() + self.watch_interval
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._apply_commands()
+                if self.watch_interval > 0 and time.monotonic() >= next_watch:
+                    next_watch = time.monotonic() + self.watch_interval
+                    current = self.fingerprint()
+                    # Reload once the files stop changing (a copy may be in progress)
+                    if current != watched and current == pending:
+                        print("✓ Model files changed, reloading")
+                        watched, pending = current, None
+                        self.reload()
+                    else:
+                        pending = current if current != watched else None
+            except Exception as e:
+                print(f"⚠️ Model registry: {e}")
+
+    def status(self):
+        active, candidate, percent = self._routing
+        return {
+            "pid": os.getpid(),
+            "active": active.info() if active else None,
+            "previous": self.previous.info() if self.previous else None,
+            "candidate": candidate.info() if candidate else None,
+            "canary_percent": percent,
+            "reloads": self.reloads,
+            "commands_applied": self._seen,
+            "last_error": self.last_error,
+            "watch_interval": self.watch_interval,
+        }
@@ -0,0 +1,185 @@
+"""
+In-process prediction cache for the scoring endpoints.
+
+Entries are keyed by a hash of the normalized text; the cache is bound to one
+model object at a time and clears itself as soon as a different model is
+served.  Eviction is LRU with an optional TTL, and concurrent requests for the
+same key are collapsed so only one of them runs the model.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Same whitespace collapsing as sklearn's char analyzers. Case is kept: the
+# text normalizer's URL and [deleted] patterns are case-sensitive.
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+
+def normalize_text(text):
+    """Canonical form of a text for cache lookups"""
+    return _WHITE_SPACES.sub(" ", str(text))
+
+
+def text_key(text):
+    """Stable hash of the normalized text"""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+
+class _Flight:
+    """A computation in progress that other requests for the same key wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of prediction results with optional TTL.
+    ``max_size=0`` disables caching (every lookup is a miss).
+    """
+
+    def __init__(self, max_size=10000, ttl=None):
+        self.max_size = max(0, int(max_size))
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._model = None
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "collapsed": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _bind(self, model):
+        """Clear everything when a different model object is being served"""
+        if model is not self._model:
+            if self._entries or self._model is not None:
+                self._counters["invalidations"] += 1
+            self._entries.clear()
+            self._inflight = {}
+            self._model = model
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get_or_compute(self, model, text, compute):
+        """
+        Return the cached result for ``text`` under ``model`` or run ``compute()``.
+        Concurrent callers with the same key wait for a single computation.
+        """
+        if not self.enabled:
+            return compute()
+        key = text_key(text)
+        with self._lock:
+            self._bind(model)
+            value = self._get(key)
+            if value is not None:
+                self._counters["hits"] += 1
+                return value
+            flight = self._inflight.get(key)
+            if flight is None:
+                flight = self._inflight[key] = _Flight()
+                leader = True
+                self._counters["misses"] += 1
+            else:
+                leader = False
+                self._counters["collapsed"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                if flight.error is None and self._model is model:
+                    self._put(key, flight.value)
+            flight.event.set()
+        return flight.value
+
+    def get_many(self, model, texts, compute_many):
+        """
+        Batch variant: serve hits from the cache and run ``compute_many`` once
+        over the misses (in order).  Returns results aligned with ``texts``.
+        """
+        if not self.enabled:
+            return compute_many(texts)
+        keys = [text_key(t) for t in texts]
+        results = [None] * len(texts)
+        missing = []
+        with self._lock:
+            self._bind(model)
+            for pos, key in enumerate(keys):
+                value = self._get(key)
+                if value is None:
+                    missing.append(pos)
+                    self._counters["misses"] += 1
+                else:
+                    results[pos] = value
+                    self._counters["hits"] += 1
+        if missing:
+            computed = compute_many([texts[pos] for pos in missing])
+            with self._lock:
+                bound = self._model is model
+                for pos, value in zip(missing, computed):
+                    results[pos] = value
+                    if bound:
+                        self._put(keys[pos], value)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+            inflight = len(self._inflight)
+        lookups = counters["hits"] + counters["misses"] + counters["collapsed"]
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "inflight": inflight,
+            **counters,
+            "hit_rate": round((counters["hits"] + counters["collapsed"]) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,401 @@
+"""
+Append-only prediction log for auditing and drift analysis.
+
+Every scored text is kept as one fixed-width binary record (timestamp,
+label, probability, model type, latency: 18 bytes). ``append`` only adds
+tuples to an in-memory buffer; a background thread writes them out every
+``flush_interval`` seconds as one block, so the predict path never touches
+the disk.
+
+Records go to segment files ``<start_ms>-<pid>-<n>.plog`` that are rotated
+by size and age. Each segment has a small ``.plog.json`` sidecar (the index
+entry) with its time range, row count, model type table and per-label
+counts / sums, rewritten after every flush. Queries pick segments by time
+range from the sidecars, aggregate fully covered closed segments from the
+sidecar alone and binary-search the timestamp column (memory-mapped) of the
+others, so only the relevant bytes are read. Each process writes its own
+segments, so serve.py's workers never contend on a file. A segment left
+open by a process that no longer exists is closed by the next reader, with
+its sidecar rebuilt from the records on disk. Closed segments older than
+``max_age`` seconds, or beyond the newest ``max_segments``, are deleted
+whenever a new segment is started.
+
+Usage:
+    python prediction_log.py stats --since 3600
+    python prediction_log.py dump --start 2024-01-01T00:00:00 --limit 20
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+LABELS = ("Stress", "Non-Stress", "Other")
+RECORD = np.dtype([("ts", "<f8"), ("prob", "<f4"), ("latency_ms", "<f4"), ("label", "u1"), ("model", "u1")])
+MAGIC = b"PLOG1\n"
+HEADER_BYTES = 128
+SEGMENT_SUFFIX = ".plog"
+INDEX_SUFFIX = ".plog.json"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError, TypeError):
+        return True
+    return True
+
+
+def _write_json(path, entry):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+
+
+def _empty_totals():
+    return {"rows": 0, "labels": [0] * len(LABELS), "model_rows": [], "prob_sum": 0.0,
+            "latency_rows": 0, "latency_ms_sum": 0.0, "latency_ms_max": 0.0}
+
+
+def _block_totals(records, n_models):
+    latency = records["latency_ms"][~np.isnan(records["latency_ms"])]
+    return {
+        "rows": len(records),
+        "labels": np.bincount(records["label"], minlength=len(LABELS)).tolist(),
+        "model_rows": np.bincount(records["model"], minlength=n_models).tolist(),
+        "prob_sum": float(records["prob"].sum(dtype=np.float64)),
+        "latency_rows": len(latency),  # rows logged with a latency (the others are NaN)
+        "latency_ms_sum": float(latency.sum(dtype=np.float64)),
+        "latency_ms_max": float(latency.max()) if len(latency) else 0.0,
+    }
+
+
+def _add_totals(totals, part):
+    totals["rows"] += part["rows"]
+    totals["labels"] = [a + b for a, b in zip(totals["labels"], part["labels"])]
+    width = max(len(totals["model_rows"]), len(part["model_rows"]))
+    pad = lambda counts: list(counts) + [0] * (width - len(counts))
+    totals["model_rows"] = [a + b for a, b in zip(pad(totals["model_rows"]), pad(part["model_rows"]))]
+    totals["prob_sum"] += part["prob_sum"]
+    # Index entries written before latency_rows existed: assume every row had one
+    totals["latency_rows"] += part.get("latency_rows", part["rows"])
+    totals["latency_ms_sum"] += part["latency_ms_sum"]
+    totals["latency_ms_max"] = max(totals["latency_ms_max"], part["latency_ms_max"])
+
+
+class _Segment:
+    """The segment this process is currently appending to"""
+
+    def __init__(self, directory, sequence):
+        self.start = time.time()
+        base = f"{int(self.start * 1000)}-{os.getpid()}-{sequence}"
+        self.path = os.path.join(directory, base + SEGMENT_SUFFIX)
+        self.index_path = os.path.join(directory, base + INDEX_SUFFIX)
+        self.models = []
+        self.end = None
+        self.totals = _empty_totals()
+        self._f = open(self.path, "ab")
+        header = MAGIC + json.dumps({"record_bytes": RECORD.itemsize, "fields": RECORD.names}).encode()
+        self._f.write(header.ljust(HEADER_BYTES - 1, b" ") + b"\n")
+        self._f.flush()
+        self.size = HEADER_BYTES
+        self.write_index(closed=False)
+
+    def model_code(self, model_type):
+        name = model_type or "none"
+        if name not in self.models:
+            self.models.append(name)
+        return self.models.index(name)
+
+    def write(self, block):
+        self._f.write(block.tobytes())
+        self._f.flush()
+        self.size += block.nbytes
+        self.end = float(block["ts"][-1])
+        _add_totals(self.totals, _block_totals(block, len(self.models)))
+
+    def write_index(self, closed):
+        entry = {"start": self.start, "end": self.end, "closed": closed, "models": self.models,
+                 "pid": os.getpid(), **self.totals}
+        _write_json(self.index_path, entry)
+
+    def close(self):
+        self._f.close()
+        self.write_index(closed=True)
+
+
+class PredictionLog:
+    """Buffered writer plus time-range queries over every process's segments"""
+
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, segment_seconds=3600,
+                 flush_interval=1.0, max_buffer=100000, max_segments=0, max_age=0.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments  # 0: no limit
+        self.max_age = max_age  # seconds, 0: no limit
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._segment = None
+        self._sequence = 0
+
+    # ----- writing -----
+    def append(self, results, model_type=None, latency_ms=None):
+        """Queue [(label, confidence), ...] scored by ``model_type`` in ``latency_ms``"""
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            if len(self._buffer) + len(results) > self.max_buffer:
+                self.dropped += len(results)
+                return
+            ts = time.time()
+            self._buffer.extend((ts, label, confidence, model_type, latency_ms) for label, confidence in results)
+
+    def _start(self):
+        with self._flush_lock:
+            if self._pid == os.getpid():
+                return
+            # After a fork the parent's buffer, segment and thread are not ours
+            self._lock = threading.Lock()
+            self._buffer = []
+            self._segment = None
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Prediction log flush failed: {e}")
+
+    def flush(self):
+        """Write buffered records to the current segment (rotating it when due)"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            segment = self._segment
+            if segment is not None and (segment.size >= self.segment_bytes
+                                        or time.time() - segment.start >= self.segment_seconds):
+                segment.close()
+                segment = self._segment = None
+            if not rows:
+                return 0
+            if segment is None:
+                self._sequence += 1
+                segment = self._segment = _Segment(self.directory, self._sequence)
+                self.prune()
+            block = np.empty(len(rows), dtype=RECORD)
+            ts, labels, probs, models, latencies = zip(*rows)
+            block["ts"] = ts
+            block["label"] = [LABELS.index(l) if l in LABELS[:2] else 2 for l in labels]
+            block["prob"] = probs
+            block["model"] = [segment.model_code(m) for m in models]
+            block["latency_ms"] = [l if l is not None else np.nan for l in latencies]
+            segment.write(block)
+            segment.write_index(closed=False)
+            return len(rows)
+
+    def close(self):
+        """Flush and close this process's segment (call before exiting)"""
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        with self._flush_lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def prune(self):
+        """Delete closed segments past ``max_age`` / ``max_segments``; returns how many"""
+        if not self.max_segments and not self.max_age:
+            return 0
+        closed = [e for e in self.segments() if e["closed"]]
+        expired = []
+        if self.max_age:
+            cutoff = time.time() - self.max_age
+            expired = [e for e in closed if (e["end"] or e["start"]) < cutoff]
+            closed = [e for e in closed if e not in expired]
+        if self.max_segments and len(closed) > self.max_segments:
+            expired += closed[:len(closed) - self.max_segments]  # oldest first
+        for entry in expired:
+            for path in (entry["path"], entry["path"][:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass  # pruned by another worker
+        return len(expired)
+
+    # ----- reading -----
+    def segments(self, start=None, end=None):
+        """Index entries of segments overlapping [start, end], oldest first"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(INDEX_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name), "r") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entry["path"] = os.path.join(self.directory, name[:-len(INDEX_SUFFIX)] + SEGMENT_SUFFIX)
+            if not entry["closed"] and not _pid_alive(entry.get("pid")):
+                entry = self._close_orphan(entry, os.path.join(self.directory, name))
+            # An open segment may have rows newer than its index entry
+            last = entry["end"] if entry["closed"] and entry["end"] is not None else float("inf")
+            if (end is not None and entry["start"] > end) or (start is not None and last < start):
+                continue
+            entries.append(entry)
+        return sorted(entries, key=lambda e: e["start"])
+
+    def _close_orphan(self, entry, index_path):
+        """Close the entry of a segment whose writer died, from the records on disk"""
+        records = self._records(entry)
+        totals = _block_totals(records, len(entry.get("models") or [])) if len(records) else _empty_totals()
+        path = entry.pop("path")
+        entry.update(totals, closed=True, end=float(records["ts"][-1]) if len(records) else entry["start"])
+        try:
+            _write_json(index_path, entry)
+        except OSError:
+            pass  # read-only log directory: repair again on the next query
+        entry["path"] = path
+        return entry
+
+    @staticmethod
+    def _records(entry, start=None, end=None):
+        """Memory-mapped records of one segment within [start, end]"""
+        try:
+            rows = (os.path.getsize(entry["path"]) - HEADER_BYTES) // RECORD.itemsize
+        except OSError:
+            return np.empty(0, dtype=RECORD)
+        if rows <= 0:
+            return np.empty(0, dtype=RECORD)
+        records = np.memmap(entry["path"], dtype=RECORD, mode="r", offset=HEADER_BYTES, shape=(rows,))
+        ts = records["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        hi = rows if end is None else int(np.searchsorted(ts, end, side="right"))
+        return records[lo:hi]
+
+    def query(self, start=None, end=None, limit=1000):
+        """Records in [start, end] (epoch seconds), oldest first, at most ``limit``"""
+        out, available = [], 0
+        for entry in self.segments(start, end):
+            models = entry.get("models") or []
+            records = self._records(entry, start, end)
+            available += len(records)
+            # Segments of different processes overlap in time: take up to
+            # ``limit`` from each and merge
+            for ts, prob, latency, label, model in records[:limit].tolist():
+                out.append({
+                    "ts": ts,
+                    "label": LABELS[label],
+                    "probability": round(prob, 4),
+                    "model_type": models[model] if model < len(models) else "unknown",
+                    "latency_ms": None if np.isnan(latency) else round(latency, 3),
+                })
+        out.sort(key=lambda r: r["ts"])
+        out = out[:limit]
+        for record in out:
+            record["ts"] = datetime.fromtimestamp(record["ts"], timezone.utc).isoformat().replace("+00:00", "Z")
+        return {"count": len(out), "truncated": available > len(out), "records": out}
+
+    def stats(self, start=None, end=None):
+        """Counts per label and model type, mean probability and latency in [start, end]"""
+        totals = _empty_totals()
+        per_model = {}
+        segments = self.segments(start, end)
+        segments_read = 0
+        for entry in segments:
+            models = entry.get("models") or []
+            covered = (entry["closed"] and (start is None or entry["start"] >= start)
+                       and (end is None or (entry["end"] or 0) <= end))
+            if covered:
+                part = entry
+            else:
+                part = _block_totals(self._records(entry, start, end), len(models))
+                segments_read += 1
+            for code, count in enumerate(part["model_rows"]):
+                name = models[code] if code < len(models) else "unknown"
+                per_model[name] = per_model.get(name, 0) + count
+            _add_totals(totals, {**part, "model_rows": []})
+
+        rows = totals["rows"]
+        return {
+            "rows": rows,
+            "stress": totals["labels"][0],
+            "nonStress": totals["labels"][1],
+            "stress_rate": round(totals["labels"][0] / rows, 4) if rows else None,
+            "mean_probability": round(totals["prob_sum"] / rows, 4) if rows else None,
+            "mean_latency_ms": (round(totals["latency_ms_sum"] / totals["latency_rows"], 3)
+                                if totals["latency_rows"] else None),
+            "max_latency_ms": round(totals["latency_ms_max"], 3),
+            "model_types": per_model,
+            "segments": len(segments),
+            "segments_read": segments_read,
+        }
+
+
+def parse_time(value):
+    """Epoch seconds from an ISO-8601 string or a number (None passes through)"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def main(argv=None):
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Query the prediction log")
+    parser.add_argument("command", choices=["stats", "dump", "segments"])
+    parser.add_argument("--dir", default=os.getenv("PREDICTION_LOG_DIR"),
+                        help="Log directory (default: the server's PREDICTION_LOG_DIR)")
+    parser.add_argument("--start", default=None, help="ISO-8601 time or epoch seconds")
+    parser.add_argument("--end", default=None, help="ISO-8601 time or epoch seconds")
+    parser.add_argument("--since", type=float, default=None, help="Only the last N seconds")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    directory = args.dir
+    if directory is None:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from app import PREDICTION_LOG_DIR as directory
+    # Read-only: the app's writer (absent with PREDICTION_LOG=0) is not needed
+    log = PredictionLog(directory)
+    start = time.time() - args.since if args.since is not None else parse_time(args.start)
+    end = parse_time(args.end)
+    if args.command == "stats":
+        print(json.dumps(log.stats(start, end), indent=2))
+    elif args.command == "segments":
+        for entry in log.segments(start, end):
+            print(f"{os.path.basename(entry['path'])}  rows={entry['rows']}  closed={entry['closed']}")
+    else:
+        for record in log.query(start, end, args.limit)["records"]:
+            print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()
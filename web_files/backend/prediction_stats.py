@@ -0,0 +1,241 @@
+"""
+Prediction statistics shared by every worker process.
+
+The counters live in one shared memory block (anonymous MAP_SHARED memory
+created at import, so serve.py's forked workers all see it, or a file given
+by PREDICTION_STATS_PATH). The block is divided into slots; each process
+claims one slot and is its only writer, so the predict path never waits on
+another process. A slot holds:
+
+- running totals per label
+- per-minute counts in a ring of MINUTE_BUCKETS buckets (rolling windows)
+- a ring buffer of the last ``recent`` predictions (timestamp, label, probability)
+
+Writers bump a sequence number before and after every update (a seqlock);
+readers copy a slot and retry while the number is odd or changed, then
+aggregate over all slots. A slot left by a dead process is reused by the
+next one and keeps its counts. Slots are never shared between live
+processes: when all of them are taken, a new process records nothing (and
+says so) until one is freed.
+"""
+import fcntl
+import functools
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+LABELS = ("Stress", "Non-Stress", "Other")
+MINUTE_BUCKETS = 64
+WINDOWS = (1, 5, 60)  # minutes
+_MAGIC = 0x50535431  # "PST1"
+_HEADER = np.dtype([("magic", "<i8"), ("slots", "<i8"), ("recent", "<i8"), ("reserved", "<i8")])
+
+
+def _slot_dtype(recent):
+    return np.dtype([
+        ("pid", "<i8"),
+        ("seq", "<u8"),
+        ("totals", "<i8", (len(LABELS),)),
+        ("minutes", "<i8", (MINUTE_BUCKETS,)),
+        ("minute_counts", "<i8", (MINUTE_BUCKETS, len(LABELS))),
+        ("written", "<i8"),
+        ("ts", "<f8", (recent,)),
+        ("prob", "<f4", (recent,)),
+        ("label", "<i1", (recent,)),
+    ], align=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _after_fork(ref):
+    """New thread lock in a forked child: a parent thread may have held the old one"""
+    stats = ref()
+    if stats is not None:
+        stats._lock = threading.Lock()
+
+
+class PredictionStats:
+    """
+    Cross-process prediction counters, rolling windows and recent predictions.
+    ``path=None`` uses anonymous shared memory, shared with forked children.
+    """
+
+    def __init__(self, path=None, slots=64, recent=50):
+        self.path = path
+        self.slots = max(1, int(slots))
+        self.recent = max(1, int(recent))
+        self._slot_dtype = _slot_dtype(self.recent)
+        size = _HEADER.itemsize + self._slot_dtype.itemsize * self.slots
+
+        if path is None:
+            self._fd = None
+            self._claim_lock = multiprocessing.Lock()
+            self._mmap = mmap.mmap(-1, size)
+        else:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._claim_lock = None
+            with self._locked():
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+
+        self._header = np.ndarray((), dtype=_HEADER, buffer=self._mmap)
+        self._table = np.ndarray((self.slots,), dtype=self._slot_dtype, buffer=self._mmap, offset=_HEADER.itemsize)
+        with self._locked():
+            if self._header["magic"] != _MAGIC:
+                self._table[:] = np.zeros((), dtype=self._slot_dtype)
+                self._header["slots"], self._header["recent"] = self.slots, self.recent
+                self._header["magic"] = _MAGIC
+            elif (self._header["slots"], self._header["recent"]) != (self.slots, self.recent):
+                raise ValueError(f"{path} was created with slots={int(self._header['slots'])}, "
+                                 f"recent={int(self._header['recent'])}")
+
+        self._pid = None
+        self._slot = None
+        self._unclaimed_pid = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=functools.partial(_after_fork, weakref.ref(self)))
+
+    @contextmanager
+    def _locked(self):
+        """Cross-process lock, only taken to initialise the block and claim slots"""
+        if self._fd is None:
+            with self._claim_lock:
+                yield
+        else:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _claim(self):
+        pid = os.getpid()
+        with self._locked():
+            owners = self._table["pid"].tolist()
+            index = next((i for i, owner in enumerate(owners) if owner == pid), None)
+            if index is None:
+                index = next((i for i, owner in enumerate(owners) if owner == 0), None)
+            if index is None:
+                index = next((i for i, owner in enumerate(owners) if not _pid_alive(owner)), None)
+            if index is None:
+                # Sharing a live process's slot would break the single-writer seqlock
+                return None
+            self._table["pid"][index] = pid
+        return self._table[index]
+
+    def _own_slot(self):
+        """This process's slot, or None if every slot is held (call with self._lock held)"""
+        pid = os.getpid()
+        if self._pid != pid:
+            # First use in this process (or after a fork): claim a slot
+            self._slot = self._claim()
+            if self._slot is None:
+                if self._unclaimed_pid != pid:
+                    self._unclaimed_pid = pid
+                    print(f"⚠️ All {self.slots} prediction stats slots are held by live processes; "
+                          f"predictions of process {pid} are not counted in /stats "
+                          f"(raise PREDICTION_STATS_SLOTS)")
+                return None
+            self._pid = pid
+        return self._slot
+
+    def record(self, results, ts=None):
+        """Add [(label, confidence), ...] scored at ``ts`` (default: now)"""
+        if not results:
+            return
+        ts = time.time() if ts is None else ts
+        codes = [LABELS.index(label) if label in LABELS[:2] else 2 for label, _ in results]
+        counts = np.bincount(codes, minlength=len(LABELS))
+        tail = results[-self.recent:]
+        minute = int(ts // 60)
+        bucket = minute % MINUTE_BUCKETS
+
+        with self._lock:
+            slot = self._own_slot()
+            if slot is None:
+                return
+            slot["seq"] += 1
+            slot["totals"] += counts
+            if slot["minutes"][bucket] != minute:
+                slot["minutes"][bucket] = minute
+                slot["minute_counts"][bucket] = 0
+            slot["minute_counts"][bucket] += counts
+            start = int(slot["written"]) + len(results) - len(tail)
+            positions = [(start + i) % self.recent for i in range(len(tail))]
+            slot["ts"][positions] = ts
+            slot["prob"][positions] = [confidence for _, confidence in tail]
+            slot["label"][positions] = codes[-len(tail):]
+            slot["written"] += len(results)
+            slot["seq"] += 1
+
+    def _snapshot(self, index, retries=100):
+        """Consistent copy of one slot (seqlock read)"""
+        slot = self._table[index]
+        copy = slot.copy()
+        for _ in range(retries):
+            before = int(slot["seq"])
+            if before % 2 == 0:
+                copy = slot.copy()
+                if int(slot["seq"]) == before:
+                    break
+            time.sleep(0)
+        return copy
+
+    def summary(self, recent=20, now=None):
+        """Totals, rolling 1/5/60-minute windows and recent predictions across all processes"""
+        now = time.time() if now is None else now
+        snapshots = [self._snapshot(i) for i, pid in enumerate(self._table["pid"].tolist()) if pid]
+        totals = np.zeros(len(LABELS), dtype=np.int64)
+        current = int(now // 60)
+        windows = {n: np.zeros(len(LABELS), dtype=np.int64) for n in WINDOWS}
+        recent_rows = []
+        for snap in snapshots:
+            totals += snap["totals"]
+            for n in WINDOWS:
+                # The last n full minutes plus the current, partial one
+                mask = (snap["minutes"] >= current - n) & (snap["minutes"] <= current)
+                windows[n] += snap["minute_counts"][mask].sum(axis=0)
+            kept = min(int(snap["written"]), self.recent)
+            order = [(int(snap["written"]) - kept + i) % self.recent for i in range(kept)]
+            recent_rows.extend(zip(snap["ts"][order].tolist(), snap["label"][order].tolist(),
+                                   snap["prob"][order].tolist()))
+        recent_rows.sort(key=lambda r: r[0])
+
+        into_minute = now - current * 60
+        window_stats = {}
+        for n, counts in windows.items():
+            seconds = n * 60 + into_minute
+            window_stats[f"{n}m"] = {
+                "total": int(counts.sum()),
+                "stress": int(counts[0]),
+                "nonStress": int(counts[1]),
+                "per_second": round(float(counts.sum()) / seconds, 4) if seconds > 0 else 0.0,
+            }
+        return {
+            "total": int(totals.sum()),
+            "stress": int(totals[0]),
+            "nonStress": int(totals[1]),
+            "recent": [
+                {"label": LABELS[code], "probability": round(prob, 4),
+                 "ts": datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")}
+                for ts, code, prob in recent_rows[-recent:]
+            ] if recent else [],
+            "windows": window_stats,
+            "processes": sum(1 for snap in snapshots if _pid_alive(int(snap["pid"]))),
+        }
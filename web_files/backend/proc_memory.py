@@ -0,0 +1,74 @@
+"""
+Per-process memory figures from /proc (Linux).
+
+``rss_kb`` counts every resident page, including pages shared copy-on-write
+with the parent; ``pss_kb`` splits shared pages between the processes that
+map them, so summing PSS across workers gives the real total footprint.
+"""
+import os
+
+
+def _read_kb_fields(path, fields):
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    values[name] = int(rest.split()[0])
+    except (OSError, ValueError, IndexError):
+        pass
+    return values
+
+
+def process_memory(pid=None):
+    """{"pid", "rss_kb", "pss_kb", "shared_kb", "private_kb"} for a process"""
+    pid = pid or os.getpid()
+    rollup = _read_kb_fields(
+        f"/proc/{pid}/smaps_rollup",
+        {"Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"},
+    )
+    if not rollup:
+        status = _read_kb_fields(f"/proc/{pid}/status", {"VmRSS"})
+        return {"pid": pid, "rss_kb": status.get("VmRSS"), "pss_kb": None,
+                "shared_kb": None, "private_kb": None}
+    return {
+        "pid": pid,
+        "rss_kb": rollup.get("Rss"),
+        "pss_kb": rollup.get("Pss"),
+        "shared_kb": rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0),
+        "private_kb": rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0),
+    }
+
+
+def child_pids(pid):
+    """Direct children of ``pid`` (via /proc/<pid>/task/*/children or a /proc scan)"""
+    children = []
+    task_dir = f"/proc/{pid}/task"
+    try:
+        for tid in os.listdir(task_dir):
+            with open(os.path.join(task_dir, tid, "children")) as f:
+                children.extend(int(c) for c in f.read().split())
+        return sorted(set(children))
+    except OSError:
+        pass
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        ppid = _read_kb_fields(f"/proc/{entry}/status", {"PPid"}).get("PPid")
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def workers_memory(master_pid):
+    """Memory of the master process and each of its workers, plus totals"""
+    master = process_memory(master_pid)
+    workers = [process_memory(pid) for pid in child_pids(master_pid)]
+    everyone = [master] + workers
+    return {
+        "master": master,
+        "workers": workers,
+        "total_rss_kb": sum(p["rss_kb"] or 0 for p in everyone),
+        "total_pss_kb": sum(p["pss_kb"] or 0 for p in everyone) if all(p["pss_kb"] is not None for p in everyone) else None,
+    }
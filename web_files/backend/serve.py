@@ -0,0 +1,174 @@
+"""
+Production entry point: pre-fork server with copy-on-write shared models.
+
+The parent process imports app.py once (loading every pickle and building
+the vectorizer vocabularies), freezes the garbage collector so those objects
+are never touched again, binds the listening socket and forks N workers.
+The workers share the model pages copy-on-write instead of each reloading
+them, so total memory stays close to a single process.
+
+Usage:
+    python serve.py --workers 4 --port 8001
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from proc_memory import workers_memory
+
+# Every worker holds the models plus its own caches, so the default stays small
+MAX_DEFAULT_WORKERS = 4
+
+
+def default_workers():
+    """
+    CPUs this process may run on (affinity, then a cgroup v2 CPU quota),
+    capped at MAX_DEFAULT_WORKERS. os.cpu_count() is the host's count in a
+    container.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, min(cpus, MAX_DEFAULT_WORKERS))
+
+
+def _bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(backend, host, port, sock):
+    """Serve requests forever in a forked worker"""
+    from werkzeug.serving import make_server
+
+    def _exit(*_):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        # os._exit skips atexit: flush the prediction log first
+        if backend.PREDICTION_LOG is not None:
+            backend.PREDICTION_LOG.close()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, _exit)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = make_server(host, port, backend.app, threaded=True, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+def _spawn(backend, host, port, sock):
+    pid = os.fork()
+    if pid == 0:
+        _run_worker(backend, host, port, sock)
+    return pid
+
+
+def _print_memory(master_pid):
+    mem = workers_memory(master_pid)
+    print("-" * 70)
+    print(f"{'process':<12}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'shared MB':>11}{'private MB':>12}")
+    for name, proc in [("master", mem["master"])] + [(f"worker {i}", w) for i, w in enumerate(mem["workers"])]:
+        mb = lambda kb: f"{kb / 1024:.1f}" if kb is not None else "-"
+        print(f"{name:<12}{proc['pid']:>8}{mb(proc['rss_kb']):>10}{mb(proc['pss_kb']):>10}"
+              f"{mb(proc['shared_kb']):>11}{mb(proc['private_kb']):>12}")
+    if mem["total_pss_kb"] is not None:
+        print(f"Total PSS: {mem['total_pss_kb'] / 1024:.1f} MB (sum of RSS: {mem['total_rss_kb'] / 1024:.1f} MB)")
+    print("-" * 70, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fork server for the stress detection backend")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")) or default_workers(),
+                        help=f"Worker processes (default: WEB_CONCURRENCY, else usable CPUs up to {MAX_DEFAULT_WORKERS})")
+    parser.add_argument("--memory-report-interval", type=float,
+                        default=float(os.getenv("MEMORY_REPORT_INTERVAL", "0")),
+                        help="Seconds between worker memory reports (0 = only at startup)")
+    args = parser.parse_args(argv)
+
+    # One /stats slot per worker, with room for restarted ones; a file given by
+    # PREDICTION_STATS_PATH may be shared with other servers, so keep its size
+    if not os.getenv("PREDICTION_STATS_PATH"):
+        os.environ.setdefault("PREDICTION_STATS_SLOTS", str(2 * max(1, args.workers)))
+
+    # Load every model once, in the parent (synchronously, before forking)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as backend
+    backend.load_models()
+
+    # Objects created so far are long-lived; keep the collector from writing
+    # to their headers (which would un-share the pages) in the workers.
+    gc.collect()
+    gc.freeze()
+
+    # The master applies /admin/models commands (and watches the model files)
+    # too, so a restarted worker is forked with the current models and routing
+    # instead of replaying the command log
+    backend.MODEL_REGISTRY.ensure_watcher()
+
+    sock = _bind(args.host, args.port)
+    master_pid = os.getpid()
+    os.environ["SERVE_MASTER_PID"] = str(master_pid)
+
+    print(f"\n🚀 Starting {args.workers} workers on {args.host}:{args.port} (master pid {master_pid})")
+    print(f"📁 ML Directory: {backend.ML_DIR}")
+    workers = {_spawn(backend, args.host, args.port, sock) for _ in range(max(1, args.workers))}
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    time.sleep(1.0)
+    _print_memory(master_pid)
+    next_report = time.monotonic() + args.memory_report_interval
+
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                print(f"⚠️ Worker {pid} exited (status {status}), restarting")
+                workers.add(_spawn(backend, args.host, args.port, sock))
+            continue
+        if args.memory_report_interval > 0 and time.monotonic() >= next_report:
+            _print_memory(master_pid)
+            next_report = time.monotonic() + args.memory_report_interval
+        time.sleep(0.2)
+
+    sock.close()
+    print("✓ All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
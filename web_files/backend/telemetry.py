@@ -0,0 +1,167 @@
+"""
+Runtime telemetry with Prometheus text-format exposition.
+
+Histograms reuse histograms.Histogram (fixed buckets, one lock per series),
+so recording a value is a bisect and three additions. Series are created on
+first use and keyed by metric name + label values. ``render()`` produces the
+text format served by GET /metrics/prometheus.
+
+Metrics are per process; with serve.py every worker keeps its own registry.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from histograms import Histogram
+
+PREFIX = "stress_api_"
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    "request_seconds": ("histogram", "End-to-end request latency by endpoint"),
+    "stage_seconds": ("histogram", "Latency of request stages (json_parse, vectorize, model, labels, serialize)"),
+    "requests_total": ("counter", "Requests by endpoint, status and model type"),
+    "errors_total": ("counter", "Failed requests by endpoint and error class"),
+    "predictions_total": ("counter", "Texts scored by model type"),
+    "model_load_seconds": ("gauge", "Duration of each model loading stage"),
+    "model_artifact_bytes": ("gauge", "Size of loaded model artifacts"),
+    "model_info": ("gauge", "Currently served model (value is always 1)"),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs, extra=None):
+    items = list(pairs) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Telemetry:
+    """Registry of counters, gauges and histograms keyed by label values"""
+
+    def __init__(self, enabled=True, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram(self.buckets))
+        hist.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def clear_gauge(self, name):
+        with self._lock:
+            for key in [k for k in self._gauges if k[0] == name]:
+                del self._gauges[key]
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def add_collector(self, collect):
+        """``collect()`` returns [(name, type, help, {labels}, value), ...] at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+
+        families = {}
+        for (name, labels), value in counters + gauges:
+            families.setdefault(name, []).append(("value", labels, value))
+        for (name, labels), hist in histograms:
+            families.setdefault(name, []).append(("histogram", labels, hist.snapshot()))
+        extra_meta = {}
+        for collect in self._collectors:
+            try:
+                for name, kind, help_text, labels, value in collect():
+                    extra_meta[name] = (kind, help_text)
+                    families.setdefault(name, []).append(("value", tuple(sorted(labels.items())), value))
+            except Exception:
+                continue
+
+        lines = []
+        for name in sorted(families):
+            kind, help_text = METRICS.get(name) or extra_meta.get(name, ("untyped", ""))
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} {kind}")
+            for series_kind, labels, value in sorted(families[name], key=lambda s: s[1]):
+                if series_kind == "value":
+                    lines.append(f"{full}{_labels(labels)} {_number(value)}")
+                    continue
+                for bound, cumulative in value["buckets"]:
+                    le = "+Inf" if bound == "+Inf" else _number(float(bound))
+                    lines.append(f"{full}_bucket{_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{full}_sum{_labels(labels)} {_number(float(value['sum']))}")
+                lines.append(f"{full}_count{_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Times consecutive stages: each ``lap(stage)`` records the time since the previous lap"""
+
+    def __init__(self, telemetry, metric="stage_seconds", **labels):
+        self.telemetry = telemetry
+        self.metric = metric
+        self.labels = labels
+        self._last = time.perf_counter()
+
+    def lap(self, stage, **labels):
+        now = time.perf_counter()
+        self.telemetry.observe(self.metric, now - self._last, stage=stage, **self.labels, **labels)
+        self._last = now
+
+    def observer(self, stage, label="member"):
+        """Callback ``(value, seconds)`` recording ``stage`` with ``label=value``"""
+        def observe(value, seconds):
+            self.telemetry.observe(self.metric, seconds, stage=stage, **self.labels, **{label: value})
+        return observe
+
+
+TELEMETRY = Telemetry(enabled=os.getenv("TELEMETRY", "1").lower() not in ("0", "false", "no"))
@@ -0,0 +1,367 @@
+"""
+Shared text featurization for fitted scikit-learn vectorizers.
+
+Several ensemble members usually carry TF-IDF vectorizers that differ only
+in vocabulary and n-gram range.  Calling ``vectorizer.transform`` on each of
+them re-runs the same Python-level preprocessing and tokenization for every
+member.  ``SharedTextTransformer`` walks the texts once, caches the
+preprocessed document, the token stream and the n-gram list per distinct
+analyzer configuration, and then builds each member's matrix with the exact
+same arithmetic as ``CountVectorizer`` / ``TfidfVectorizer.transform``.
+
+That reuses private scikit-learn members (``_word_ngrams``, ``_char_ngrams``,
+``_char_wb_ngrams``, ``_tfidf``). Every vectorizer is checked against its own
+``transform`` on a few texts when the transformer is built; one that does
+not match (e.g. after a scikit-learn upgrade) falls back to ``transform``.
+"""
+import array
+import time
+import weakref
+
+import numpy as np
+import scipy.sparse as sp
+
+from compact_vocab import CompactVocabulary
+
+# Texts the shared pass must featurize exactly like vectorizer.transform
+PROBE_TEXTS = (
+    "I can't sleep, exams are next week and I'm SO stressed!!",
+    "Feeling calm today: coffee, a walk and a good book.",
+    "Café déjà vu, naïve résumé 😊 #anxiety @friend 2024",
+    "work work work... deadline tomorrow and the boss keeps emailing me",
+    "",
+)
+
+
+def _callable_key(fn):
+    """Identity key for user-supplied callables (preprocessor/tokenizer)"""
+    return None if fn is None else id(fn)
+
+
+def split_model(model):
+    """(classifier, vectorizer) of a dict or (classifier, vectorizer) tuple artifact; (None, None) otherwise"""
+    if isinstance(model, dict):
+        return model.get("model") or model.get("classifier"), model.get("vectorizer")
+    if isinstance(model, (tuple, list)) and len(model) == 2:
+        clf, vectorizer = model
+        if not hasattr(clf, "predict") and hasattr(vectorizer, "predict"):
+            clf, vectorizer = vectorizer, clf
+        return clf, vectorizer
+    return None, None
+
+
+def _strong(obj):
+    return lambda: obj
+
+
+def _weak(obj):
+    """Weak reference to ``obj`` (a strong one if it does not support weak references)"""
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return _strong(obj)
+
+
+def _method(ref, func):
+    """``func(obj, *args)`` for the object behind ``ref`` (bound methods would keep it alive)"""
+    return lambda *args: func(ref(), *args)
+
+
+def _is_supported_vectorizer(vec):
+    """True for fitted Count/Tfidf vectorizers with a built-in analyzer"""
+    return (
+        hasattr(vec, "vocabulary_")
+        and hasattr(vec, "build_preprocessor")
+        and not callable(getattr(vec, "analyzer", None))
+        and getattr(vec, "analyzer", None) in ("word", "char", "char_wb")
+        and getattr(vec, "input", "content") == "content"
+    )
+
+
+class _Leaf:
+    """A single fitted Count/Tfidf vectorizer and its analyzer cache keys"""
+
+    def __init__(self, vec, ref=_strong):
+        self._vec = ref(vec)
+        self.dtype = vec.dtype
+        self.binary = vec.binary
+        self.vocabulary = vec.vocabulary_
+        self.compact = isinstance(self.vocabulary, CompactVocabulary)
+        self.n_features = len(vec.vocabulary_)
+        self.tfidf = getattr(vec, "_tfidf", None)
+
+        self.pre_key = (
+            vec.lowercase,
+            vec.strip_accents,
+            _callable_key(vec.preprocessor),
+            vec.encoding,
+            vec.decode_error,
+        )
+        if vec.analyzer == "word":
+            stop_words = vec.get_stop_words()
+            self.tok_key = self.pre_key + (vec.token_pattern, _callable_key(vec.tokenizer))
+            self.ngram_key = self.tok_key + (
+                "word",
+                tuple(vec.ngram_range),
+                frozenset(stop_words) if stop_words is not None else None,
+            )
+            word_ngrams = _method(self._vec, type(vec)._word_ngrams)
+            self.ngrams = lambda tokens: word_ngrams(tokens, stop_words)
+        else:
+            self.tok_key = None
+            self.ngram_key = self.pre_key + (vec.analyzer, tuple(vec.ngram_range))
+            char_ngrams = type(vec)._char_ngrams if vec.analyzer == "char" else type(vec)._char_wb_ngrams
+            self.ngrams = _method(self._vec, char_ngrams)
+        self.decode = _method(self._vec, type(vec).decode)
+
+    @property
+    def vec(self):
+        return self._vec()
+
+    def build_matrix(self, feature_lists):
+        """Count vocabulary hits exactly like CountVectorizer._count_vocab"""
+        vocabulary_get = self.vocabulary.get
+        j_indices = []
+        indptr = [0]
+        values = array.array("i")
+        for features in feature_lists:
+            counter = {}
+            for feature in features:
+                idx = vocabulary_get(feature)
+                if idx is not None:
+                    counter[idx] = counter.get(idx, 0) + 1
+            j_indices.extend(counter.keys())
+            values.extend(counter.values())
+            indptr.append(len(j_indices))
+
+        X = sp.csr_matrix(
+            (
+                np.frombuffer(values, dtype=np.intc),
+                np.asarray(j_indices, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int32),
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+            dtype=self.dtype,
+        )
+        X.sort_indices()
+        return self._weigh(X)
+
+    def build_from_ids(self, rows, ids, n_rows):
+        """Same matrix as build_matrix from TermTable.lookup output (CompactVocabulary)"""
+        cols = self.vocabulary.columns[ids]
+        hit = cols >= 0
+        keys, counts = np.unique(rows[hit] * self.n_features + cols[hit], return_counts=True)
+        indptr = np.zeros(n_rows + 1, dtype=np.int32)
+        np.cumsum(np.bincount(keys // self.n_features, minlength=n_rows), out=indptr[1:])
+        X = sp.csr_matrix(
+            (counts.astype(np.intc), (keys % self.n_features).astype(np.int32), indptr),
+            shape=(n_rows, self.n_features),
+            dtype=self.dtype,
+        )
+        return self._weigh(X)
+
+    def _weigh(self, X):
+        if self.binary:
+            X.data.fill(1)
+        if self.tfidf is not None:
+            X = self.tfidf.transform(X, copy=False)
+        return X
+
+
+class _Union:
+    """A FeatureUnion whose parts are all supported vectorizers"""
+
+    def __init__(self, parts):
+        self.parts = parts  # list of (plan, weight)
+
+
+class _Opaque:
+    """Anything we cannot reproduce; delegated to vectorizer.transform"""
+
+    def __init__(self, vec, ref=_strong):
+        self._vec = ref(vec)
+
+    @property
+    def vec(self):
+        return self._vec()
+
+
+def _plan(vec, ref=_strong):
+    if _is_supported_vectorizer(vec):
+        return _Leaf(vec, ref)
+    transformer_list = getattr(vec, "transformer_list", None)
+    if transformer_list is not None:
+        weights = getattr(vec, "transformer_weights", None) or {}
+        parts = []
+        for name, trans in transformer_list:
+            if trans is None or trans == "drop":
+                continue
+            sub = _plan(trans, ref)
+            if not isinstance(sub, (_Leaf, _Union)):
+                return _Opaque(vec, ref)
+            parts.append((sub, weights.get(name)))
+        return _Union(parts)
+    return _Opaque(vec, ref)
+
+
+def _leaves(plan):
+    if isinstance(plan, _Leaf):
+        yield plan
+    elif isinstance(plan, _Union):
+        for sub, _ in plan.parts:
+            yield from _leaves(sub)
+
+
+class SharedTextTransformer:
+    """
+    Transform texts for several fitted vectorizers in a single tokenization pass.
+    ``transform(texts)`` returns one feature matrix per vectorizer, in order,
+    identical to calling each ``vectorizer.transform(texts)``.
+    With ``weak=True`` the vectorizers are only weakly referenced (the
+    caller keeps them alive).
+    """
+
+    def __init__(self, vectorizers, weak=False):
+        vectorizers = list(vectorizers)
+        ref = self._ref = _weak if weak else _strong
+        self.plans = []
+        for vec in vectorizers:
+            try:
+                self.plans.append(_plan(vec, ref))
+            except AttributeError as e:
+                # A private scikit-learn member is gone
+                print(f"⚠️ Shared text features unavailable for {type(vec).__name__}: {e}")
+                self.plans.append(_Opaque(vec, ref))
+        self._index_stages()
+        if self._verify(vectorizers):
+            self._index_stages()
+
+    def _index_stages(self):
+        """One representative callable per distinct analyzer stage"""
+        self._decoders = {}
+        self._preprocessors = {}
+        self._tokenizers = {}
+        self._ngrams = {}
+        for plan in self.plans:
+            for leaf in _leaves(plan):
+                vec = leaf.vec
+                self._decoders.setdefault(leaf.pre_key, leaf.decode)
+                self._preprocessors.setdefault(leaf.pre_key, vec.build_preprocessor())
+                if leaf.tok_key is not None:
+                    self._tokenizers.setdefault(leaf.tok_key, (leaf.pre_key, vec.build_tokenizer()))
+                self._ngrams.setdefault(leaf.ngram_key, (leaf.tok_key, leaf.pre_key, leaf.ngrams))
+
+    def _verify(self, vectorizers):
+        """Replace plans whose matrices differ from vectorizer.transform on PROBE_TEXTS; True if any did"""
+        try:
+            features, failure = self.analyze(PROBE_TEXTS) if self.shared else {}, None
+        except Exception as e:
+            features, failure = None, f"{type(e).__name__}: {e}"
+        changed = False
+        for member, (plan, vec) in enumerate(zip(self.plans, vectorizers)):
+            if isinstance(plan, _Opaque):
+                continue
+            reason = failure
+            if features is not None:
+                try:
+                    X = self._build(plan, PROBE_TEXTS, features, {})
+                    expected = vec.transform(PROBE_TEXTS)
+                    if X.shape != expected.shape or (X != expected).nnz:
+                        reason = "different matrix"
+                except Exception as e:
+                    reason = f"{type(e).__name__}: {e}"
+            if reason is not None:
+                print(f"⚠️ Shared text features differ from {type(vec).__name__}.transform ({reason}); "
+                      f"using transform")
+                self.plans[member] = _Opaque(vec, self._ref)
+                changed = True
+        return changed
+
+    @property
+    def shared(self):
+        """True when at least one vectorizer goes through the shared pass"""
+        return any(not isinstance(p, _Opaque) for p in self.plans)
+
+    def analyze(self, texts):
+        """Return {ngram_key: [feature list per text]} computed once per text"""
+        features = {key: [] for key in self._ngrams}
+        for doc in texts:
+            docs = {}
+            tokens = {}
+            for pre_key, decode in self._decoders.items():
+                docs[pre_key] = self._preprocessors[pre_key](decode(doc))
+            for tok_key, (pre_key, tokenize) in self._tokenizers.items():
+                tokens[tok_key] = tokenize(docs[pre_key])
+            for ngram_key, (tok_key, pre_key, ngrams) in self._ngrams.items():
+                source = tokens[tok_key] if tok_key is not None else docs[pre_key]
+                features[ngram_key].append(ngrams(source))
+        return features
+
+    def _build(self, plan, texts, features, lookups):
+        if isinstance(plan, _Leaf):
+            if not plan.compact:
+                return plan.build_matrix(features[plan.ngram_key])
+            # One table lookup per n-gram stream, shared by every vectorizer on the table
+            key = (plan.ngram_key, id(plan.vocabulary.table))
+            if key not in lookups:
+                lookups[key] = plan.vocabulary.table.lookup(features[plan.ngram_key])
+            rows, ids = lookups[key]
+            return plan.build_from_ids(rows, ids, len(texts))
+        if isinstance(plan, _Union):
+            Xs = []
+            for sub, weight in plan.parts:
+                X = self._build(sub, texts, features, lookups)
+                if weight is not None:
+                    X = X * weight
+                Xs.append(X)
+            return sp.hstack(Xs).tocsr()
+        return plan.vec.transform(texts)
+
+    def build(self, member, texts, features):
+        """Matrix of the ``member``-th vectorizer (0-based) from ``analyze(texts)`` output"""
+        return self._build(self.plans[member], texts, features, {})
+
+    def transform(self, texts, observe=None):
+        """
+        One feature matrix per vectorizer. ``observe(stage, seconds)`` is
+        called with "tokenize" for the shared pass and the 1-based member
+        index for each matrix build.
+        """
+        if isinstance(texts, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        texts = list(texts)
+        if observe is None:
+            features = self.analyze(texts) if self.shared else {}
+            lookups = {}
+            return [self._build(plan, texts, features, lookups) for plan in self.plans]
+
+        started = time.perf_counter()
+        features = self.analyze(texts) if self.shared else {}
+        observe("tokenize", time.perf_counter() - started)
+        matrices = []
+        lookups = {}
+        for member, plan in enumerate(self.plans, start=1):
+            started = time.perf_counter()
+            matrices.append(self._build(plan, texts, features, lookups))
+            observe(member, time.perf_counter() - started)
+        return matrices
+
+
+_TRANSFORMERS = weakref.WeakKeyDictionary()
+
+
+def transformer_for(vectorizer):
+    """
+    Cached SharedTextTransformer for a single vectorizer. The cached
+    transformer holds the vectorizer weakly, so the entry goes away with it.
+    """
+    try:
+        return _TRANSFORMERS[vectorizer]
+    except (KeyError, TypeError):
+        pass
+    transformer = SharedTextTransformer([vectorizer], weak=True)
+    try:
+        _TRANSFORMERS[vectorizer] = transformer
+    except TypeError:
+        pass  # not weak-referenceable: build one per call
+    return transformer
@@ -0,0 +1,241 @@
+"""
+Serve-time text normalization matching the training notebooks.
+
+The served models (best_model.pkl, fusion_ensemble.pkl) were trained on the
+``clean_text`` column written by ``TextCleaner.clean`` in
+ml_model/updated_model.ipynb (cell 3, "FIXED Text Preprocessing"), with the
+configuration saved in ml_model/preprocessors/text_preprocessing_results.json:
+
+1. remove URLs, /u/ and /r/ links, [deleted] / [removed], @mentions, #hashtags
+2. expand contractions (case-insensitive)
+3. lowercase, collapse repeated ! ? . and replace other punctuation by spaces
+4. keep words of 2..50 characters
+
+``TextNormalizer`` produces the same output with precompiled patterns, a
+single pass for the contractions and substring checks that skip patterns
+that cannot match. ``reference_clean`` is the notebook code as written;
+``check_parity`` compares the two.
+
+Usage:
+    python text_normalizer.py check     # parity + timing on ml_model/stress.csv
+"""
+import json
+import os
+import re
+import time
+
+# PreprocessingConfig defaults in the notebook
+DEFAULT_CONFIG = {
+    "remove_urls": True,
+    "remove_mentions": True,
+    "remove_hashtags": True,
+    "remove_digits": False,
+    "lowercase": True,
+    "remove_stopwords": False,
+    "apply_lemmatization": False,
+    "min_word_length": 2,
+    "max_word_length": 50,
+}
+
+# Applied in this order by the notebook (re.sub with IGNORECASE, one after another)
+CONTRACTIONS = {
+    "won't": "will not", "can't": "cannot", "n't": " not",
+    "'re": " are", "'ve": " have", "'ll": " will", "'d": " would",
+    "'m": " am", "it's": "it is", "that's": "that is",
+    "what's": "what is", "where's": "where is", "who's": "who is",
+    "there's": "there is", "here's": "here is",
+}
+SOCIAL_MEDIA_STOPWORDS = {
+    "reddit", "post", "comment", "subreddit", "thread", "op", "edit", "update",
+    "deleted", "removed", "http", "https", "www",
+}
+
+URL_PATTERN = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+WWW_PATTERN = r'www\.[A-Za-z0-9.-]+'
+REDDIT_USER_PATTERN = r'/u/[A-Za-z0-9_-]+'
+REDDIT_SUB_PATTERN = r'/r/[A-Za-z0-9_-]+'
+DELETED_PATTERN = r'\[deleted\]|\[removed\]'
+MENTION_PATTERN = r'@[A-Za-z0-9_]+'
+HASHTAG_PATTERN = r'#[A-Za-z0-9_]+'
+
+
+def load_config(path):
+    """Preprocessing config saved by the notebook (DEFAULT_CONFIG when missing)"""
+    config = dict(DEFAULT_CONFIG)
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            saved = json.load(f)
+        config.update({k: v for k, v in saved.get("config", {}).items() if k in DEFAULT_CONFIG})
+    return config
+
+
+# ===============================
+# Reference: the notebook pipeline
+# ===============================
+def reference_clean(text, config=DEFAULT_CONFIG):
+    """TextCleaner.clean from updated_model.ipynb, step by step"""
+    if text is None or text == "" or text != text:  # pd.isna
+        return ""
+    text = str(text)
+    if config["remove_urls"]:
+        text = re.sub(URL_PATTERN, "", text)
+        text = re.sub(WWW_PATTERN, "", text)
+    text = re.sub(REDDIT_USER_PATTERN, "", text)
+    text = re.sub(REDDIT_SUB_PATTERN, "", text)
+    text = re.sub(DELETED_PATTERN, "", text)
+    if config["remove_mentions"]:
+        text = re.sub(MENTION_PATTERN, "", text)
+    if config["remove_hashtags"]:
+        text = re.sub(HASHTAG_PATTERN, "", text)
+
+    for contraction, expansion in CONTRACTIONS.items():
+        text = re.sub(contraction, expansion, text, flags=re.IGNORECASE)
+
+    if config["lowercase"]:
+        text = text.lower()
+    text = re.sub(r'[!]{2,}', '!', text)
+    text = re.sub(r'[?]{2,}', '?', text)
+    text = re.sub(r'[.]{2,}', '.', text)
+    text = re.sub(r'[^\w\s!?.,-]', ' ', text)
+    if config["remove_digits"]:
+        text = re.sub(r'\b\d+\b', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    words = []
+    for word in text.split():
+        if len(word) < config["min_word_length"] or len(word) > config["max_word_length"]:
+            continue
+        if config["remove_stopwords"] and word.lower() in SOCIAL_MEDIA_STOPWORDS:
+            continue
+        words.append(word)
+    return re.sub(r'\s+', ' ', ' '.join(words)).strip()
+
+
+# ===============================
+# Fast normalizer
+# ===============================
+class TextNormalizer:
+    """Same output as reference_clean, built for per-request use"""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        if self.config["apply_lemmatization"]:
+            raise ValueError("Lemmatization is not part of the serving pipeline (apply_lemmatization=true)")
+        # (substring that must be present, pattern) in the notebook's order
+        removals = []
+        if self.config["remove_urls"]:
+            removals += [("http", URL_PATTERN), ("www.", WWW_PATTERN)]
+        removals += [("/u/", REDDIT_USER_PATTERN), ("/r/", REDDIT_SUB_PATTERN), ("[", DELETED_PATTERN)]
+        if self.config["remove_mentions"]:
+            removals.append(("@", MENTION_PATTERN))
+        if self.config["remove_hashtags"]:
+            removals.append(("#", HASHTAG_PATTERN))
+        self._removals = [(marker, re.compile(pattern)) for marker, pattern in removals]
+        # Leftmost match = the notebook's sequential order (no expansion contains an apostrophe).
+        # The case-sensitive pattern is much faster and is used on lowercased ASCII text.
+        contractions = "|".join(re.escape(c) for c in CONTRACTIONS)
+        self._contractions = re.compile(contractions)
+        self._contractions_any_case = re.compile(contractions, re.IGNORECASE)
+        self._repeats = re.compile(r"([!?.])\1+")
+        self._punctuation = re.compile(r"[^\w\s!?.,-]")
+        self._digits = re.compile(r"\b\d+\b") if self.config["remove_digits"] else None
+        self._stopwords = SOCIAL_MEDIA_STOPWORDS if self.config["remove_stopwords"] else None
+
+    def _expand(self, match):
+        found = match.group(0)
+        expansion = CONTRACTIONS.get(found.lower())
+        if expansion is None:
+            # Matched case-insensitively but lower() differs (e.g. "İt's")
+            expansion = next(e for c, e in CONTRACTIONS.items() if re.fullmatch(re.escape(c), found, re.IGNORECASE))
+        return expansion
+
+    def normalize(self, text):
+        if not text:
+            return ""
+        text = str(text)
+        for marker, pattern in self._removals:
+            if marker in text:
+                text = pattern.sub("", text)
+        # Expansions are lowercase, so for ASCII text lowercasing first gives the same result
+        lowered = self.config["lowercase"] and text.isascii()
+        if lowered:
+            text = text.lower()
+        if "'" in text:
+            pattern = self._contractions if lowered else self._contractions_any_case
+            text = pattern.sub(self._expand, text)
+        if self.config["lowercase"] and not lowered:
+            text = text.lower()
+        if "!!" in text or "??" in text or ".." in text:
+            text = self._repeats.sub(r"\1", text)
+        text = self._punctuation.sub(" ", text)
+        if self._digits is not None:
+            text = self._digits.sub("", text)
+
+        lo, hi = self.config["min_word_length"], self.config["max_word_length"]
+        if self._stopwords is None:
+            return " ".join([w for w in text.split() if lo <= len(w) <= hi])
+        stopwords = self._stopwords
+        return " ".join([w for w in text.split() if lo <= len(w) <= hi and w.lower() not in stopwords])
+
+    def normalize_batch(self, texts):
+        normalize = self.normalize
+        return [normalize(t) for t in texts]
+
+
+def check_parity(normalizer, texts):
+    """(number of texts whose output differs from reference_clean, first differing examples)"""
+    mismatches, examples = 0, []
+    for text in texts:
+        expected = reference_clean(text, normalizer.config)
+        actual = normalizer.normalize(text)
+        if actual != expected:
+            mismatches += 1
+            if len(examples) < 5:
+                examples.append({"text": text[:200], "expected": expected[:200], "actual": actual[:200]})
+    return mismatches, examples
+
+
+def time_per_text(fn, texts, repeat=3):
+    """Best-of-``repeat`` seconds per text for ``fn(text)``"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            fn(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / max(len(texts), 1)
+
+
+# ===============================
+# CLI
+# ===============================
+def main(argv=None):
+    import argparse
+    import sys
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    ml_dir = os.path.join(os.path.dirname(os.path.dirname(backend_dir)), "ml_model")
+    parser = argparse.ArgumentParser(description="Check the serve-time text normalizer against the notebook pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check_cmd = sub.add_parser("check", help="Parity and timing on a dataset")
+    check_cmd.add_argument("--dataset", default=os.path.join(ml_dir, "stress.csv"))
+    check_cmd.add_argument("--config", default=os.path.join(ml_dir, "preprocessors", "text_preprocessing_results.json"))
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    texts = pd.read_csv(args.dataset, usecols=["text"])["text"].dropna().astype(str).tolist()
+    normalizer = TextNormalizer(load_config(args.config))
+    mismatches, examples = check_parity(normalizer, texts)
+    reference_us = time_per_text(lambda t: reference_clean(t, normalizer.config), texts) * 1e6
+    fast_us = time_per_text(normalizer.normalize, texts) * 1e6
+    for example in examples:
+        print(json.dumps(example, ensure_ascii=False))
+    status = "✓" if mismatches == 0 else "⚠️"
+    print(f"{status} {len(texts) - mismatches}/{len(texts)} texts match the notebook pipeline; "
+          f"{fast_us:.1f} µs/text (notebook code: {reference_us:.1f} µs/text)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,52 @@
 import { NextResponse } from "next/server";
 import { BACKEND_BASE_URL } from "@/lib/backend-config";
 
+// Conditional / range request headers passed to the backend, and the
+// validators it answers with, so browsers can revalidate (304) and resume (206)
+const FORWARDED_REQUEST_HEADERS = ["if-none-match", "if-modified-since", "range", "if-range"];
+const FORWARDED_RESPONSE_HEADERS = [
+  "content-type",
+  "content-length",
+  "content-range",
+  "accept-ranges",
+  "etag",
+  "last-modified",
+  "cache-control",
+];
+
 export async function GET(
   request: Request,
   { params }: { params: Promise<{ filename: string }> }
 ) {
   try {
     const { filename } = await params;
-    const response = await fetch(`${BACKEND_BASE_URL}/figures/${filename}`, {
+    const { search } = new URL(request.url);
+    const headers = new Headers();
+    for (const name of FORWARDED_REQUEST_HEADERS) {
+      const value = request.headers.get(name);
+      if (value) headers.set(name, value);
+    }
+    const response = await fetch(`${BACKEND_BASE_URL}/figures/${filename}${search}`, {
       cache: "no-store",
+      headers,
     });
 
-    if (!response.ok) {
+    if (!response.ok && response.status !== 304) {
       return NextResponse.json(
-        { error: "Figure not found" },
+        { error: response.status === 404 ? "Figure not found" : "Failed to fetch figure" },
         { status: response.status }
       );
     }
 
-    // Get the image blob
-    const imageBlob = await response.blob();
-
-    // Return the image with proper headers
-    return new NextResponse(imageBlob, {
-      status: 200,
-      headers: {
-        "Content-Type": response.headers.get("Content-Type") || "image/png",
-        "Cache-Control": "public, max-age=31536000",
-      },
+    const outHeaders = new Headers();
+    for (const name of FORWARDED_RESPONSE_HEADERS) {
+      const value = response.headers.get(name);
+      if (value) outHeaders.set(name, value);
+    }
+    // 304 has no body; 200 / 206 stream the backend's bytes through
+    return new NextResponse(response.status === 304 ? null : response.body, {
+      status: response.status,
+      headers: outHeaders,
     });
   } catch (e) {
     console.error("Error fetching figure:", e);
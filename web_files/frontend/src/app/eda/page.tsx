@@ -276,7 +276,7 @@ export default function EDAPage() {
                     {figures.map((fig) => (
                       <div key={fig} className="border rounded-lg p-4 bg-white">
                         <img
-                          src={`/api/figures/${fig}`}
+                          src={`/api/figures/${fig}?size=medium`}
                           alt={fig.replace(/_/g, " ").replace(".png", "")}
                           className="w-full h-auto rounded"
                         />
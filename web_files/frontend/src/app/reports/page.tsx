@@ -10,6 +10,7 @@ import { BACKEND_BASE_URL } from "@/lib/backend-config";
 interface Figure {
   filename: string;
   url: string;
+  previewUrl: string;
   category: string;
 }
 
@@ -38,6 +39,7 @@ export default function ReportsPage() {
           return {
             filename,
             url: `${BACKEND_BASE_URL}/figures/${filename}`,
+            previewUrl: `${BACKEND_BASE_URL}/figures/${filename}?size=medium`,
             category,
           };
         });
@@ -121,7 +123,7 @@ export default function ReportsPage() {
                     <CardContent className="p-0">
                       <div className="relative w-full h-64 bg-gray-100 group">
                         <img
-                          src={figure.url}
+                          src={figure.previewUrl}
                           alt={figure.filename}
                           className="object-contain w-full h-full transition-transform group-hover:scale-105"
                           loading="lazy"